@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+from datetime import datetime
+
+from attendance_store import open_store
+
+
+class AttendanceLedger:
+    """
+    In memory view of today's attendance.
+
+    - names already marked today are loaded ONCE into a set
+      -> "already marked?" is a set lookup
+    - new rows go to the attendance store (attendance_store.py: daily
+      CSV append or sqlite insert), nothing is read again
+    - on the first mark after midnight it switches to the new day
+
+    Thread safe (pipeline workers share one ledger).
+
+    store  -> AttendanceStore (default: config.ATTENDANCE_BACKEND)
+    writer -> BackgroundWriter, rows are stored by its thread instead
+              of the caller (the set is updated immediately; a row the
+              store fails to write is un-marked again, so the person
+              is marked on the next recognition)
+    """
+
+    def __init__(self, store=None, writer=None):
+        self.store = store or open_store()
+        self.writer = writer
+        self.date_str = None
+        self.file_path = None
+        self.marked = set()
+        self.failed_writes = 0
+        # rows the writer thread could not store (deque: no lock needed)
+        self._failed = deque()
+        self._lock = threading.Lock()
+
+    def _load_day(self, date_str: str):
+        self.date_str = date_str
+        # where the rows end up (day CSV / database), for messages
+        self.file_path = self.store.location(date_str)
+        self.marked = self.store.names_on(date_str)
+
+    def _ensure_day(self, now: datetime):
+        date_str = now.strftime("%Y-%m-%d")
+        if date_str != self.date_str:
+            self._load_day(date_str)
+
+        while self._failed:
+            row = self._failed.popleft()
+            self.failed_writes += 1
+            if row["Date"] == self.date_str:
+                self.marked.discard(row["Name"].lower())
+                print(f" Attendance of {row['Name']} not saved, "
+                      f"will mark again")
+
+    def is_marked(self, name: str, now: datetime = None) -> bool:
+        with self._lock:
+            self._ensure_day(now or datetime.now())
+            return name.lower() in self.marked
+
+    def mark(self, name: str, status_fn, now: datetime = None):
+        """
+        Appends a row for name if not marked today.
+        status_fn("HH:MM") -> "On Time" / "Late"
+        Returns the written row (dict) or None if already marked.
+        Raises (and leaves the name unmarked) if the row could not be
+        stored / queued.
+        """
+        now = now or datetime.now()
+
+        with self._lock:
+            self._ensure_day(now)
+
+            key = name.lower()
+            if key in self.marked:
+                return None
+
+            time_str = now.strftime("%H:%M")
+            row = {
+                "Name": name,
+                "Date": self.date_str,
+                "Time": time_str,
+                "Status": status_fn(time_str),
+            }
+
+            # marked before queueing: a write failure reported by the
+            # writer thread is applied after this
+            self.marked.add(key)
+            try:
+                self._append(row)
+            except Exception:
+                self.marked.discard(key)
+                raise
+            return row
+
+    def _append(self, row: dict):
+        if self.writer is not None:
+            self.writer.append_rows(self.store, row,
+                                    on_failed=self._failed.append)
+            return
+        self.store.append_many([row])
@@ -0,0 +1,370 @@
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from config import ATTENDANCE_DIR, ATTENDANCE_PARTITION_DIR
+
+#  Monthly columnar partitions of the daily attendance CSVs
+#
+# Yearly reports used to open hundreds of tiny CSV files and parse every
+# field as a string. Closed months (before the current one) are compacted
+# into ONE file per month:
+#
+#   attendance/monthly/YYYY-MM.npz
+#     names        unique names (dictionary)      name_code   uint8/16/32
+#     statuses     unique statuses (dictionary)   status_code uint8
+#     day          day of month, uint8            seconds     int32 (-1 = "")
+#     time_format  "%H:%M" / "%H:%M:%S"
+#     sources      {"YYYY-MM-DD.csv": [size, mtime_ns]} it was built from
+#
+# Rows are sorted by (day, seconds), so a date range is two searchsorted
+# calls and a name filter is a compare on the codes of the wanted names.
+# The daily CSVs stay the source of truth: a partition is only used while
+# the day files it was built from are unchanged (a late merge into an old
+# day falls back to the CSVs of that month until the next compaction).
+#
+#   python attendance_partitions.py             (compact every closed month)
+
+COLUMNS = ["Name", "Date", "Time", "Status"]
+
+
+#  Daily CSV files (attendance/YYYY-MM-DD.csv)
+
+
+@lru_cache(maxsize=8192)
+def is_day_file(file_name: str) -> bool:
+    """
+    "2024-05-01.csv" -> True
+    """
+    if not file_name.endswith(".csv"):
+        return False
+    try:
+        datetime.strptime(file_name[:-4], "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+
+def read_day_file(path: str) -> list:
+    """
+    Rows of one daily CSV (as dicts with COLUMNS), [] if unusable.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames or "Name" not in reader.fieldnames:
+            return []
+        date_str = os.path.basename(path)[:-4]
+        return [{"Name": str(row.get("Name") or ""),
+                 "Date": str(row.get("Date") or date_str),
+                 "Time": str(row.get("Time") or ""),
+                 "Status": str(row.get("Status") or "")}
+                for row in reader if row.get("Name")]
+
+
+def append_day_rows(path: str, rows):
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, lineterminator="\n")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+#  Monthly partitions
+
+
+def month_of(day_file: str) -> str:
+    """
+    "2024-05-01.csv" -> "2024-05"
+    """
+    return day_file[:7]
+
+
+def month_spans(start: datetime, end: datetime):
+    """
+    (month, first day, last day) for every month touched by start..end.
+    """
+    current = start.date() if isinstance(start, datetime) else start
+    end = end.date() if isinstance(end, datetime) else end
+    while current <= end:
+        next_month = (current.replace(day=28) +
+                      timedelta(days=4)).replace(day=1)
+        last = min(end, next_month - timedelta(days=1))
+        yield current.strftime("%Y-%m"), current.day, last.day
+        current = next_month
+
+
+def partition_path(month: str, partition_dir: str = ATTENDANCE_PARTITION_DIR):
+    return os.path.join(partition_dir, f"{month}.npz")
+
+
+def parse_seconds(time_str: str) -> int:
+    """
+    "09:41" -> 34860, "09:41:07" -> 34867, "" -> -1
+    """
+    if not time_str:
+        return -1
+    parts = time_str.split(":")
+    if len(parts) not in (2, 3) or not all(p.isdigit() for p in parts):
+        raise ValueError(f"Unexpected time: {time_str!r}")
+    h, m = int(parts[0]), int(parts[1])
+    s = int(parts[2]) if len(parts) == 3 else 0
+    return h * 3600 + m * 60 + s
+
+
+def _code_dtype(count: int):
+    return np.min_scalar_type(max(count - 1, 0))
+
+
+def _dictionary(values):
+    """
+    ["b", "a", "b"] -> (["a", "b"], [1, 0, 1]) with the smallest code type
+    """
+    uniques, codes = np.unique(np.asarray(values, dtype=str),
+                               return_inverse=True)
+    return uniques, codes.astype(_code_dtype(len(uniques)))
+
+
+class MonthPartition:
+    """
+    One loaded YYYY-MM.npz (every column is a numpy array).
+    """
+
+    def __init__(self, month: str, data):
+        self.month = month
+        self.names = data["names"]
+        self.name_code = data["name_code"]
+        self.statuses = data["statuses"]
+        self.status_code = data["status_code"]
+        self.day = data["day"]
+        self.seconds = data["seconds"]
+        self.time_format = str(data["time_format"])
+        self.sources = json.loads(str(data["sources"]))
+        self._name_keys = np.char.lower(self.names)
+        self._labels = None
+
+    def __len__(self):
+        return len(self.day)
+
+    @property
+    def nbytes(self) -> int:
+        # + the decoded columns select() keeps (pointers, shared strs)
+        return sum(a.nbytes for a in (self.names, self.name_code,
+                                      self.statuses, self.status_code,
+                                      self.day, self.seconds,
+                                      self._name_keys)) + len(self) * 32
+
+    def _columns(self):
+        """
+        Decoded object columns, built on the first select() (a cached
+        partition only pays for this once).
+        """
+        if self._labels is None:
+            # format each distinct time once
+            uniques, inverse = np.unique(self.seconds, return_inverse=True)
+            times = np.array(["" if s < 0 else time.strftime(
+                self.time_format, time.gmtime(int(s))) for s in uniques],
+                dtype=object)
+            dates = np.array([f"{self.month}-{d:02d}" for d in range(32)],
+                             dtype=object)
+            self._labels = (self.names.astype(object)[self.name_code],
+                            dates[self.day],
+                            times[inverse.reshape(-1)],
+                            self.statuses.astype(object)[self.status_code])
+        return self._labels
+
+    def select(self, first_day: int = 1, last_day: int = 31, wanted=None):
+        """
+        Columns (name, date, time, status arrays) of the rows in
+        first_day..last_day (and lower-cased names in `wanted`), None if
+        nothing matched.
+        """
+        lo = np.searchsorted(self.day, first_day, side="left")
+        hi = np.searchsorted(self.day, last_day, side="right")
+        if lo >= hi:
+            return None
+
+        index = np.arange(lo, hi)
+        if wanted is not None:
+            codes = np.flatnonzero(np.isin(self._name_keys, list(wanted)))
+            if not len(codes):
+                return None
+            index = index[np.isin(self.name_code[lo:hi], codes)]
+            if not len(index):
+                return None
+
+        return tuple(c[index] for c in self._columns())
+
+
+def columns_frame(parts):
+    """
+    One DataFrame from select() results (None entries skipped).
+    """
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+    return pd.DataFrame({col: np.concatenate([p[i] for p in parts])
+                         for i, col in enumerate(COLUMNS)}, columns=COLUMNS)
+
+
+def day_file_stats(attendance_dir: str, months=None) -> dict:
+    """
+    {"YYYY-MM-DD.csv": (path, size, mtime_ns)} of the day files (only
+    the given months if set), one directory scan.
+    """
+    stats = {}
+    if not os.path.isdir(attendance_dir):
+        return stats
+    for entry in os.scandir(attendance_dir):
+        if months is not None and month_of(entry.name) not in months:
+            continue
+        if not entry.is_file() or not is_day_file(entry.name):
+            continue
+        st = entry.stat()
+        stats[entry.name] = (entry.path, st.st_size, st.st_mtime_ns)
+    return stats
+
+
+def _sources(files: dict) -> dict:
+    return {name: [size, mtime] for name, (_path, size, mtime)
+            in sorted(files.items())}
+
+
+def read_partition(month: str, path: str) -> MonthPartition:
+    with np.load(path, allow_pickle=False) as data:
+        return MonthPartition(month, data)
+
+
+def load_partition(month: str, files: dict,
+                   partition_dir: str = ATTENDANCE_PARTITION_DIR,
+                   cache=None):
+    """
+    Partition of `month` if it was built from exactly these day files
+    (day_file_stats() of that month), else None. With a cache
+    (attendance_store.ParsedCache) the file is only read again after it
+    changed.
+    """
+    path = partition_path(month, partition_dir)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    try:
+        if cache is None:
+            partition = read_partition(month, path)
+        else:
+            partition = cache.get(path, (st.st_size, st.st_mtime_ns),
+                                  lambda: read_partition(month, path),
+                                  lambda p: p.nbytes)
+    except (OSError, ValueError, KeyError) as e:
+        print(f" Partition unreadable, using CSV files: {path} ({e})")
+        return None
+    if partition.sources != _sources(files):
+        return None
+    return partition
+
+
+def write_partition(month: str, files: dict,
+                    partition_dir: str = ATTENDANCE_PARTITION_DIR) -> int:
+    """
+    Compacts the day files of one month, returns the number of rows.
+    Raises ValueError if a file has times it cannot type.
+    """
+    names, statuses, days, seconds = [], [], [], []
+    formats = set()
+    for file_name, (path, _size, _mtime) in sorted(files.items()):
+        day = int(file_name[8:10])
+        for row in read_day_file(path):
+            sec = parse_seconds(row["Time"])
+            if sec >= 0:
+                formats.add(row["Time"].count(":"))
+            names.append(row["Name"])
+            statuses.append(row["Status"])
+            days.append(day)
+            seconds.append(sec)
+
+    if len(formats) > 1:
+        raise ValueError("mixed HH:MM / HH:MM:SS times")
+
+    day = np.asarray(days, dtype=np.uint8)
+    seconds = np.asarray(seconds, dtype=np.int32)
+    order = np.lexsort((seconds, day))
+    name_values, name_code = _dictionary(names)
+    status_values, status_code = _dictionary(statuses)
+
+    os.makedirs(partition_dir, exist_ok=True)
+    path = partition_path(month, partition_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f,
+                 names=name_values,
+                 name_code=name_code[order],
+                 statuses=status_values,
+                 status_code=status_code[order],
+                 day=day[order],
+                 seconds=seconds[order],
+                 time_format=np.array("%H:%M:%S" if 2 in formats
+                                      else "%H:%M"),
+                 sources=np.array(json.dumps(_sources(files))))
+    os.replace(tmp_path, path)
+    return len(day)
+
+
+def compact(attendance_dir: str = ATTENDANCE_DIR,
+            partition_dir: str = ATTENDANCE_PARTITION_DIR,
+            months=None, force: bool = False, today: date = None) -> dict:
+    """
+    Builds / refreshes the partition of every closed month (or only
+    `months`). Months whose partition is up to date are skipped.
+    """
+    current = (today or date.today()).strftime("%Y-%m")
+    by_month = {}
+    for name, st in day_file_stats(attendance_dir).items():
+        by_month.setdefault(month_of(name), {})[name] = st
+
+    stats = {"months": 0, "rows": 0, "skipped": 0, "failed": 0}
+    for month in sorted(by_month):
+        if month >= current or (months and month not in months):
+            continue
+        files = by_month[month]
+        if not force and load_partition(month, files, partition_dir):
+            stats["skipped"] += 1
+            continue
+        try:
+            stats["rows"] += write_partition(month, files, partition_dir)
+            stats["months"] += 1
+        except ValueError as e:
+            stats["failed"] += 1
+            print(f" {month} not compacted: {e}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compact closed months of daily attendance CSVs into "
+                    "columnar monthly partitions")
+    parser.add_argument("--month", action="append",
+                        help="only this month (YYYY-MM), may repeat")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild partitions that are up to date")
+    parser.add_argument("--attendance-dir", default=ATTENDANCE_DIR)
+    parser.add_argument("--partition-dir", default=ATTENDANCE_PARTITION_DIR)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    stats = compact(args.attendance_dir, args.partition_dir,
+                    months=args.month, force=args.force)
+    print(f" Compacted {stats['months']} month(s), {stats['rows']} rows "
+          f"({stats['skipped']} up to date, {stats['failed']} failed) in "
+          f"{time.perf_counter() - t0:.2f} s -> {args.partition_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,13 @@
+import argparse
 import os
 import pandas as pd
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
 
-from config import ATTENDANCE_DIR, REPORTS_DIR
-
-
-# Helper: get file path by date
-def attendance_file_by_date(date_str: str):
-    file_path = os.path.join(ATTENDANCE_DIR, f"{date_str}.csv")
-    if os.path.exists(file_path):
-        return file_path
-    return None
-
-
-# Helper: get latest file
-def latest_attendance_file():
-    if not os.path.exists(ATTENDANCE_DIR):
-        return None
-
-    files = [f for f in os.listdir(ATTENDANCE_DIR) if f.endswith(".csv")]
-    if not files:
-        return None
-
-    files.sort(reverse=True)
-    return os.path.join(ATTENDANCE_DIR, files[0])
-
-
-# Read attendance range
-def read_attendance_range(from_date: str, to_date: str):
-    start = datetime.strptime(from_date, "%Y-%m-%d")
-    end = datetime.strptime(to_date, "%Y-%m-%d")
-
-    if start > end:
-        raise ValueError("From date cannot be greater than To date")
-
-    all_data = []
-    current = start
-    while current <= end:
-        date_str = current.strftime("%Y-%m-%d")
-        fp = attendance_file_by_date(date_str)
-        if fp:
-            df = pd.read_csv(fp)
-            df["File"] = os.path.basename(fp)  # optional
-            all_data.append(df)
-
-        current += pd.Timedelta(days=1)
-
-    if not all_data:
-        return None
-
-    return pd.concat(all_data, ignore_index=True)
+from attendance_store import open_store, read_attendance_range
+from config import REPORTS_DIR
+from view_attendance import load_team_members
 
 
 # PDF Export (ReportLab)
@@ -96,12 +52,26 @@ def export_pdf(df: pd.DataFrame, file_path: str):
 
 class AttendanceReportGUI:
 
-    def __init__(self, root):
+    def __init__(self, root, name: str = "", manager: str = ""):
+        """
+        name    -> only this person's rows (employee dashboard)
+        manager -> only the rows of this manager's team
+        """
         self.root = root
         self.root.title("Attendance Report")
         self.root.geometry("1000x600")
 
         self.df = None
+        self.store = open_store()
+
+        # self / team filter, applied inside the store query
+        self.names = None
+        if name:
+            self.names = [name]
+            self.root.title(f"Attendance Report - {name}")
+        elif manager:
+            self.names = load_team_members(manager)
+            self.root.title(f"Attendance Report - Team of {manager}")
 
         # Filters Frame
         filter_frame = tk.Frame(root)
@@ -132,6 +102,8 @@ class AttendanceReportGUI:
 
         tk.Button(filter_frame, text="Load Report",
                   command=self.load_report).grid(row=0, column=8, padx=10)
+        tk.Button(filter_frame, text="Summary",
+                  command=self.load_summary).grid(row=0, column=9, padx=5)
 
         # Buttons
         btn_frame = tk.Frame(root)
@@ -160,11 +132,11 @@ class AttendanceReportGUI:
 
         try:
             if mode == "latest":
-                fp = latest_attendance_file()
-                if not fp:
-                    messagebox.showerror("Error", "No attendance file found!")
+                latest = self.store.latest_date()
+                if not latest:
+                    messagebox.showerror("Error", "No attendance found!")
                     return
-                self.df = pd.read_csv(fp)
+                self.df = self.store.read_day(latest, self.names)
 
             elif mode == "date":
                 date_str = self.date_entry.get().strip()
@@ -172,12 +144,12 @@ class AttendanceReportGUI:
                     messagebox.showerror("Error", "Please enter date!")
                     return
 
-                fp = attendance_file_by_date(date_str)
-                if not fp:
+                df = self.store.read_day(date_str, self.names)
+                if df is None:
                     messagebox.showerror(
-                        "Error", f"No file found for date: {date_str}")
+                        "Error", f"No attendance found for date: {date_str}")
                     return
-                self.df = pd.read_csv(fp)
+                self.df = df
 
             elif mode == "range":
                 from_date = self.from_entry.get().strip()
@@ -187,11 +159,12 @@ class AttendanceReportGUI:
                                          "Please enter from and to dates!")
                     return
 
-                df = read_attendance_range(from_date, to_date)
+                df = read_attendance_range(from_date, to_date, self.names,
+                                           store=self.store)
                 if df is None:
                     messagebox.showerror(
                         "Error",
-                        "No attendance files found in this date range!")
+                        "No attendance found in this date range!")
                     return
                 self.df = df
 
@@ -201,6 +174,43 @@ class AttendanceReportGUI:
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def load_summary(self):
+        """
+        Present / On Time / Late per person for the selected date or
+        range ("latest" -> all time). The sqlite store reads its count
+        tables, the csv store has none and counts every mark of the range.
+        """
+        mode = self.mode_var.get()
+
+        try:
+            if mode == "date":
+                date_str = self.date_entry.get().strip()
+                if not date_str:
+                    messagebox.showerror("Error", "Please enter date!")
+                    return
+                df = self.store.summary(date_str, date_str, self.names)
+
+            elif mode == "range":
+                from_date = self.from_entry.get().strip()
+                to_date = self.to_entry.get().strip()
+                if not from_date or not to_date:
+                    messagebox.showerror("Error",
+                                         "Please enter from and to dates!")
+                    return
+                df = self.store.summary(from_date, to_date, self.names)
+
+            else:
+                df = self.store.summary(names=self.names)
+
+            if df is None:
+                messagebox.showerror("Error", "No attendance found!")
+                return
+            self.df = df
+            self.show_table()
+
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+
     def show_table(self):
         # clear existing table
         for col in self.tree["columns"]:
@@ -264,8 +274,15 @@ class AttendanceReportGUI:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Attendance Report GUI")
+    parser.add_argument("--name", default="",
+                        help="show only this person (self report)")
+    parser.add_argument("--manager", default="",
+                        help="show only this manager's team")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = AttendanceReportGUI(root)
+    app = AttendanceReportGUI(root, name=args.name, manager=args.manager)
     root.mainloop()
 
 
@@ -0,0 +1,786 @@
+import argparse
+import calendar
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from attendance_partitions import (append_day_rows, columns_frame,
+                                   day_file_stats, is_day_file,
+                                   load_partition, month_of, month_spans,
+                                   read_day_file)
+from config import (ATTENDANCE_BACKEND, ATTENDANCE_CACHE_MB,
+                    ATTENDANCE_CSV_MIRROR, ATTENDANCE_DB, ATTENDANCE_DIR,
+                    ATTENDANCE_PARTITION_DIR)
+
+#  Attendance storage backends
+#
+# Every tool reads / writes attendance through open_store():
+#
+#   "csv"     attendance/YYYY-MM-DD.csv, one file per day (old layout),
+#             closed months read from attendance/monthly/YYYY-MM.npz
+#             once attendance_partitions.py has compacted them;
+#             parsed files stay in an LRU cache (ParsedCache) until
+#             their size / mtime changes; no count tables, summary()
+#             counts every mark of the range
+#   "sqlite"  data/attendance.db (WAL): one row per person per day,
+#             UNIQUE(date, name) -> index for day / range queries,
+#             index (name, date) -> self / team history,
+#             count tables per day / month + person / person for
+#             summary() (kept up to date by triggers); with
+#             config.ATTENDANCE_CSV_MIRROR every new mark is also
+#             written to its day file, for tools that read those
+#
+# config.ATTENDANCE_BACKEND picks the backend (sqlite by default). The
+# sqlite store imports daily CSV files it has not seen yet (older
+# versions, copied files) when it is opened, `python attendance_store.py
+# --import-csv` does the same by hand.
+#
+# Rows are {"Name", "Date", "Time", "Status"}; queries return a
+# DataFrame with these columns or None when nothing matched. summary()
+# returns SUMMARY_COLUMNS, one row per person.
+
+COLUMNS = ["Name", "Date", "Time", "Status"]
+
+ON_TIME = "On Time"
+LATE = "Late"
+
+
+def _check_range(from_date: str, to_date: str):
+    start = datetime.strptime(from_date, "%Y-%m-%d")
+    end = datetime.strptime(to_date, "%Y-%m-%d")
+    if start > end:
+        raise ValueError("from_date cannot be greater than to_date")
+    return start, end
+
+
+def _lower_set(names):
+    return None if names is None else {str(n).lower() for n in names}
+
+
+def _frame(rows):
+    if not rows:
+        return None
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+SUMMARY_COLUMNS = ["Name", "Present", "On Time", "Late", "Days",
+                   "Attendance %"]
+
+
+def _add_counts(counts: dict, rows):
+    # rows of (name, present, on_time, late), names merged case-insensitive
+    for name, present, on_time, late in rows:
+        entry = counts.setdefault(str(name).lower(), [str(name), 0, 0, 0])
+        entry[1] += int(present or 0)
+        entry[2] += int(on_time or 0)
+        entry[3] += int(late or 0)
+
+
+def _summary_frame(counts: dict, days: int, names=None):
+    """
+    One row per person; with a names filter every wanted name is listed
+    (0 present if never marked).
+    """
+    if names is not None:
+        wanted = _lower_set(names)
+        counts = {k: v for k, v in counts.items() if k in wanted}
+        for name in names:
+            counts.setdefault(str(name).lower(), [str(name), 0, 0, 0])
+    if not counts:
+        return None
+
+    rows = [[name, present, on_time, late, days,
+             round(100.0 * present / days, 1) if days else 0.0]
+            for name, present, on_time, late in
+            sorted(counts.values(), key=lambda e: e[0].lower())]
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+class ParsedCache:
+    """
+    LRU of parsed files shared by the stores of a process:
+    path -> (size, mtime_ns) it was parsed at + parsed value.
+    A changed file is parsed again, the least recently used entries go
+    when the estimated size passes max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = ATTENDANCE_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: str, signature, load, size_of):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = load()
+        nbytes = size_of(value)
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.bytes -= old[2]
+            if nbytes <= self.max_bytes:
+                self._entries[path] = (signature, value, nbytes)
+                self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "mb": round(self.bytes / 1e6, 1),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+PARSED_CACHE = ParsedCache()
+
+STR_BYTES = 64
+
+
+def _day_columns(path: str):
+    """
+    ((name, date, time, status) object arrays, lower-cased names) of a
+    day file.
+    """
+    rows = read_day_file(path)
+    columns = tuple(np.array([r[c] for r in rows], dtype=object)
+                    for c in COLUMNS)
+    keys = np.array([r["Name"].lower() for r in rows], dtype=object)
+    return columns, keys
+
+
+def _columns_nbytes(value) -> int:
+    # pointers + a rough size for each short str object
+    columns, keys = value
+    return sum(a.nbytes + len(a) * STR_BYTES for a in (*columns, keys))
+
+
+class CsvStore:
+    """
+    One CSV per day under attendance/. Range queries read compacted
+    monthly partitions where they are up to date, day files otherwise
+    (always for the current month).
+    """
+
+    backend = "csv"
+
+    def __init__(self, attendance_dir: str = ATTENDANCE_DIR,
+                 partition_dir: str = ATTENDANCE_PARTITION_DIR,
+                 cache: ParsedCache = PARSED_CACHE):
+        self.attendance_dir = attendance_dir
+        self.partition_dir = partition_dir
+        self.cache = cache
+
+    def _day(self, path: str, size: int = None, mtime_ns: int = None):
+        if size is None:
+            st = os.stat(path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        if self.cache is None:
+            return _day_columns(path)
+        return self.cache.get(path, (size, mtime_ns),
+                              lambda: _day_columns(path), _columns_nbytes)
+
+    def location(self, date_str: str) -> str:
+        return os.path.join(self.attendance_dir, f"{date_str}.csv")
+
+    def day_file(self, date_str: str):
+        path = self.location(date_str)
+        return path if os.path.exists(path) else None
+
+    #  write
+
+    def names_on(self, date_str: str) -> set:
+        path = self.day_file(date_str)
+        if path is None:
+            return set()
+        return set(self._day(path)[1])
+
+    def append_many(self, rows) -> int:
+        by_date = {}
+        for row in rows:
+            by_date.setdefault(row["Date"], []).append(row)
+        for date_str, day_rows in by_date.items():
+            append_day_rows(self.location(date_str), day_rows)
+        return sum(len(r) for r in by_date.values())
+
+    def merge_earliest(self, rows) -> int:
+        """
+        Keeps the earliest time per person per day (also against rows
+        already stored). Returns rows added / updated.
+        """
+        by_date = {}
+        for row in rows:
+            by_date.setdefault(row["Date"], []).append(row)
+
+        written = 0
+        for date_str, new_rows in sorted(by_date.items()):
+            path = self.location(date_str)
+            kept = {}
+            if os.path.exists(path):
+                for row in read_day_file(path):
+                    kept[row["Name"].lower()] = row
+
+            for row in new_rows:
+                key = row["Name"].lower()
+                if key in kept and kept[key]["Time"] <= row["Time"]:
+                    continue
+                kept[key] = dict(row)
+                written += 1
+
+            df = pd.DataFrame(list(kept.values()), columns=COLUMNS)
+            df = df.sort_values("Time", kind="stable")
+            df.to_csv(path, index=False)
+        return written
+
+    #  read
+
+    def latest_date(self):
+        if not os.path.isdir(self.attendance_dir):
+            return None
+        days = sorted(f for f in os.listdir(self.attendance_dir)
+                      if is_day_file(f))
+        return days[-1][:-4] if days else None
+
+    def read_range(self, from_date: str, to_date: str, names=None):
+        start, end = _check_range(from_date, to_date)
+        wanted = _lower_set(names)
+        if wanted is not None and not wanted:
+            return None
+
+        spans = list(month_spans(start, end))
+        by_month = {}
+        for name, st in day_file_stats(self.attendance_dir,
+                                       {m for m, _, _ in spans}).items():
+            by_month.setdefault(month_of(name), {})[name] = st
+
+        parts = []
+        for month, first, last in spans:
+            files = by_month.get(month)
+            if not files:
+                continue
+            partition = load_partition(month, files, self.partition_dir,
+                                       self.cache)
+            if partition is not None:
+                parts.append(partition.select(first, last, wanted))
+                continue
+
+            for name in sorted(files):
+                if not first <= int(name[8:10]) <= last:
+                    continue
+                columns, keys = self._day(*files[name])
+                if wanted is not None:
+                    mask = np.isin(keys, list(wanted))
+                    columns = tuple(c[mask] for c in columns)
+                if len(columns[0]):
+                    parts.append(columns)
+        return columns_frame(parts)
+
+    def read_day(self, date_str: str, names=None):
+        return self.read_range(date_str, date_str, names)
+
+    def summary(self, from_date: str = None, to_date: str = None,
+                names=None):
+        """
+        Present / On Time / Late per person (all time without dates).
+        The csv layout has no count tables: every (cached) mark of the
+        range is counted, days = day files.
+        """
+        days = sorted(day_file_stats(self.attendance_dir))
+        if not days:
+            return _summary_frame({}, 0, names)
+        from_date = from_date or days[0][:-4]
+        to_date = to_date or days[-1][:-4]
+        _check_range(from_date, to_date)
+
+        counts = {}
+        df = self.read_range(from_date, to_date, names)
+        if df is not None:
+            status = df["Status"]
+            grouped = pd.DataFrame({
+                "Name": df["Name"],
+                "on_time": status == ON_TIME,
+                "late": status == LATE,
+            }).groupby(df["Name"].str.lower(), sort=False)
+            _add_counts(counts, zip(grouped["Name"].first(),
+                                    grouped.size(),
+                                    grouped["on_time"].sum(),
+                                    grouped["late"].sum()))
+
+        open_days = sum(1 for d in days
+                        if from_date <= d[:-4] <= to_date)
+        return _summary_frame(counts, open_days, names)
+
+    def describe(self) -> str:
+        if self.cache is None:
+            return f"{self.attendance_dir} (csv per day)"
+        cache = self.cache.stats()
+        return (f"{self.attendance_dir} (csv per day, cache "
+                f"{cache['hits']} hits / {cache['misses']} misses, "
+                f"{cache['mb']} MB)")
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    date   TEXT NOT NULL,                  -- YYYY-MM-DD
+    name   TEXT NOT NULL COLLATE NOCASE,
+    time   TEXT NOT NULL,                  -- HH:MM
+    status TEXT NOT NULL,
+    UNIQUE (date, name)                    -- one mark per person per day
+);
+CREATE INDEX IF NOT EXISTS attendance_name_date ON attendance (name, date);
+CREATE TABLE IF NOT EXISTS imported_files (
+    file     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+#  Materialized counts (present / on time / late)
+#
+#   attendance_daily     per day            -> open days, office totals
+#   attendance_monthly   per month + person -> "late how often in May"
+#   attendance_employee  per person         -> all time totals
+#
+# Triggers keep them in step with every insert / upsert / delete of a
+# mark, so summaries read O(employees) rows instead of every mark.
+# rebuild_aggregates() recomputes them from the marks in bulk.
+
+AGGREGATES = (
+    # table, key columns, key values of a mark ({row} = NEW / OLD)
+    ("attendance_daily", ("date",), ("{row}.date",)),
+    ("attendance_monthly", ("month", "name"),
+     ("substr({row}.date, 1, 7)", "{row}.name")),
+    ("attendance_employee", ("name",), ("{row}.name",)),
+)
+
+AGGREGATE_TABLES = """
+CREATE TABLE IF NOT EXISTS attendance_daily (
+    date    TEXT PRIMARY KEY,
+    present INTEGER NOT NULL, on_time INTEGER NOT NULL, late INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attendance_monthly (
+    month   TEXT NOT NULL,                 -- YYYY-MM
+    name    TEXT NOT NULL COLLATE NOCASE,
+    present INTEGER NOT NULL, on_time INTEGER NOT NULL, late INTEGER NOT NULL,
+    PRIMARY KEY (month, name)
+);
+CREATE TABLE IF NOT EXISTS attendance_employee (
+    name    TEXT PRIMARY KEY COLLATE NOCASE,
+    present INTEGER NOT NULL, on_time INTEGER NOT NULL, late INTEGER NOT NULL
+);
+"""
+
+
+def _aggregate_triggers() -> str:
+    def flag(row, status):
+        return f"({row}.status = '{status}')"
+
+    inserts, updates, deletes = [], [], []
+    for table, keys, values in AGGREGATES:
+        columns = ", ".join(keys)
+
+        def match(row):
+            return " AND ".join(f"{k} = {v.format(row=row)}"
+                                for k, v in zip(keys, values))
+
+        inserts.append(
+            f"INSERT INTO {table} ({columns}, present, on_time, late) "
+            f"VALUES ({', '.join(v.format(row='NEW') for v in values)}, 1, "
+            f"{flag('NEW', ON_TIME)}, {flag('NEW', LATE)}) "
+            f"ON CONFLICT ({columns}) DO UPDATE SET present = present + 1, "
+            f"on_time = on_time + excluded.on_time, "
+            f"late = late + excluded.late;")
+        updates.append(
+            f"UPDATE {table} SET "
+            f"on_time = on_time + {flag('NEW', ON_TIME)} - "
+            f"{flag('OLD', ON_TIME)}, "
+            f"late = late + {flag('NEW', LATE)} - {flag('OLD', LATE)} "
+            f"WHERE {match('NEW')};")
+        deletes.append(
+            f"UPDATE {table} SET present = present - 1, "
+            f"on_time = on_time - {flag('OLD', ON_TIME)}, "
+            f"late = late - {flag('OLD', LATE)} WHERE {match('OLD')};")
+
+    sql = ""
+    for trigger, event, body in (
+            ("attendance_agg_insert", "INSERT", inserts),
+            ("attendance_agg_update", "UPDATE OF status", updates),
+            ("attendance_agg_delete", "DELETE", deletes)):
+        sql += (f"CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event} "
+                f"ON attendance BEGIN\n  " + "\n  ".join(body) + "\nEND;\n")
+    return sql
+
+
+AGGREGATE_SCHEMA = AGGREGATE_TABLES + _aggregate_triggers()
+
+REBUILD_AGGREGATES = f"""
+DELETE FROM attendance_daily;
+DELETE FROM attendance_monthly;
+DELETE FROM attendance_employee;
+INSERT INTO attendance_daily
+    SELECT date, COUNT(*), SUM(status = '{ON_TIME}'), SUM(status = '{LATE}')
+    FROM attendance GROUP BY date;
+INSERT INTO attendance_monthly
+    SELECT substr(date, 1, 7), name, COUNT(*), SUM(status = '{ON_TIME}'),
+           SUM(status = '{LATE}')
+    FROM attendance GROUP BY substr(date, 1, 7), name;
+INSERT INTO attendance_employee
+    SELECT name, COUNT(*), SUM(status = '{ON_TIME}'), SUM(status = '{LATE}')
+    FROM attendance GROUP BY name;
+"""
+
+# earlier time wins (same rule as batch_attendance.py)
+UPSERT_EARLIEST = """
+INSERT INTO attendance (date, name, time, status) VALUES (?, ?, ?, ?)
+ON CONFLICT (date, name) DO UPDATE
+    SET time = excluded.time, status = excluded.status
+    WHERE excluded.time < attendance.time
+"""
+
+SELECT_ROWS = "SELECT name, date, time, status FROM attendance"
+
+# sqlite limit for ? parameters is 999 on older builds
+MAX_PARAMS = 500
+
+
+class SqliteStore:
+    """
+    data/attendance.db in WAL mode (readers never block the writer).
+    One connection shared by the threads of a process (serialized by a
+    lock); other processes open their own store.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: str = ATTENDANCE_DB,
+                 attendance_dir: str = ATTENDANCE_DIR,
+                 import_csv: bool = True,
+                 mirror_csv: bool = ATTENDANCE_CSV_MIRROR):
+        """
+        mirror_csv -> new marks are also appended to the day files
+        """
+        self.db_path = db_path
+        self.attendance_dir = attendance_dir
+        self.mirror = CsvStore(attendance_dir, cache=None) \
+            if mirror_csv else None
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(SCHEMA + AGGREGATE_SCHEMA)
+
+        # db from before the aggregate tables (or edited by hand)
+        (marks, counted) = self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM attendance), "
+            "(SELECT COALESCE(SUM(present), 0) FROM attendance_daily)"
+        ).fetchone()
+        if marks != counted:
+            self.rebuild_aggregates()
+
+        if import_csv:
+            self.import_csv()
+
+    def location(self, _date_str: str = None) -> str:
+        return self.db_path
+
+    #  import of daily CSV files
+
+    def import_csv(self, attendance_dir: str = None,
+                   force: bool = False) -> dict:
+        """
+        Loads every daily CSV that is new / changed since its last
+        import. Returns {"files": imported files, "rows": rows upserted}.
+        """
+        attendance_dir = attendance_dir or self.attendance_dir
+        stats = {"files": 0, "rows": 0}
+        if not os.path.isdir(attendance_dir):
+            return stats
+
+        with self._lock:
+            seen = {f: (size, mtime) for f, size, mtime in self.conn.execute(
+                "SELECT file, size, mtime_ns FROM imported_files")}
+
+            for entry in sorted(os.scandir(attendance_dir),
+                                key=lambda e: e.name):
+                if not entry.is_file() or not is_day_file(entry.name):
+                    continue
+                st = entry.stat()
+                if not force and \
+                        seen.get(entry.name) == (st.st_size, st.st_mtime_ns):
+                    continue
+
+                rows = read_day_file(entry.path)
+                with self.conn:
+                    self.conn.executemany(
+                        UPSERT_EARLIEST,
+                        [(r["Date"], r["Name"], r["Time"], r["Status"])
+                         for r in rows])
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO imported_files "
+                        "VALUES (?, ?, ?)",
+                        (entry.name, st.st_size, st.st_mtime_ns))
+                stats["files"] += 1
+                stats["rows"] += len(rows)
+        return stats
+
+    #  write
+
+    def names_on(self, date_str: str) -> set:
+        with self._lock:
+            return {name.lower() for (name,) in self.conn.execute(
+                "SELECT name FROM attendance WHERE date = ?", (date_str,))}
+
+    def append_many(self, rows) -> int:
+        """
+        Inserts marks, a person already marked that day is ignored.
+        """
+        with self._lock:
+            with self.conn:
+                added = [r for r in rows if self.conn.execute(
+                    "INSERT OR IGNORE INTO attendance "
+                    "(date, name, time, status) VALUES (?, ?, ?, ?)",
+                    (r["Date"], r["Name"], r["Time"], r["Status"])
+                ).rowcount]
+            self._mirror(self.mirror and self.mirror.append_many, added)
+        return len(added)
+
+    def merge_earliest(self, rows) -> int:
+        rows = list(rows)
+        with self._lock:
+            with self.conn:
+                # rowcount, total_changes would count the trigger updates
+                written = self.conn.executemany(
+                    UPSERT_EARLIEST,
+                    [(r["Date"], r["Name"], r["Time"], r["Status"])
+                     for r in rows]).rowcount
+            self._mirror(self.mirror and self.mirror.merge_earliest, rows)
+        return written
+
+    def _mirror(self, write, rows):
+        """
+        Same rows into the day files (ATTENDANCE_CSV_MIRROR). The files
+        are recorded as imported, the db already has their rows. The db
+        stays the source of truth if a file cannot be written.
+        """
+        if not write or not rows:
+            return
+        try:
+            write(rows)
+            with self.conn:
+                for date_str in {r["Date"] for r in rows}:
+                    path = self.mirror.location(date_str)
+                    st = os.stat(path)
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO imported_files "
+                        "VALUES (?, ?, ?)",
+                        (os.path.basename(path), st.st_size,
+                         st.st_mtime_ns))
+        except OSError as e:
+            print(f" Day file not updated ({e}), attendance is in "
+                  f"{self.db_path}")
+
+    #  read
+
+    def _query(self, where: str, params, names=None):
+        names = None if names is None else list(dict.fromkeys(names))
+        if names is not None and not names:
+            return None
+
+        chunks = [None] if names is None else \
+            [names[i:i + MAX_PARAMS] for i in range(0, len(names), MAX_PARAMS)]
+
+        rows = []
+        with self._lock:
+            for chunk in chunks:
+                sql = f"{SELECT_ROWS} WHERE {where}"
+                args = list(params)
+                if chunk is not None:
+                    sql += f" AND name IN ({','.join('?' * len(chunk))})"
+                    args += [str(n) for n in chunk]
+                rows.extend(self.conn.execute(sql + " ORDER BY date, time",
+                                              args))
+
+        if len(chunks) > 1:
+            rows.sort(key=lambda r: (r[1], r[2]))
+        return _frame(rows)
+
+    def latest_date(self):
+        with self._lock:
+            (date_str,) = self.conn.execute(
+                "SELECT MAX(date) FROM attendance").fetchone()
+        return date_str
+
+    def read_range(self, from_date: str, to_date: str, names=None):
+        _check_range(from_date, to_date)
+        return self._query("date BETWEEN ? AND ?", (from_date, to_date),
+                           names)
+
+    def read_day(self, date_str: str, names=None):
+        return self._query("date = ?", (date_str,), names)
+
+    #  aggregates
+
+    def rebuild_aggregates(self) -> int:
+        """
+        Recomputes the count tables from every mark, returns the marks.
+        """
+        with self._lock:
+            self.conn.executescript("BEGIN;" + REBUILD_AGGREGATES + "COMMIT;")
+            (marks,) = self.conn.execute(
+                "SELECT COALESCE(SUM(present), 0) FROM attendance_daily"
+            ).fetchone()
+        return marks
+
+    def summary(self, from_date: str = None, to_date: str = None,
+                names=None):
+        """
+        Present / On Time / Late per person (all time without dates).
+        Whole months come from attendance_monthly, only the partial
+        months at the ends of the range look at single marks.
+        """
+        counts = {}
+        with self._lock:
+            if from_date is None and to_date is None:
+                _add_counts(counts, self.conn.execute(
+                    "SELECT name, present, on_time, late "
+                    "FROM attendance_employee WHERE present > 0"))
+                (days,) = self.conn.execute(
+                    "SELECT COUNT(*) FROM attendance_daily "
+                    "WHERE present > 0").fetchone()
+                return _summary_frame(counts, days, names)
+
+            start, end = _check_range(from_date, to_date)
+            full = []
+            for month, first, last in month_spans(start, end):
+                year, number = int(month[:4]), int(month[5:])
+                if first == 1 and \
+                        last == calendar.monthrange(year, number)[1]:
+                    full.append(month)
+                    continue
+                _add_counts(counts, self.conn.execute(
+                    "SELECT name, COUNT(*), SUM(status = ?), "
+                    "SUM(status = ?) FROM attendance "
+                    "WHERE date BETWEEN ? AND ? GROUP BY name",
+                    (ON_TIME, LATE, f"{month}-{first:02d}",
+                     f"{month}-{last:02d}")))
+            if full:
+                # full months are the contiguous middle of the range
+                _add_counts(counts, self.conn.execute(
+                    "SELECT name, SUM(present), SUM(on_time), SUM(late) "
+                    "FROM attendance_monthly WHERE month BETWEEN ? AND ? "
+                    "GROUP BY name HAVING SUM(present) > 0",
+                    (full[0], full[-1])))
+            (days,) = self.conn.execute(
+                "SELECT COUNT(*) FROM attendance_daily "
+                "WHERE date BETWEEN ? AND ? AND present > 0",
+                (from_date, to_date)).fetchone()
+        return _summary_frame(counts, days, names)
+
+    def describe(self) -> str:
+        return f"{self.db_path} (sqlite)"
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def open_store(backend: str = None, **options):
+    """
+    Store for config.ATTENDANCE_BACKEND (or the given backend).
+    """
+    backend = backend or ATTENDANCE_BACKEND
+    if backend == "sqlite":
+        return SqliteStore(**options)
+    if backend == "csv":
+        return CsvStore(**options)
+    raise ValueError(f"Unknown attendance backend: {backend}")
+
+
+def read_attendance_range(from_date: str, to_date: str, names=None,
+                          store=None):
+    """
+    Rows from from_date to to_date (optionally only these names),
+    None if there are none.
+    """
+    store = store or open_store()
+    return store.read_range(from_date, to_date, names)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Attendance storage (import daily CSV files, "
+                    "rebuild aggregates)")
+    parser.add_argument("--import-csv", action="store_true",
+                        help="load attendance/*.csv into the sqlite store")
+    parser.add_argument("--force", action="store_true",
+                        help="import every file again, not only new ones")
+    parser.add_argument("--attendance-dir", default=ATTENDANCE_DIR)
+    parser.add_argument("--rebuild-aggregates", action="store_true",
+                        help="recompute the daily / monthly / per person "
+                             "count tables from every mark (sqlite backend)")
+    args = parser.parse_args()
+
+    if ATTENDANCE_BACKEND != "sqlite" and not args.import_csv:
+        # the csv layout has no count tables, summaries count the marks
+        store = open_store()
+        if args.rebuild_aggregates:
+            print(f" The {store.backend} backend keeps no count tables, "
+                  f"nothing to rebuild")
+        print(f" {store.describe()}: latest {store.latest_date() or '-'}")
+        return
+
+    store = SqliteStore(import_csv=False)
+    if args.import_csv:
+        stats = store.import_csv(args.attendance_dir, force=args.force)
+        print(f" Imported {stats['rows']} rows from {stats['files']} "
+              f"file(s) into {store.db_path}")
+    if args.rebuild_aggregates:
+        t0 = time.perf_counter()
+        marks = store.rebuild_aggregates()
+        print(f" Rebuilt aggregates from {marks} marks in "
+              f"{time.perf_counter() - t0:.2f} s")
+
+    with store._lock:
+        count, days, people = store.conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT date), COUNT(DISTINCT name) "
+            "FROM attendance").fetchone()
+    print(f" {store.describe()}: {count} marks | {days} days | "
+          f"{people} people | latest {store.latest_date() or '-'}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+#  Background persistence for the recognition loop
+#
+# Attendance rows, unknown face snapshots and log lines are put on a
+# bounded queue and written by one writer thread, so disk I/O never
+# stalls the camera loop.
+#
+# - group commit: log lines waiting in the queue are written with ONE
+#   open+append per file, attendance store rows with ONE append_many
+#   (one sqlite transaction) per store
+# - back pressure: attendance rows wait for space as long as it takes
+#   (never dropped), snapshots and log lines are dropped (and counted)
+#   when queue is full
+# - a row the store could not write is handed back to the caller's
+#   on_failed(row), so it can be marked again
+# - close() flushes everything that is still queued
+
+
+class BackgroundWriter:
+
+    def __init__(self,
+                 max_queue: int = 256,
+                 jpeg_quality: int = 90,
+                 crop_only: bool = False,
+                 batch_size: int = 64):
+        self.jpeg_quality = int(jpeg_quality)
+        self.crop_only = crop_only
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        # metrics
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.max_depth = 0
+
+        self._thread = threading.Thread(target=self._run,
+                                        name="background-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    #  producers (called from recognition loop)
+
+    def append_rows(self, store, row: dict, on_failed=None):
+        """
+        Attendance row for an attendance_store backend. Waits for queue
+        space (never dropped), raises RuntimeError once the writer is
+        closed. on_failed(row) is called from the writer thread if the
+        store raises while writing it.
+        """
+        if self._stop.is_set():
+            raise RuntimeError("BackgroundWriter is closed")
+        self._put(("rows", store, row, on_failed), block=True)
+
+    def save_image(self, path: str, image, box=None) -> bool:
+        """
+        box=(x, y, w, h) and crop_only=True -> only the face is saved.
+        image must not be modified by the caller afterwards.
+        """
+        if self.crop_only and box is not None:
+            x, y, w, h = box
+            image = image[y:y + h, x:x + w]
+        # copy, the caller keeps drawing on the frame
+        return self._put(("image", path, image.copy()), block=False)
+
+    def log(self, path: str, line: str) -> bool:
+        return self._put(("log", path, line), block=False)
+
+    def _put(self, job, block: bool) -> bool:
+        try:
+            if block:
+                self._queue.put(job)
+            else:
+                self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        with self._lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    #  writer thread
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        store_rows = {}
+        log_lines = {}
+        images = []
+
+        for job in batch:
+            kind = job[0]
+            if kind == "rows":
+                _, store, row, on_failed = job
+                store_rows.setdefault(id(store), (store, []))[1].append(
+                    (row, on_failed))
+            elif kind == "log":
+                _, path, line = job
+                log_lines.setdefault(path, []).append(line)
+            else:
+                images.append(job)
+
+        # group commit: one append_many per store, one append per file
+        for store, jobs in store_rows.values():
+            if self._safe(len(jobs), store.append_many,
+                          [row for row, _ in jobs]):
+                continue
+            for row, on_failed in jobs:
+                if on_failed is not None:
+                    on_failed(row)
+
+        for path, lines in log_lines.items():
+            self._safe(len(lines), self._append_lines, path, lines)
+
+        for _, path, image in images:
+            self._safe(1, self._write_image, path, image)
+
+        with self._lock:
+            self.batches += 1
+
+    def _safe(self, count, fn, *args) -> bool:
+        try:
+            fn(*args)
+        except Exception as e:
+            with self._lock:
+                self.errors += count
+            print(f" Background write failed: {e}")
+            return False
+        with self._lock:
+            self.written += count
+        return True
+
+    @staticmethod
+    def _append_lines(path, lines):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _write_image(self, path, image):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        if not cv2.imwrite(path, image, params):
+            raise IOError(f"cv2.imwrite failed: {path}")
+
+    #  shutdown
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until everything queued so far is written.
+        """
+        if timeout is None:
+            self._queue.join()
+            return True
+
+        end = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= end:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "batches": self.batches,
+            }
@@ -0,0 +1,325 @@
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import cv2
+
+from attendance_store import open_store
+from config import TRAINER_DIR
+from identity_gate import VoteWindow
+from mark_attendance import (get_status, labels_for, load_detector,
+                             load_recognizer, predict_face)
+
+#  Offline batch attendance from recorded videos
+#
+# Every video is split into segments of frames. Segments are processed
+# by a process pool (each worker loads cascades + trainer.yml + labels
+# only once) and every worker returns the first time each person was
+# confirmed in its segment: like the live loop, a name counts once it is
+# recognized in K of the last N checked frames (VoteWindow), so a single
+# false positive never writes a row. Results are merged per (person,
+# day) keeping the earliest time and written to the attendance store
+# (attendance_store.py).
+
+FILE_TIME_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})[_ T](\d{2})[-:](\d{2})[-:](\d{2})")
+
+# per worker process state (filled by _init_worker)
+_worker = {}
+
+
+def video_start_time(path: str, default_start=None) -> datetime:
+    """
+    Recording start time of a video:
+      1) --start argument for this video
+      2) date/time in file name e.g. door_2024-05-01_09-00-00.mp4
+      3) file modified time minus video duration
+    """
+    if default_start is not None:
+        return default_start
+
+    m = FILE_TIME_PATTERN.search(os.path.basename(path))
+    if m:
+        date_str, hh, mm, ss = m.groups()
+        return datetime.strptime(f"{date_str} {hh}:{mm}:{ss}",
+                                 "%Y-%m-%d %H:%M:%S")
+
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+    cap.release()
+
+    mtime = datetime.fromtimestamp(os.path.getmtime(path))
+    return mtime - timedelta(seconds=frames / fps)
+
+
+def split_video(path: str, segment_frames: int):
+    """
+    Returns list of (path, start_frame, end_frame, fps).
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f" Video not opening, skipped: {path}")
+        return []
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+
+    if total <= 0:
+        # unknown length (some containers) -> one segment for whole file
+        return [(path, 0, -1, fps)]
+
+    return [(path, start, min(start + segment_frames, total), fps)
+            for start in range(0, total, segment_frames)]
+
+
+def parse_start_times(values, videos) -> dict:
+    """
+    --start values -> {video: datetime}
+    "VIDEO=YYYY-MM-DD HH:MM:SS" per video, a bare time only when there
+    is a single video. Raises ValueError.
+    """
+    by_path = {os.path.abspath(v): v for v in videos}
+    starts = {}
+    for value in values:
+        path, _, stamp = value.rpartition("=")
+        if not path:
+            if len(videos) != 1:
+                raise ValueError("--start needs VIDEO=TIME with more than "
+                                 "one video")
+            path = videos[0]
+        if os.path.abspath(path) not in by_path:
+            raise ValueError(f"--start for a video that is not processed: "
+                             f"{path}")
+        starts[by_path[os.path.abspath(path)]] = datetime.strptime(
+            stamp.strip(), "%Y-%m-%d %H:%M:%S")
+    return starts
+
+
+def _init_worker(detector_options, service=None):
+    # one OpenCV thread per process, the pool gives the parallelism
+    cv2.setNumThreads(1)
+
+    _worker["detector"] = load_detector(**detector_options)
+    # service -> every worker asks one recognition_service.py
+    _worker["recognizer"] = load_recognizer(service=service)
+    if _worker["detector"] is None or _worker["recognizer"] is None:
+        raise RuntimeError("batch worker could not load its model")
+    _worker["labels"] = labels_for(_worker["recognizer"])
+
+
+def models_ready(detector_options=None, service=None) -> bool:
+    """
+    Cascades + model + labels load (checked once in the parent, the
+    loaders print what is missing, instead of failing in every worker).
+    """
+    probe = load_detector(**(detector_options or {}))
+    if probe is None:
+        return False
+    probe.close()
+    recognizer = load_recognizer(service=service)
+    return recognizer is not None and labels_for(recognizer) is not None
+
+
+def process_segment(path, start_frame, end_frame, frame_step,
+                    vote_k=3, vote_n=5):
+    """
+    Runs detection + recognition on one segment.
+    Returns (path, {name: frame index it was confirmed at}, frames_read,
+    frames_checked). vote_k / vote_n -> VoteWindow over checked frames.
+    """
+    detector = _worker["detector"]
+    recognizer = _worker["recognizer"]
+    id_name_map = _worker["labels"]
+
+    votes = VoteWindow(vote_k, vote_n)
+    first_seen = {}
+    frames_read = 0
+    frames_checked = 0
+
+    cap = cv2.VideoCapture(path)
+    if start_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    frame_idx = start_frame
+    while end_frame < 0 or frame_idx < end_frame:
+        # only decode the frames we look at
+        if (frame_idx - start_frame) % frame_step != 0:
+            if not cap.grab():
+                break
+            frame_idx += 1
+            frames_read += 1
+            continue
+
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        frames_read += 1
+        frames_checked += 1
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        names = []
+        for (x, y, w, h) in detector.detect(gray):
+            name, _confidence = predict_face(gray[y:y + h, x:x + w],
+                                             recognizer, id_name_map)
+            if name:
+                names.append(name)
+        for name in votes.add_frame(names):
+            first_seen.setdefault(name, frame_idx)
+
+        frame_idx += 1
+
+    cap.release()
+    return path, first_seen, frames_read, frames_checked
+
+
+def merge_into_store(sightings: dict, store=None):
+    """
+    sightings -> {(name, "YYYY-MM-DD"): datetime first seen}
+    Upserts one mark per person per day into the attendance store
+    (default: config backend), keeping the earliest time also against
+    marks already stored. Returns marks added / updated.
+    """
+    store = store or open_store()
+    rows = []
+    for (name, date_str), seen in sorted(sightings.items()):
+        time_str = seen.strftime("%H:%M")
+        rows.append({"Name": name, "Date": date_str, "Time": time_str,
+                     "Status": get_status(time_str)})
+
+    written = store.merge_earliest(rows)
+    days = sorted({date_str for _name, date_str in sightings})
+    print(f" {len(days)} day(s) merged into {store.describe()}")
+    return written
+
+
+def run_batch(videos, workers=None, segment_seconds=60, frame_step=5,
+              start_times=None, detector_options=None, service=None,
+              vote_k=3, vote_n=5):
+    """
+    start_times -> {video: recording start} (parse_start_times), other
+    videos take theirs from the file name / mtime.
+    Returns {(name, "YYYY-MM-DD"): datetime first confirmed}.
+    """
+    if not models_ready(detector_options, service):
+        return {}
+
+    start_times = start_times or {}
+    segments = []
+    starts = {}
+    video_fps = {}
+    for path in videos:
+        starts[path] = video_start_time(path, start_times.get(path))
+        cap = cv2.VideoCapture(path)
+        video_fps[path] = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        cap.release()
+        segments.extend(
+            split_video(path, max(1, int(segment_seconds * video_fps[path]))))
+
+    if not segments:
+        print(" Nothing to process.")
+        return {}
+
+    workers = workers or os.cpu_count() or 1
+    print(f" {len(videos)} video(s) -> {len(segments)} segments, "
+          f"{workers} worker process(es)")
+
+    sightings = {}
+    total_read = 0
+    total_checked = 0
+    t0 = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(detector_options or {},
+                                       service)) as pool:
+        futures = [
+            pool.submit(process_segment, path, s, e, frame_step,
+                        vote_k, vote_n)
+            for path, s, e, _fps in segments
+        ]
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            path, first_seen, frames_read, frames_checked = future.result()
+            total_read += frames_read
+            total_checked += frames_checked
+
+            for name, frame_idx in first_seen.items():
+                seen = starts[path] + timedelta(
+                    seconds=frame_idx / video_fps[path])
+                key = (name, seen.strftime("%Y-%m-%d"))
+                if key not in sightings or seen < sightings[key]:
+                    sightings[key] = seen
+
+            print(f" segments {done}/{len(segments)}", end="\r")
+
+    elapsed = time.perf_counter() - t0
+    print(f"\n Frames read: {total_read} | recognized on: {total_checked} | "
+          f"{elapsed:.1f}s ({total_read / max(elapsed, 1e-9):.0f} frames/s)")
+
+    return sightings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Batch attendance from recorded videos")
+    parser.add_argument("videos", nargs="+", help="video files")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes (0 = all cores)")
+    parser.add_argument("--segment-seconds", type=float, default=60,
+                        help="video length per work item")
+    parser.add_argument("--frame-step", type=int, default=5,
+                        help="recognize every Nth frame")
+    parser.add_argument("--start", action="append", default=[],
+                        help="recording start 'VIDEO=YYYY-MM-DD HH:MM:SS' "
+                             "(repeatable; a bare time if there is one "
+                             "video), else from file name / mtime")
+    parser.add_argument("--vote-k", type=int, default=3,
+                        help="count a person after K ...")
+    parser.add_argument("--vote-n", type=int, default=5,
+                        help="... of N consecutive checked frames")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only print results, do not write attendance files")
+    parser.add_argument("--service", default="",
+                        help="recognize through a running recognition_service.py")
+    args = parser.parse_args()
+
+    for artifact in ["trainer.yml", "labels.txt"]:
+        if not os.path.exists(os.path.join(TRAINER_DIR, artifact)):
+            print(f" {artifact} not found! Please run train_model.py first.")
+            return
+
+    videos = [v for v in args.videos if os.path.exists(v)]
+    for v in set(args.videos) - set(videos):
+        print(f" Video not found, skipped: {v}")
+
+    try:
+        start_times = parse_start_times(args.start, videos)
+    except ValueError as e:
+        print(f" {e}")
+        return
+
+    sightings = run_batch(videos,
+                          workers=args.workers or None,
+                          segment_seconds=args.segment_seconds,
+                          frame_step=max(1, args.frame_step),
+                          start_times=start_times,
+                          service=args.service or None,
+                          vote_k=args.vote_k,
+                          vote_n=args.vote_n)
+
+    for (name, date_str), seen in sorted(sightings.items(),
+                                         key=lambda kv: kv[1]):
+        print(f" {date_str} {seen.strftime('%H:%M:%S')}  {name}")
+
+    if sightings and not args.dry_run:
+        written = merge_into_store(sightings)
+        print(f" Attendance rows added/updated: {written}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from config import FACE_SIZE, REPORTS_DIR
+from face_detector import CASCADE_FILES, CascadeDetector, detect_faces_3cascades
+from face_store import FaceStore
+from identity_index import IdentityIndex
+from lbph_engine import LBPHEngine
+from model_store import load_model, save_model
+from train_model import get_images_and_labels
+
+#  Benchmark suite (no camera needed)
+#
+# For every roster size (identities x images) a synthetic dataset is
+# written as JPEGs and every stage is timed:
+#
+#   load      get_images_and_labels (cold store = decode, warm = faces.u8)
+#   train     OpenCV LBPH + NumPy engine
+#   model     trainer.yml save / read, trainer.lbph save / load (mmap)
+#   predict   per face latency p50 / p99 (OpenCV, NumPy, IdentityIndex)
+#
+# detect_faces_3cascades and CascadeDetector are timed once on reference
+# frames (--frames DIR, or synthetic frames).
+#
+# Results go to reports/benchmark_<time>.json; --compare old.json lists
+# every timing that got slower than --tolerance and exits with code 1.
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def latency_summary(seconds) -> dict:
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    if len(ms) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+#  Synthetic faces
+
+
+def identity_base(identity: int, seed: int = 0, face_size=FACE_SIZE):
+    """
+    Smooth random "face" of one identity (float32 (h, w)), always the
+    same for the same identity + seed.
+    """
+    rng = np.random.default_rng([seed, identity])
+    w, h = face_size
+
+    coarse = rng.uniform(0, 255, (12, 12)).astype(np.float32)
+    base = cv2.resize(coarse, (w, h), interpolation=cv2.INTER_CUBIC)
+    fine = rng.normal(0, 25, (h // 4, w // 4)).astype(np.float32)
+    base += cv2.resize(fine, (w, h), interpolation=cv2.INTER_LINEAR)
+
+    # oval face on a darker background
+    mask = np.zeros((h, w), dtype=np.float32)
+    cv2.ellipse(mask, (w // 2, h // 2), (int(w * 0.38), int(h * 0.48)),
+                0, 0, 360, 1.0, -1)
+    mask = cv2.GaussianBlur(mask, (0, 0), 6)
+    return base * (0.4 + 0.6 * mask)
+
+
+def synthetic_face(base, rng):
+    """
+    One capture of an identity: small shift / rotation, lighting, noise.
+    Returns uint8 gray (h, w).
+    """
+    h, w = base.shape
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-5, 5), 1.0)
+    m[:, 2] += rng.uniform(-3, 3, 2)
+    img = cv2.warpAffine(base, m, (w, h), borderMode=cv2.BORDER_REFLECT)
+
+    img = img * rng.uniform(0.8, 1.2) + rng.uniform(-20, 20)
+    img += rng.normal(0, 6, img.shape).astype(np.float32)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def make_dataset(root: str, identities: int, images: int, seed: int = 0):
+    """
+    root/S00000/1.jpg ... like dataset/ written by register_face.py
+    """
+    for i in range(identities):
+        person_dir = os.path.join(root, f"S{i:05d}")
+        os.makedirs(person_dir, exist_ok=True)
+
+        base = identity_base(i, seed)
+        rng = np.random.default_rng([seed, i, 1])
+        for n in range(1, images + 1):
+            cv2.imwrite(os.path.join(person_dir, f"{n}.jpg"),
+                        synthetic_face(base, rng))
+
+
+def make_queries(identities: int, count: int, seed: int = 0):
+    """
+    New captures (not in the dataset). Returns (faces, person names).
+    """
+    rng = np.random.default_rng([seed, 2])
+    picked = rng.integers(0, identities, size=count)
+    faces = [synthetic_face(identity_base(int(i), seed), rng) for i in picked]
+    return faces, [f"S{int(i):05d}" for i in picked]
+
+
+def synthetic_frames(count: int, seed: int = 0, size=(640, 480)):
+    """
+    Camera-like frames with 0-2 synthetic faces pasted in.
+    """
+    rng = np.random.default_rng([seed, 3])
+    w, h = size
+    frames = []
+    for _ in range(count):
+        coarse = rng.uniform(40, 200, (9, 12)).astype(np.float32)
+        frame = cv2.resize(coarse, (w, h), interpolation=cv2.INTER_CUBIC)
+        for _ in range(int(rng.integers(0, 3))):
+            side = int(rng.integers(100, 220))
+            face = cv2.resize(
+                synthetic_face(identity_base(int(rng.integers(0, 1000)), seed),
+                               rng), (side, side))
+            x = int(rng.integers(0, w - side))
+            y = int(rng.integers(0, h - side))
+            frame[y:y + side, x:x + side] = face
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+
+def load_frames(folder: str, limit: int):
+    frames = []
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")):
+            continue
+        img = cv2.imread(os.path.join(folder, name), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            frames.append(img)
+        if len(frames) >= limit:
+            break
+    return frames
+
+
+#  Stages
+
+
+def bench_detection(frames, repeat: int = 3) -> dict:
+    cascades = [cv2.CascadeClassifier(path) for _, path in CASCADE_FILES]
+    if any(c.empty() for c in cascades):
+        raise FileNotFoundError("Haar cascade xml missing in models/")
+
+    detect_faces_3cascades(frames[0], *cascades)      # warm up
+
+    three = []
+    found = 0
+    for _ in range(repeat):
+        for gray in frames:
+            faces, s = timed(detect_faces_3cascades, gray, *cascades)
+            three.append(s)
+            found += len(faces)
+
+    detector = CascadeDetector()
+    adaptive = []
+    for _ in range(repeat):
+        for gray in frames:
+            _, s = timed(detector.detect, gray)
+            adaptive.append(s)
+    detector.close()
+
+    return {
+        "frames": len(frames),
+        "frame_size": list(frames[0].shape[::-1]),
+        "faces_per_frame": round(found / (repeat * len(frames)), 3),
+        "detect_faces_3cascades": latency_summary(three),
+        "cascade_detector": latency_summary(adaptive),
+    }
+
+
+def predict_latency(predict, faces, names, id_name_map):
+    seconds = []
+    correct = 0
+    for face, name in zip(faces, names):
+        (label, _dist), s = timed(predict, face)
+        seconds.append(s)
+        if id_name_map.get(label) == name:
+            correct += 1
+    summary = latency_summary(seconds)
+    summary["accuracy"] = round(correct / max(1, len(faces)), 4)
+    return summary
+
+
+def bench_size(identities: int, images: int, queries: int, work_dir: str,
+               workers: int = None, seed: int = 0) -> dict:
+    tag = f"{identities}x{images}"
+    dataset_dir = os.path.join(work_dir, f"dataset_{tag}")
+    stages = {}
+
+    _, stages["generate_s"] = timed(make_dataset, dataset_dir, identities,
+                                    images, seed)
+
+    #  get_images_and_labels: cold (decode) and warm (face store)
+    # labels / state of work_dir (never exist): trainer/ is not read
+    store = FaceStore(os.path.join(work_dir, f"faces_{tag}.u8"),
+                      os.path.join(work_dir, f"faces_{tag}.json"))
+    paths = {"labels_path": os.path.join(work_dir, f"labels_{tag}.txt"),
+             "state_path": os.path.join(work_dir, f"state_{tag}.json")}
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, stages["load_cold_s"] = timed(get_images_and_labels, workers,
+                                         dataset_dir, store, **paths)
+        (faces, labels, id_name_map), stages["load_warm_s"] = timed(
+            get_images_and_labels, workers, dataset_dir, store, **paths)
+
+    #  training
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    _, stages["train_opencv_s"] = timed(recognizer.train, list(faces), labels)
+
+    engine = LBPHEngine()
+    _, stages["train_numpy_s"] = timed(engine.train, faces, labels)
+    del faces
+
+    #  model files
+    yml_path = os.path.join(work_dir, f"trainer_{tag}.yml")
+    lbph_path = os.path.join(work_dir, f"trainer_{tag}.lbph")
+
+    _, stages["save_yml_s"] = timed(recognizer.save, yml_path)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    _, stages["load_yml_s"] = timed(recognizer.read, yml_path)
+
+    _, stages["save_lbph_s"] = timed(save_model, engine, lbph_path)
+    (engine, _names), stages["load_lbph_s"] = timed(load_model, lbph_path)
+
+    index, stages["index_build_s"] = timed(IdentityIndex, engine, 5)
+
+    #  per face predict latency
+    query_faces, query_names = make_queries(identities, queries, seed)
+    predict = {
+        "opencv": predict_latency(recognizer.predict, query_faces,
+                                  query_names, id_name_map),
+        "numpy": predict_latency(engine.predict, query_faces,
+                                 query_names, id_name_map),
+        "index": predict_latency(index.predict, query_faces,
+                                 query_names, id_name_map),
+    }
+
+    for key in stages:
+        stages[key] = round(stages[key], 4)
+
+    return {
+        "identities": identities,
+        "images": images,
+        "faces": int(len(labels)),
+        "yml_mb": round(os.path.getsize(yml_path) / 1e6, 2),
+        "lbph_mb": round(os.path.getsize(lbph_path) / 1e6, 2),
+        "stages": stages,
+        "predict": predict,
+    }
+
+
+#  Regression check
+
+
+def _timings(results: dict) -> dict:
+    """
+    Flat {"100x30/stages/train_opencv_s": value} of every timing.
+    """
+    flat = {}
+
+    def walk(prefix, node):
+        for key, value in node.items():
+            path = f"{prefix}/{key}" if prefix else key
+            if isinstance(value, dict):
+                walk(path, value)
+            elif key.endswith(("_s", "_ms")) and isinstance(value, (int, float)):
+                flat[path] = float(value)
+
+    walk("detection", results.get("detection") or {})
+    for size in results.get("sizes", []):
+        walk(f"{size['identities']}x{size['images']}", size)
+    return flat
+
+
+def compare_results(current: dict, previous: dict, tolerance: float = 0.2):
+    """
+    Timings present in both runs that are more than `tolerance` slower.
+    Returns list of (name, previous, current).
+    """
+    old = _timings(previous)
+    slower = []
+    for name, value in _timings(current).items():
+        before = old.get(name)
+        if before is None:
+            continue
+        # ignore sub-millisecond noise
+        floor = 0.5 if name.endswith("_ms") else 0.0005
+        if value > before * (1 + tolerance) and value - before > floor:
+            slower.append((name, before, value))
+    return slower
+
+
+def environment() -> dict:
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark loading, training, model files, detection "
+                    "and recognition on synthetic identities")
+    parser.add_argument("--sizes", default="10,100",
+                        help="identity counts, e.g. 10,100,1000,5000")
+    parser.add_argument("--images", type=int, default=30,
+                        help="images per identity")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="faces for predict latency")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="image loading threads")
+    parser.add_argument("--frames", default=None,
+                        help="folder with reference frames for detection")
+    parser.add_argument("--detect-frames", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None,
+                        help="result json (default reports/benchmark_*.json)")
+    parser.add_argument("--compare", default=None,
+                        help="previous result json, report regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown for --compare (0.2 = 20%%)")
+    parser.add_argument("--work-dir", default=None,
+                        help="where synthetic datasets are written "
+                             "(default: temp folder, removed at the end)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="attendance_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": environment(),
+        "config": {"sizes": sizes, "images": args.images,
+                   "queries": args.queries, "workers": args.workers,
+                   "seed": args.seed, "face_size": list(FACE_SIZE)},
+        "detection": None,
+        "sizes": [],
+    }
+
+    try:
+        #  detection on reference frames
+        if args.frames:
+            frames = load_frames(args.frames, args.detect_frames)
+        else:
+            frames = synthetic_frames(args.detect_frames, args.seed)
+
+        if frames:
+            try:
+                results["detection"] = bench_detection(frames)
+                d = results["detection"]
+                print(f" Detection ({d['frames']} frames): "
+                      f"3 cascades p50 {d['detect_faces_3cascades']['p50_ms']:.2f} ms | "
+                      f"adaptive p50 {d['cascade_detector']['p50_ms']:.2f} ms")
+            except FileNotFoundError as e:
+                print(f" Detection skipped: {e}")
+        else:
+            print(f" Detection skipped: no frames in {args.frames}")
+
+        #  every roster size
+        for identities in sizes:
+            print(f" Running {identities} identities x {args.images} images ...")
+            row = bench_size(identities, args.images, args.queries, work_dir,
+                             args.workers, args.seed)
+            results["sizes"].append(row)
+
+            st = row["stages"]
+            print(f"   load cold {st['load_cold_s']:.2f} s | "
+                  f"warm {st['load_warm_s']:.2f} s | "
+                  f"train {st['train_opencv_s']:.2f} s (numpy "
+                  f"{st['train_numpy_s']:.2f} s) | "
+                  f"yml save/read {st['save_yml_s']:.2f}/{st['load_yml_s']:.2f} s | "
+                  f"lbph save/load {st['save_lbph_s']:.3f}/{st['load_lbph_s']:.3f} s")
+            for name, p in row["predict"].items():
+                print(f"   predict {name:<6} p50 {p['p50_ms']:.2f} ms | "
+                      f"p99 {p['p99_ms']:.2f} ms | accuracy {p['accuracy']:.3f}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    out = args.out or os.path.join(
+        REPORTS_DIR,
+        f"benchmark_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f" Results saved: {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        slower = compare_results(results, previous, args.tolerance)
+        if not slower:
+            print(f" No regressions against {args.compare}")
+            return
+        print(f" {len(slower)} timings slower than {args.compare}:")
+        for name, before, value in slower:
+            print(f"   {name}: {before:g} -> {value:g}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
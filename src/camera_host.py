@@ -0,0 +1,228 @@
+import argparse
+import os
+import time
+
+import cv2
+
+from attendance_ledger import AttendanceLedger
+from background_writer import BackgroundWriter
+from face_tracker import FaceTracker
+from frame_source import FrameDisplay, open_source
+from mark_attendance import (AttendanceActions, add_recognition_arguments,
+                             detector_options_from, draw_results,
+                             labels_for, load_detector, load_recognizer,
+                             predict_face, recognize_faces)
+from pipeline import MultiSourcePipeline, format_source_stats
+from shards import shards_for_camera
+
+#  Multi camera recognition host
+#
+# One process serves several doors:
+#
+#   capture thread per source -> shared recognition workers -> one ledger
+#
+# - cascades are loaded once per WORKER, the model and labels once per
+#   process (with --camera-shards once per distinct shard set)
+# - every source keeps its own tracker / vote window / cooldowns, the
+#   attendance ledger and background writer are shared
+# - log lines and unknown snapshots are tagged with the source id
+#
+#   python camera_host.py --sources door_a=0,door_b=1,lobby=videos/lobby.mp4
+
+
+def parse_sources(spec: str) -> list:
+    """
+    "door_a=0,door_b=video.mp4,2" -> [("door_a", "0"), ("door_b",
+    "video.mp4"), ("2", "2")]
+    """
+    sources = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, value = item.partition("=")
+        if not sep:
+            name, value = item, item
+        sources.append((name.strip(), value.strip()))
+    return sources
+
+
+def run_host(caps: dict, recognizers: dict, id_name_map: dict,
+             actions: dict, workers: int = 2, detect_every: int = 1,
+             detector_options=None, headless: bool = True,
+             stats_every: float = 0):
+    """
+    caps        -> {source_id: FrameSource}
+    recognizers -> {source_id: recognizer} (may be the same object)
+    actions     -> {source_id: AttendanceActions}
+    """
+    detectors = []
+
+    # trackers belong to a camera, not to a worker (the scheduler never
+    # gives one source to two workers at once)
+    trackers = {source: FaceTracker(detect_every=detect_every)
+                for source in caps} if detect_every > 1 else {}
+
+    def make_processor():
+        detector = load_detector(**(detector_options or {}))
+        detectors.append(detector)
+
+        def process(packet):
+            source = packet.source
+            recognizer = recognizers[source]
+            gray = cv2.cvtColor(packet.frame, cv2.COLOR_BGR2GRAY)
+
+            if source in trackers:
+                results = trackers[source].update(
+                    gray, detector.detect,
+                    lambda roi: predict_face(roi, recognizer, id_name_map))
+            else:
+                results = recognize_faces(gray, detector, recognizer,
+                                          id_name_map)
+
+            actions[source].handle(packet.frame, results)
+            return results
+
+        return process
+
+    pipeline = MultiSourcePipeline({s: cap.read for s, cap in caps.items()},
+                                   make_processor, workers=workers)
+    displays = {source: FrameDisplay(f"Smart Attendance - {source}", headless)
+                for source in caps}
+
+    pipeline.start()
+    last_stats = time.monotonic()
+
+    try:
+        while pipeline.running:
+            if headless:
+                time.sleep(0.2)
+            else:
+                for source, slot in pipeline.results.items():
+                    packet = slot.get(timeout=0)
+                    if packet is None:
+                        continue
+                    draw_results(packet.frame, packet.results)
+                    if not displays[source].show(packet.frame):
+                        raise KeyboardInterrupt
+                if not displays[next(iter(displays))].poll():
+                    break
+
+            if stats_every and time.monotonic() - last_stats >= stats_every:
+                print(" " + format_source_stats(pipeline.stats()))
+                last_stats = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        for detector in detectors:
+            detector.close()
+        for display in displays.values():
+            display.close()
+
+    for source, error in pipeline.errors.items():
+        print(f" {error}: {source} ({caps[source]})")
+    print(" Host stats: " + format_source_stats(pipeline.stats()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recognize faces from several cameras with one model")
+    parser.add_argument("--sources", required=True,
+                        help="comma separated [name=]source, source = camera "
+                             "index, video file or image folder")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="shared recognition threads "
+                             "(default: min(sources, CPU count))")
+    parser.add_argument("--show", action="store_true",
+                        help="one window per source (default headless)")
+    parser.add_argument("--loop", action="store_true",
+                        help="restart video files / image folders at the end")
+    parser.add_argument("--camera-shards", action="store_true",
+                        help="search only the shards of each source name "
+                             "(data/shards.json cameras)")
+    add_recognition_arguments(parser)
+    args = parser.parse_args()
+
+    sources = parse_sources(args.sources)
+    if not sources:
+        print(" No sources given")
+        return
+    if len({name for name, _ in sources}) != len(sources):
+        print(" Source names must be unique")
+        return
+
+    #  cascades present? (workers load their own copy)
+    detector_options = detector_options_from(args)
+    probe = load_detector(**detector_options)
+    if probe is None:
+        return
+    probe.close()
+
+    #  One model for every source (or one per distinct shard set)
+    # --service: one client, the service has its own shards
+    loaded = {}
+    recognizers = {}
+    for name, _spec in sources:
+        shards = shards_for_camera(name) \
+            if args.camera_shards and not args.service else []
+        key = tuple(shards)
+        if key not in loaded:
+            loaded[key] = load_recognizer(args.engine, args.index_probe,
+                                          shards=shards,
+                                          shard_fallback=args.shard_fallback,
+                                          service=args.service)
+            if loaded[key] is None:
+                return
+            what = ", ".join(shards) if shards else "global model"
+            print(f" Loaded recognizer: {what}")
+        recognizers[name] = loaded[key]
+
+    id_name_map = labels_for(next(iter(loaded.values())))
+    if id_name_map is None:
+        return
+
+    caps = {}
+    for name, spec in sources:
+        cap = open_source(spec, loop=args.loop)
+        if not cap.isOpened():
+            print(f" Frame source not opening: {name} ({cap})")
+            for opened in caps.values():
+                opened.release()
+            return
+        caps[name] = cap
+
+    #  One ledger + writer for all doors, votes / cooldowns per door
+    writer = BackgroundWriter(max_queue=args.writer_queue,
+                              jpeg_quality=args.jpeg_quality,
+                              crop_only=args.unknown_crop_only)
+    ledger = AttendanceLedger(writer=writer)
+    actions = {name: AttendanceActions(ledger,
+                                       vote_k=args.vote_k,
+                                       vote_n=args.vote_n,
+                                       cooldown=args.cooldown,
+                                       unknown_interval=args.unknown_interval,
+                                       source=name)
+               for name in caps}
+
+    workers = args.workers or min(len(caps), os.cpu_count() or 1)
+    print(f" Hosting {len(caps)} sources with {workers} recognition "
+          f"worker(s). Press Ctrl+C to stop.")
+
+    run_host(caps, recognizers, id_name_map, actions,
+             workers=workers,
+             detect_every=args.detect_every,
+             detector_options=detector_options,
+             headless=not args.show,
+             stats_every=args.stats_every)
+
+    writer.close()
+    print(" Writer stats:", writer.stats())
+    print(" Marked:", {name: a.marked for name, a in actions.items()})
+
+    for cap in caps.values():
+        cap.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,22 @@ USERS_CSV = os.path.join(DATA_DIR, "users.csv")
 TEAM_CSV = os.path.join(DATA_DIR, "manager_teams.csv")
 
 
+#  ATTENDANCE STORAGE (attendance_store.py)
+# "sqlite" -> data/attendance.db (indexed date / name lookups, count tables;
+#             imports the existing day files when it is opened)
+# "csv"    -> attendance/YYYY-MM-DD.csv only (old layout, no index)
+
+ATTENDANCE_BACKEND = "sqlite"
+# sqlite backend: keep writing attendance/YYYY-MM-DD.csv as well, for
+# anything that still reads the day files (exports, scripts, backups)
+ATTENDANCE_CSV_MIRROR = True
+ATTENDANCE_DB = os.path.join(DATA_DIR, "attendance.db")
+# closed months compacted by attendance_partitions.py (csv backend reads)
+ATTENDANCE_PARTITION_DIR = os.path.join(ATTENDANCE_DIR, "monthly")
+# parsed day files / partitions kept in memory per process (LRU)
+ATTENDANCE_CACHE_MB = 128
+
+
 #  HAARCASCADE XML FILE PATHS (3 Cascades)
 
 FRONTAL_DEFAULT_XML = os.path.join(MODELS_DIR, "haarcascade_frontalface_default.xml")
@@ -39,6 +55,7 @@ PROFILE_XML = os.path.join(MODELS_DIR, "haarcascade_profileface.xml")
 #  FACE SETTINGS
 
 FACE_SIZE = (200, 200)     # must be same in register + training
+RECOGNITION_THRESHOLD = 70  # LBPH distance, lower = stricter
 
 
 #  OFFICE START TIME (Late / On Time Feature)
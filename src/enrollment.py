@@ -0,0 +1,165 @@
+import math
+
+import cv2
+import numpy as np
+
+#  Enrollment quality gate (register_face.py)
+#
+# A capture is kept only if it adds something to the model:
+#
+# 1) sharp       -> variance of the Laplacian (blur, motion)
+# 2) new pose    -> face size in the frame x head turn / side light;
+#                   every (size, turn) bin takes at most `per_pose`
+#                   samples, so the person has to move to fill the set
+# 3) not a copy  -> perceptual hash (DCT) at least `min_hash_distance`
+#                   bits away from every face already kept (including
+#                   the faces already in the person folder)
+
+SIZE_EDGES = (0.25, 0.40)     # face width / frame width
+TURN_EDGES = (-0.08, 0.08)    # (left - right) / (left + right) brightness
+
+
+def sharpness(face) -> float:
+    return float(cv2.Laplacian(face, cv2.CV_64F).var())
+
+
+def perceptual_hash(face) -> int:
+    """
+    64 bit pHash: low 8x8 DCT frequencies (without DC) above their median.
+    """
+    small = cv2.resize(face, (32, 32), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(small.astype(np.float32))[:8, :8].ravel()[1:]
+    bits = dct > np.median(dct)
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def pose_bin(face, box, frame_shape) -> tuple:
+    """
+    (size bin, turn bin) of one face crop.
+    """
+    _x, _y, w, _h = box
+    rel_size = w / float(frame_shape[1])
+
+    half = face.shape[1] // 2
+    left = float(face[:, :half].mean())
+    right = float(face[:, half:].mean())
+    turn = (left - right) / (left + right + 1.0)
+
+    return (int(np.searchsorted(SIZE_EDGES, rel_size)),
+            int(np.searchsorted(TURN_EDGES, turn)))
+
+
+class EnrollmentGate:
+
+    def __init__(self, target: int = 30, min_sharpness: float = 50.0,
+                 min_hash_distance: int = 6, min_poses: int = 3):
+        """
+        target    -> distinct samples to collect
+        min_poses -> pose bins needed to reach target
+                     (per_pose = target / min_poses)
+        """
+        self.target = max(1, int(target))
+        self.min_sharpness = min_sharpness
+        self.min_hash_distance = min_hash_distance
+        self.per_pose = max(1, math.ceil(self.target / max(1, min_poses)))
+
+        self.hashes = []
+        self.poses = {}
+        self.accepted = 0
+        self.rejected = {"blurry": 0, "duplicate": 0, "pose_full": 0,
+                         "not_saved": 0}
+        self.last_reason = ""
+        self._last_pose = None
+
+    def seed(self, faces):
+        """
+        Faces already saved for this person (duplicates of them are
+        rejected, they do not count towards target).
+        """
+        for face in faces:
+            self.hashes.append(perceptual_hash(face))
+
+    def offer(self, face, box, frame_shape) -> bool:
+        """
+        face -> gray crop resized to FACE_SIZE
+        True if the sample should be saved (and it is recorded).
+        """
+        if sharpness(face) < self.min_sharpness:
+            return self._reject("blurry")
+
+        pose = pose_bin(face, box, frame_shape)
+        if self.poses.get(pose, 0) >= self.per_pose:
+            return self._reject("pose_full")
+
+        h = perceptual_hash(face)
+        if any(hamming(h, old) < self.min_hash_distance for old in self.hashes):
+            return self._reject("duplicate")
+
+        self.hashes.append(h)
+        self.poses[pose] = self.poses.get(pose, 0) + 1
+        self.accepted += 1
+        self.last_reason = "saved"
+        self._last_pose = pose
+        return True
+
+    def withdraw(self):
+        """
+        The sample accepted by the last offer() could not be saved:
+        it no longer counts (the same view can be offered again).
+        """
+        if self._last_pose is None:
+            return
+        self.hashes.pop()
+        self.poses[self._last_pose] -= 1
+        if not self.poses[self._last_pose]:
+            del self.poses[self._last_pose]
+        self.accepted -= 1
+        self._last_pose = None
+        self._reject("not_saved")
+
+    def _reject(self, reason: str) -> bool:
+        self._last_pose = None
+        self.rejected[reason] += 1
+        self.last_reason = reason
+        return False
+
+    @property
+    def done(self) -> bool:
+        return self.accepted >= self.target
+
+    def hint(self) -> str:
+        """
+        Short instruction for the person in front of the camera.
+        """
+        if self.last_reason == "blurry":
+            return "Hold still"
+        if self.last_reason == "pose_full":
+            return "Turn your head / move closer or back"
+        if self.last_reason == "duplicate":
+            return "Change expression or pose"
+        return ""
+
+    def open_poses(self) -> dict:
+        """
+        {"size-turn": samples} of every pose bin that is not full yet
+        (the views still missing when capture stops early).
+        """
+        return {f"{s}-{t}": self.poses.get((s, t), 0)
+                for s in range(len(SIZE_EDGES) + 1)
+                for t in range(len(TURN_EDGES) + 1)
+                if self.poses.get((s, t), 0) < self.per_pose}
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+            "poses": {f"{s}-{t}": n for (s, t), n in sorted(self.poses.items())},
+        }
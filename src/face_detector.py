@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+
+from config import FRONTAL_DEFAULT_XML, FRONTAL_ALT2_XML, PROFILE_XML
+
+#  Shared face detection (register_face + mark_attendance)
+
+CASCADE_FILES = [
+    ("frontal_default", FRONTAL_DEFAULT_XML),
+    ("frontal_alt2", FRONTAL_ALT2_XML),
+    ("profile", PROFILE_XML),
+]
+
+DETECT_PARAMS = {"scaleFactor": 1.2, "minNeighbors": 5, "minSize": (80, 80)}
+
+
+def detect_faces_3cascades(gray, c1, c2, c3):
+    """
+    Try face detection with 3 cascades.
+    Priority:
+      1) frontal_default
+      2) frontal_alt2
+      3) profile_face
+    """
+    faces = c1.detectMultiScale(gray, **DETECT_PARAMS)
+    if len(faces) == 0:
+        faces = c2.detectMultiScale(gray, **DETECT_PARAMS)
+    if len(faces) == 0:
+        faces = c3.detectMultiScale(gray, **DETECT_PARAMS)
+    return faces
+
+
+class CascadeStats:
+    __slots__ = ("name", "priority", "runs", "hits", "skipped",
+                 "total_time", "recent_hit_rate")
+
+    def __init__(self, name: str, priority: int):
+        self.name = name
+        self.priority = priority
+        self.runs = 0
+        self.hits = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.recent_hit_rate = 0.0
+
+    def record(self, hit: bool, elapsed: float, alpha: float):
+        self.runs += 1
+        self.total_time += elapsed
+        if hit:
+            self.hits += 1
+        # exponential moving average -> "recent" success
+        self.recent_hit_rate += alpha * (float(hit) - self.recent_hit_rate)
+
+    def as_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "hits": self.hits,
+            "skipped": self.skipped,
+            "hit_rate": round(self.hits / self.runs, 3) if self.runs else 0.0,
+            "recent_hit_rate": round(self.recent_hit_rate, 3),
+            "avg_ms": round(self.total_time * 1000 / self.runs, 2)
+            if self.runs else 0.0,
+        }
+
+
+class CascadeDetector:
+    """
+    Runs the cascades until one finds a face, like detect_faces_3cascades,
+    but with:
+
+    adaptive    -> try cascades ordered by recent hit rate (instead of
+                   always default -> alt2 -> profile)
+    budget_ms   -> per frame time budget, remaining cascades are skipped
+                   once it is used up (0 = no budget)
+    parallel    -> run all cascades at the same time in a thread pool and
+                   take the first non-empty result
+
+    One detector must only be used by one thread at a time
+    (cv2.CascadeClassifier is not thread safe), create one per worker.
+    """
+
+    def __init__(self,
+                 cascade_files=None,
+                 adaptive: bool = True,
+                 budget_ms: float = 0,
+                 parallel: bool = False,
+                 alpha: float = 0.05):
+        cascade_files = cascade_files or CASCADE_FILES
+
+        self.cascades = []
+        self.stats = {}
+        for priority, (name, path) in enumerate(cascade_files):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cascade not found: {path}")
+            self.cascades.append((name, cv2.CascadeClassifier(path)))
+            self.stats[name] = CascadeStats(name, priority)
+
+        self.adaptive = adaptive
+        self.budget = budget_ms / 1000.0
+        self.alpha = alpha
+        self.frames = 0
+        self.budget_cuts = 0
+
+        self.parallel = parallel
+        self._pool = None
+        self._busy = set()
+        self._busy_lock = threading.Lock()
+        if parallel:
+            self._pool = ThreadPoolExecutor(max_workers=len(self.cascades),
+                                            thread_name_prefix="cascade")
+
+    def order(self):
+        """
+        Cascades in the order they will be tried for the next frame.
+        """
+        if not self.adaptive:
+            return list(self.cascades)
+
+        return sorted(self.cascades,
+                      key=lambda c: (-self.stats[c[0]].recent_hit_rate,
+                                     self.stats[c[0]].priority))
+
+    def detect(self, gray):
+        self.frames += 1
+        if self.parallel:
+            return self._detect_parallel(gray)
+        return self._detect_sequential(gray)
+
+    __call__ = detect
+
+    def _run(self, name, cascade, gray):
+        start = time.perf_counter()
+        faces = cascade.detectMultiScale(gray, **DETECT_PARAMS)
+        self.stats[name].record(len(faces) > 0,
+                                time.perf_counter() - start,
+                                self.alpha)
+        return faces
+
+    def _detect_sequential(self, gray):
+        start = time.perf_counter()
+        faces = ()
+
+        order = self.order()
+        for i, (name, cascade) in enumerate(order):
+            if i > 0 and self.budget and \
+                    time.perf_counter() - start >= self.budget:
+                self.budget_cuts += 1
+                for skipped_name, _ in order[i:]:
+                    self.stats[skipped_name].skipped += 1
+                break
+
+            faces = self._run(name, cascade, gray)
+            if len(faces) > 0:
+                break
+
+        return faces
+
+    def _run_parallel(self, name, cascade, gray):
+        try:
+            return self._run(name, cascade, gray)
+        finally:
+            with self._busy_lock:
+                self._busy.discard(name)
+
+    def _detect_parallel(self, gray):
+        futures = []
+        with self._busy_lock:
+            for name, cascade in self.order():
+                # still busy with an older frame -> skip for this frame
+                if name in self._busy:
+                    self.stats[name].skipped += 1
+                    continue
+                self._busy.add(name)
+                futures.append(
+                    self._pool.submit(self._run_parallel, name, cascade,
+                                      gray))
+
+        timeout = self.budget or None
+        start = time.perf_counter()
+        pending = set(futures)
+
+        while pending:
+            if timeout is not None:
+                remaining = timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self.budget_cuts += 1
+                    break
+            else:
+                remaining = None
+
+            done, pending = wait(pending, timeout=remaining,
+                                 return_when=FIRST_COMPLETED)
+            for f in done:
+                faces = f.result()
+                if len(faces) > 0:
+                    # the others finish in the background, they are
+                    # skipped on the next frame while still busy
+                    return faces
+
+        return ()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def report(self) -> dict:
+        return {
+            "frames": self.frames,
+            "budget_cuts": self.budget_cuts,
+            "order": [name for name, _ in self.order()],
+            "cascades": {name: s.as_dict() for name, s in self.stats.items()},
+        }
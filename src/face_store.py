@@ -0,0 +1,323 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from config import DATASET_DIR, TRAINER_DIR, FACE_SIZE
+
+#  Packed face store (trainer/faces.u8 + trainer/faces_manifest.json)
+#
+# Training used to decode every dataset JPEG on every run. The store
+# keeps the preprocessed faces (gray, FACE_SIZE) in ONE raw uint8 file:
+#
+#   faces.u8              row i = one face, h * w bytes, append only
+#   faces_manifest.json   "Person/1.jpg" -> size, mtime, sha1, person, row
+#
+# refresh() only opens files whose size / mtime changed and only decodes
+# them if their content hash changed too. Rows of deleted / replaced
+# images stay in faces.u8 until they outnumber the live rows, then the
+# file is compacted. Faces are read back through a memory map.
+
+FACE_STORE_PATH = os.path.join(TRAINER_DIR, "faces.u8")
+FACE_MANIFEST_PATH = os.path.join(TRAINER_DIR, "faces_manifest.json")
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+
+
+def decode_faces(paths, face_size=FACE_SIZE, known_hashes=None,
+                 workers: int = None, chunk_size: int = 64):
+    """
+    Reads every file once: sha1 of its bytes + gray / resized face.
+    Chunks of paths run on a thread pool (imdecode / cvtColor / resize
+    release the GIL). A file whose hash equals known_hashes[i] is not
+    decoded.
+
+    Returns (faces uint8 (N, h, w), hashes, decoded bool (N,))
+    hashes[i] is None if the file could not be read.
+    """
+    w, h = face_size
+    faces = np.empty((len(paths), h, w), dtype=np.uint8)
+    decoded = np.zeros(len(paths), dtype=bool)
+    hashes = [None] * len(paths)
+    known_hashes = known_hashes or [None] * len(paths)
+
+    def load_chunk(start):
+        for i in range(start, min(start + chunk_size, len(paths))):
+            try:
+                with open(paths[i], "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+
+            hashes[i] = hashlib.sha1(data).hexdigest()
+            if hashes[i] == known_hashes[i]:
+                continue
+
+            img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8),
+                               cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+
+            #  same preprocessing as training: gray + FACE_SIZE
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            faces[i] = cv2.resize(gray, face_size)
+            decoded[i] = True
+
+    workers = workers or os.cpu_count() or 1
+    starts = range(0, len(paths), chunk_size)
+    if workers <= 1 or len(starts) <= 1:
+        for start in starts:
+            load_chunk(start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(load_chunk, starts))
+
+    return faces, hashes, decoded
+
+
+class FaceStore:
+
+    def __init__(self, data_path: str = FACE_STORE_PATH,
+                 manifest_path: str = FACE_MANIFEST_PATH,
+                 face_size=FACE_SIZE):
+        self.data_path = data_path
+        self.manifest_path = manifest_path
+        self.face_size = tuple(face_size)
+
+        self.entries = {}     # "Person/1.jpg" -> dict (see header)
+        self.rows = 0         # rows written in faces.u8 (live + dead)
+
+        self._load_manifest()
+
+    @property
+    def row_bytes(self) -> int:
+        return self.face_size[0] * self.face_size[1]
+
+    #  manifest
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            print(f" Face store manifest unreadable, rebuilding: "
+                  f"{self.manifest_path}")
+            return
+
+        # other face size -> every face has to be decoded again
+        if tuple(manifest.get("face_size", ())) != self.face_size:
+            return
+
+        self.entries = manifest.get("entries", {})
+        self.rows = int(manifest.get("rows", 0))
+
+    def _save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        manifest = {
+            "version": 1,
+            "face_size": list(self.face_size),
+            "rows": self.rows,
+            "entries": self.entries,
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    #  refresh from dataset/
+
+    def scan(self, dataset_dir: str = DATASET_DIR):
+        """
+        Returns ({"Person/1.jpg": (person, path, size, mtime_ns)}, skipped)
+        skipped -> files that are not images
+        """
+        files = {}
+        skipped = 0
+        if not os.path.isdir(dataset_dir):
+            return files, skipped
+
+        for person in sorted(os.listdir(dataset_dir)):
+            person_dir = os.path.join(dataset_dir, person)
+            if not os.path.isdir(person_dir):
+                continue
+            with os.scandir(person_dir) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    if not entry.name.lower().endswith(IMAGE_EXTS):
+                        skipped += 1
+                        continue
+                    st = entry.stat()
+                    files[f"{person}/{entry.name}"] = (
+                        person, entry.path, st.st_size, st.st_mtime_ns)
+        return files, skipped
+
+    def refresh(self, dataset_dir: str = DATASET_DIR, workers: int = None):
+        """
+        Brings the store in line with dataset/. Returns a stats dict.
+        """
+        self._truncate()
+        files, skipped = self.scan(dataset_dir)
+
+        removed = [key for key in self.entries if key not in files]
+        for key in removed:
+            del self.entries[key]
+
+        todo = []
+        for key, (_person, _path, size, mtime_ns) in files.items():
+            entry = self.entries.get(key)
+            if entry is None or entry["size"] != size or \
+                    entry["mtime_ns"] != mtime_ns:
+                todo.append(key)
+
+        t0 = time.perf_counter()
+        faces, hashes, decoded = decode_faces(
+            [files[key][1] for key in todo], self.face_size,
+            [self.entries.get(key, {}).get("sha1") for key in todo],
+            workers)
+        decode_s = time.perf_counter() - t0
+
+        stats = {"files": len(files), "added": 0, "changed": 0,
+                 "unchanged": len(files) - len(todo), "removed": len(removed),
+                 "unreadable": 0, "skipped": skipped,
+                 "decoded": int(decoded.sum()), "decode_s": decode_s}
+
+        with open(self.data_path, "ab") as f:
+            for i, key in enumerate(todo):
+                person, path, size, mtime_ns = files[key]
+                entry = self.entries.get(key)
+
+                if entry is not None and hashes[i] == entry["sha1"]:
+                    # touched, same content -> keep the row
+                    entry["size"], entry["mtime_ns"] = size, mtime_ns
+                    stats["unchanged"] += 1
+                    continue
+
+                stats["changed" if entry is not None else "added"] += 1
+
+                row = -1
+                if decoded[i]:
+                    f.write(faces[i].tobytes())
+                    row = self.rows
+                    self.rows += 1
+                else:
+                    print(f"Unreadable image skipped: {path}")
+                    stats["unreadable"] += 1
+
+                self.entries[key] = {"person": person, "size": size,
+                                     "mtime_ns": mtime_ns,
+                                     "sha1": hashes[i], "row": row}
+
+        live = self.live_rows()
+        if self.rows - live > live:
+            self.compact()
+
+        self._save_manifest()
+        stats["rows"] = self.rows
+        stats["live_rows"] = self.live_rows()
+        return stats
+
+    def _truncate(self):
+        """
+        Drops bytes after the last row in the manifest (left by a run
+        that stopped before saving its manifest).
+        """
+        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        size = self.rows * self.row_bytes
+        if not os.path.exists(self.data_path):
+            # faces.u8 deleted -> manifest is useless
+            open(self.data_path, "wb").close()
+            self.entries = {}
+            self.rows = 0
+            return
+        if os.path.getsize(self.data_path) > size:
+            os.truncate(self.data_path, size)
+
+    def compact(self):
+        """
+        Rewrites faces.u8 with live rows only.
+        """
+        live = sorted((e["row"], key) for key, e in self.entries.items()
+                      if e["row"] >= 0)
+
+        data = self.faces()
+        tmp_path = self.data_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for new_row, (old_row, key) in enumerate(live):
+                f.write(data[old_row].tobytes())
+                self.entries[key]["row"] = new_row
+        del data
+
+        os.replace(tmp_path, self.data_path)
+        self.rows = len(live)
+
+    #  read
+
+    def live_rows(self) -> int:
+        return sum(1 for e in self.entries.values() if e["row"] >= 0)
+
+    def faces(self):
+        """
+        Every row of faces.u8 as a read only memory map (rows, h, w).
+        """
+        w, h = self.face_size
+        if self.rows == 0:
+            return np.zeros((0, h, w), dtype=np.uint8)
+        return np.memmap(self.data_path, dtype=np.uint8, mode="r",
+                         shape=(self.rows, h, w))
+
+    def load(self, persons=None):
+        """
+        Faces of the given persons (all if None), ordered by file name.
+        Returns (faces uint8 (N, h, w), person name per face).
+        """
+        selected = sorted(
+            (key, e) for key, e in self.entries.items()
+            if e["row"] >= 0 and (persons is None or e["person"] in persons))
+
+        rows = np.array([e["row"] for _, e in selected], dtype=np.int64)
+        faces = np.ascontiguousarray(self.faces()[rows])
+        return faces, [e["person"] for _, e in selected]
+
+
+def format_refresh(stats: dict, workers: int = None) -> str:
+    line = (f" Face store: {stats['added']} new, {stats['changed']} changed, "
+            f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+    if stats["decoded"]:
+        rate = stats["decoded"] / max(stats["decode_s"], 1e-9)
+        line += (f" | decoded {stats['decoded']} images in "
+                 f"{stats['decode_s']:.2f} s ({rate:.0f} images/s, "
+                 f"{workers or os.cpu_count() or 1} threads)")
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Refresh the packed face store from dataset/")
+    parser.add_argument("--dataset", default=DATASET_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true",
+                        help="drop the store and decode every image again")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        for path in (FACE_STORE_PATH, FACE_MANIFEST_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+    store = FaceStore()
+    stats = store.refresh(args.dataset, args.workers)
+    print(format_refresh(stats, args.workers))
+    print(f" {stats['live_rows']} faces ({stats['rows']} rows) in "
+          f"{FACE_STORE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
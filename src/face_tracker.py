@@ -0,0 +1,222 @@
+import cv2
+
+
+#  Cheap face tracking between full detections
+#
+# Full Haar detection (3 cascades, multi scale) + LBPH predict on every
+# frame is the expensive part of the recognition loop. FaceTracker runs
+# the full detection only every N frames (or as soon as a track is lost)
+# and in between follows each face with template matching inside a small
+# search window around its last position. The identity found by predict
+# is stored on the track and reused between full detections; a named
+# track is predicted again on every `reverify_every`-th full detection
+# and loses its name when the new predict disagrees (or is unknown), so
+# a wrong first match does not stick for the life of the track.
+
+
+class Track:
+    __slots__ = ("track_id", "box", "name", "confidence", "template",
+                 "age", "unverified", "fresh")
+
+    def __init__(self, track_id, box, name, confidence, template):
+        self.track_id = track_id
+        self.box = box
+        self.name = name
+        self.confidence = confidence
+        self.template = template
+        self.age = 0
+        self.unverified = 0    # full detections since the last predict
+        self.fresh = True      # name comes from a predict on this frame
+
+
+def box_iou(a, b) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    if inter == 0:
+        return 0.0
+
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class FaceTracker:
+    """
+    detect_every   -> run full detection every N frames (1 = every frame)
+    search_margin  -> search window = box grown by this fraction per side
+    min_score      -> TM_CCOEFF_NORMED score below this = track lost
+    iou_match      -> IoU needed to give a detection an existing identity
+    reverify_every -> predict a named track again every M full detections
+                      (1 = on every full detection)
+    """
+
+    def __init__(self,
+                 detect_every: int = 5,
+                 search_margin: float = 0.5,
+                 min_score: float = 0.6,
+                 iou_match: float = 0.3,
+                 reverify_every: int = 1):
+        self.detect_every = max(1, int(detect_every))
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.iou_match = iou_match
+        self.reverify_every = max(1, int(reverify_every))
+
+        self.tracks = []
+        self._next_id = 1
+        self._since_detect = self.detect_every  # detect on first frame
+
+        # counters
+        self.frames = 0
+        self.detections = 0
+        self.tracked_frames = 0
+        self.predicts = 0
+        self.reused_identities = 0
+        self.reverified = 0
+        self.dropped_identities = 0
+        self.lost_tracks = 0
+
+    def update(self, gray, detect, predict):
+        """
+        gray     -> grayscale frame
+        detect   -> detect(gray) returns list of (x, y, w, h)
+        predict  -> predict(face_roi) returns (name or None, confidence)
+
+        Returns list of ((x, y, w, h), name or None, confidence, fresh),
+        same format as mark_attendance.recognize_faces. fresh is False
+        when the name was reused from an earlier predict.
+        """
+        self.frames += 1
+
+        if self._since_detect < self.detect_every and self.tracks:
+            if self._follow_tracks(gray):
+                for t in self.tracks:
+                    t.fresh = False
+                self._since_detect += 1
+                self.tracked_frames += 1
+                return self.results()
+
+        elif self._since_detect < self.detect_every:
+            # nobody in view, still only look every N frames
+            self._since_detect += 1
+            return []
+
+        self._detect(gray, detect, predict)
+        self._since_detect = 1
+        return self.results()
+
+    def results(self):
+        return [(t.box, t.name, t.confidence, t.fresh) for t in self.tracks]
+
+    def reset(self):
+        self.tracks = []
+        self._since_detect = self.detect_every
+
+    #  internals
+
+    def _detect(self, gray, detect, predict):
+        self.detections += 1
+
+        old_tracks = self.tracks
+        new_tracks = []
+
+        for (x, y, w, h) in detect(gray):
+            box = (int(x), int(y), int(w), int(h))
+
+            # same face as an existing track -> keep its identity
+            best, best_iou = None, self.iou_match
+            for t in old_tracks:
+                iou = box_iou(box, t.box)
+                if iou >= best_iou:
+                    best, best_iou = t, iou
+
+            face_roi = gray[y:y + h, x:x + w]
+
+            if best is not None and best.name:
+                old_tracks.remove(best)
+                best.box = box
+                best.template = face_roi.copy()
+                best.age += 1
+                best.unverified += 1
+                new_tracks.append(best)
+
+                if best.unverified < self.reverify_every:
+                    best.fresh = False
+                    self.reused_identities += 1
+                    continue
+
+                # re-check the identity on the fresh detection
+                name, confidence = predict(face_roi)
+                self.predicts += 1
+                self.reverified += 1
+                best.unverified = 0
+                best.fresh = True
+                best.confidence = confidence
+                if name != best.name:
+                    best.name = None
+                    self.dropped_identities += 1
+                continue
+
+            # new face (or still unknown) -> predict once
+            name, confidence = predict(face_roi)
+            self.predicts += 1
+
+            if best is not None:
+                old_tracks.remove(best)
+                track_id = best.track_id
+            else:
+                track_id = self._next_id
+                self._next_id += 1
+
+            new_tracks.append(
+                Track(track_id, box, name, confidence, face_roi.copy()))
+
+        self.tracks = new_tracks
+
+    def _follow_tracks(self, gray) -> bool:
+        """
+        Move every track with template matching.
+        Returns False if any track is lost (caller runs full detection).
+        """
+        frame_h, frame_w = gray.shape[:2]
+
+        for t in self.tracks:
+            x, y, w, h = t.box
+            mx = int(w * self.search_margin)
+            my = int(h * self.search_margin)
+
+            x1, y1 = max(0, x - mx), max(0, y - my)
+            x2, y2 = min(frame_w, x + w + mx), min(frame_h, y + h + my)
+
+            window = gray[y1:y2, x1:x2]
+            th, tw = t.template.shape[:2]
+            if window.shape[0] < th or window.shape[1] < tw:
+                self.lost_tracks += 1
+                return False
+
+            res = cv2.matchTemplate(window, t.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(res)
+
+            if score < self.min_score:
+                self.lost_tracks += 1
+                return False
+
+            t.box = (x1 + loc[0], y1 + loc[1], w, h)
+            t.age += 1
+
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "tracked_frames": self.tracked_frames,
+            "predicts": self.predicts,
+            "reused_identities": self.reused_identities,
+            "reverified": self.reverified,
+            "dropped_identities": self.dropped_identities,
+            "lost_tracks": self.lost_tracks,
+            "active_tracks": len(self.tracks),
+        }
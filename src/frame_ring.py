@@ -0,0 +1,284 @@
+import multiprocessing as mp
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+#  Shared memory frame ring (capture process -> recognition processes)
+#
+# Frames are written ONCE into preallocated slots of one shared memory
+# block and read in place by other processes (no pickling, no per frame
+# allocation):
+#
+#   header   write seq, closed flag
+#   slots    seq + shape + capture time per slot
+#   groups   cursor + dropped count per reader group
+#   pins     slot held by each reader
+#   data     `slots` x max frame bytes (uint8)
+#
+# - one writer; it always overwrites the OLDEST slot no reader holds,
+#   so a slow reader never blocks capture
+# - a reader gets the newest frame its group has not seen yet (frames
+#   in between count as dropped) and holds ("pins") that slot until its
+#   next get() / release()
+# - readers of one group share a cursor -> every frame goes to ONE of
+#   them (worker pool); separate groups each see every frame
+#
+# Metadata changes run under one multiprocessing Condition (a few
+# microseconds), frame bytes are never copied under the lock.
+
+DEFAULT_MAX_SHAPE = (1080, 1920, 3)
+
+_HEADER = 4          # write_seq, closed, spare, spare
+_SLOT_FIELDS = 4     # seq (0 = empty / being written), h, w, c
+
+
+def _align(offset: int, to: int = 64) -> int:
+    return (offset + to - 1) // to * to
+
+
+class FrameRing:
+    """
+    slots     -> frame slots (at least readers + 2, default readers + 4)
+    readers   -> reader ids 0 .. readers-1 (one per reading process)
+    groups    -> reader groups (shared cursors)
+    max_shape -> biggest frame a slot can hold, frames are uint8
+
+    Pass the ring to multiprocessing.Process args, the child attaches to
+    the same shared memory. Only the creating process unlinks it.
+    """
+
+    def __init__(self, slots: int = None, readers: int = 1, groups: int = 1,
+                 max_shape=DEFAULT_MAX_SHAPE, ctx=None):
+        self.readers = max(1, int(readers))
+        self.groups = max(1, int(groups))
+        self.slots = int(slots or self.readers + 4)
+        if self.slots < self.readers + 2:
+            raise ValueError(f"FrameRing needs at least {self.readers + 2} "
+                             f"slots for {self.readers} readers")
+        self.slot_bytes = int(np.prod(max_shape))
+
+        self.shm = shared_memory.SharedMemory(create=True,
+                                              size=self._layout_size())
+        self._cond = (ctx or mp).Condition()
+        self._owner = os.getpid()
+        self._map()
+
+        self._head[:] = 0
+        self._slot_meta[:] = 0
+        self._times[:] = 0.0
+        self._cursors[:] = 0
+        self._dropped[:] = 0
+        self._pins[:] = -1
+
+    #  layout
+
+    def _layout_size(self) -> int:
+        ints = _HEADER + self.slots * _SLOT_FIELDS + self.slots + \
+            2 * self.groups + self.readers
+        self._data_offset = _align(ints * 8)
+        return self._data_offset + self.slots * self.slot_bytes
+
+    def _map(self):
+        buf = self.shm.buf
+        offset = 0
+
+        def take(shape, dtype):
+            nonlocal offset
+            arr = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            offset += arr.nbytes
+            return arr
+
+        self._head = take((_HEADER,), np.int64)
+        self._slot_meta = take((self.slots, _SLOT_FIELDS), np.int64)
+        self._times = take((self.slots,), np.float64)
+        self._cursors = take((self.groups,), np.int64)
+        self._dropped = take((self.groups,), np.int64)
+        self._pins = take((self.readers,), np.int64)
+        self._data = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8,
+                                buffer=buf, offset=self._data_offset)
+
+    def __getstate__(self):
+        return {"name": self.shm.name, "slots": self.slots,
+                "readers": self.readers, "groups": self.groups,
+                "slot_bytes": self.slot_bytes, "cond": self._cond}
+
+    def __setstate__(self, state):
+        # child process: attach to the block created by the parent
+        self.slots = state["slots"]
+        self.readers = state["readers"]
+        self.groups = state["groups"]
+        self.slot_bytes = state["slot_bytes"]
+        self._cond = state["cond"]
+        self._owner = None
+        self._layout_size()
+        self.shm = shared_memory.SharedMemory(name=state["name"])
+        self._map()
+
+    #  writer side (one process)
+
+    def begin_write(self) -> int:
+        """
+        Reserves the oldest slot no reader holds, returns its index.
+        """
+        with self._cond:
+            pinned = set(self._pins.tolist())
+            free = [i for i in range(self.slots) if i not in pinned]
+            slot = min(free, key=lambda i: self._slot_meta[i, 0])
+            self._slot_meta[slot, 0] = 0
+            return slot
+
+    def buffer(self, slot: int, shape):
+        """
+        Writable view of a reserved slot with the given frame shape
+        (e.g. to capture straight into shared memory).
+        """
+        size = int(np.prod(shape))
+        if size > self.slot_bytes:
+            raise ValueError(f"Frame {tuple(shape)} bigger than ring slot "
+                             f"({self.slot_bytes} bytes)")
+        return self._data[slot, :size].reshape(shape)
+
+    def publish(self, slot: int, shape, captured: float = None) -> int:
+        """
+        Makes the frame in `slot` visible to readers, returns its seq.
+        """
+        h, w = shape[:2]
+        c = shape[2] if len(shape) > 2 else 0
+        with self._cond:
+            seq = int(self._head[0]) + 1
+            self._head[0] = seq
+            self._slot_meta[slot] = (seq, h, w, c)
+            self._times[slot] = captured if captured is not None \
+                else time.monotonic()
+            self._cond.notify_all()
+        return seq
+
+    def write(self, frame, captured: float = None) -> int:
+        """
+        Copies one frame into the ring (when it could not be captured
+        into a slot directly).
+        """
+        slot = self.begin_write()
+        np.copyto(self.buffer(slot, frame.shape), frame)
+        return self.publish(slot, frame.shape, captured)
+
+    def close(self):
+        """
+        No more frames: readers return None once they have seen the last.
+        """
+        with self._cond:
+            self._head[1] = 1
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._head[1])
+
+    #  reader side (called by FrameReader, under the lock)
+
+    def _view(self, slot: int):
+        seq, h, w, c = (int(v) for v in self._slot_meta[slot])
+        shape = (h, w, c) if c else (h, w)
+        return seq, float(self._times[slot]), self.buffer(slot, shape)
+
+    def _newest(self, group: int):
+        newest = int(self._head[0])
+        cursor = int(self._cursors[group])
+        if newest <= cursor:
+            return None
+        slot = int(np.argmax(self._slot_meta[:, 0]))
+        seq = int(self._slot_meta[slot, 0])
+        self._dropped[group] += seq - cursor - 1
+        self._cursors[group] = seq
+        return slot
+
+    def _find(self, seq: int):
+        slots = np.flatnonzero(self._slot_meta[:, 0] == seq)
+        return int(slots[0]) if len(slots) else None
+
+    #  cleanup / metrics
+
+    def release(self):
+        """
+        Detaches this process; the creating process also frees the block.
+        """
+        for name in ("_head", "_slot_meta", "_times", "_cursors",
+                     "_dropped", "_pins", "_data"):
+            self.__dict__.pop(name, None)
+        try:
+            self.shm.close()
+        except BufferError:
+            # caller still holds frame views, mapping goes away with them
+            pass
+        if self._owner == os.getpid():
+            self.shm.unlink()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "written": int(self._head[0]),
+                "slots": self.slots,
+                "slot_mb": round(self.slot_bytes / 1e6, 1),
+                "cursor": self._cursors.tolist(),
+                "dropped": self._dropped.tolist(),
+            }
+
+
+class FrameReader:
+    """
+    One reading process. Frames returned by get() / get_seq() are views
+    into shared memory, valid until the next get() / get_seq() /
+    release() of this reader.
+    """
+
+    def __init__(self, ring: FrameRing, reader: int = 0, group: int = 0):
+        if not 0 <= reader < ring.readers:
+            raise ValueError(f"reader {reader} not in ring "
+                             f"(0..{ring.readers - 1})")
+        self.ring = ring
+        self.reader = reader
+        self.group = group
+
+    def get(self, timeout: float = None):
+        """
+        Newest frame this reader's group has not seen:
+        (seq, captured, frame) or None on timeout / closed ring.
+        """
+        ring = self.ring
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with ring._cond:
+            ring._pins[self.reader] = -1
+            while True:
+                slot = ring._newest(self.group)
+                if slot is not None:
+                    ring._pins[self.reader] = slot
+                    return ring._view(slot)
+                if ring._head[1]:
+                    return None
+
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                ring._cond.wait(remaining)
+
+    def get_seq(self, seq: int):
+        """
+        Frame `seq` if it is still in the ring, else None.
+        """
+        ring = self.ring
+        with ring._cond:
+            ring._pins[self.reader] = -1
+            slot = ring._find(seq)
+            if slot is None:
+                return None
+            ring._pins[self.reader] = slot
+            return ring._view(slot)[2]
+
+    def release(self):
+        with self.ring._cond:
+            self.ring._pins[self.reader] = -1
@@ -0,0 +1,162 @@
+import os
+
+import cv2
+
+#  Frame sources
+#
+# Every source has the same small interface as cv2.VideoCapture:
+#   isOpened(), read() -> (ret, frame), release()
+# read(image) decodes into `image` when it has the right shape (camera /
+# video, e.g. a shared memory ring slot), other sources ignore it.
+# so the recognition loop does not care if frames come from a webcam,
+# a recorded video or a folder of images.
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class FrameSource:
+    name = "source"
+
+    def isOpened(self) -> bool:
+        raise NotImplementedError
+
+    def read(self, image=None):
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    def __str__(self):
+        return self.name
+
+
+class CameraSource(FrameSource):
+
+    def __init__(self, index: int = 0):
+        self.name = f"camera:{index}"
+        self.cap = cv2.VideoCapture(index)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        return self.cap.read(image)
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """
+    Reads a recorded video as fast as frames can be decoded
+    (no real time pacing).
+    """
+
+    def __init__(self, path: str):
+        self.name = f"video:{path}"
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        return self.cap.read(image)
+
+    def fps(self) -> float:
+        return self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+
+    def frame_count(self) -> int:
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    """
+    Every image in a folder (sorted by file name) is one frame.
+    loop=True starts again from the first image at the end.
+    """
+
+    def __init__(self, folder: str, loop: bool = False):
+        self.name = f"images:{folder}"
+        self.folder = folder
+        self.loop = loop
+        self.files = []
+        if os.path.isdir(folder):
+            self.files = sorted(
+                os.path.join(folder, f) for f in os.listdir(folder)
+                if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.pos = 0
+
+    def isOpened(self) -> bool:
+        return len(self.files) > 0
+
+    def read(self, image=None):
+        while True:
+            if self.pos >= len(self.files):
+                if not self.loop or not self.files:
+                    return False, None
+                self.pos = 0
+
+            path = self.files[self.pos]
+            self.pos += 1
+
+            frame = cv2.imread(path)
+            if frame is not None:
+                return True, frame
+            print(f"Unreadable image skipped: {path}")
+
+
+def open_source(spec="0", loop: bool = False) -> FrameSource:
+    """
+    spec:
+      "0", "1" ...      -> camera index
+      folder path       -> ImageDirSource
+      anything else     -> VideoFileSource (video file / stream url)
+    """
+    spec = str(spec).strip()
+
+    if spec.isdigit():
+        return CameraSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, loop=loop)
+    return VideoFileSource(spec)
+
+
+#  Display
+# headless=True turns every GUI call into a no-op (servers / CI)
+
+
+class FrameDisplay:
+
+    def __init__(self, title: str, headless: bool = False):
+        self.title = title
+        self.headless = headless
+
+    def show(self, frame) -> bool:
+        """
+        Shows frame, returns False when user pressed 'q'.
+        """
+        if self.headless:
+            return True
+
+        cv2.imshow(self.title, frame)
+        return not (cv2.waitKey(1) & 0xFF == ord("q"))
+
+    def poll(self) -> bool:
+        """
+        Key check without a new frame (returns False on 'q').
+        """
+        if self.headless:
+            return True
+        return not (cv2.waitKey(1) & 0xFF == ord("q"))
+
+    def wait(self, ms: int):
+        if not self.headless:
+            cv2.waitKey(ms)
+
+    def close(self):
+        if not self.headless:
+            cv2.destroyAllWindows()
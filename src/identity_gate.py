@@ -0,0 +1,90 @@
+import time
+from collections import deque
+
+#  Decide WHEN a recognition result should cause an action
+#
+# VoteWindow    -> identity is committed only after it was seen in k of
+#                  the last n processed frames (one noisy predict does
+#                  not mark anybody)
+# CooldownTable -> one cooldown per identity, two people in view do not
+#                  reset each other
+# RateLimiter   -> unknown face snapshots, independent from known faces
+
+
+class VoteWindow:
+
+    def __init__(self, k: int = 3, n: int = 5):
+        self.n = max(1, int(n))
+        self.k = min(max(1, int(k)), self.n)
+        self.frames = deque(maxlen=self.n)
+        self.counts = {}
+
+    def add_frame(self, names) -> list:
+        """
+        names -> identities recognized in one frame.
+        Returns identities that are now seen in >= k of the last n frames.
+        """
+        names = set(names)
+
+        if len(self.frames) == self.n:
+            for old in self.frames[0]:
+                self.counts[old] -= 1
+                if self.counts[old] == 0:
+                    del self.counts[old]
+
+        self.frames.append(names)
+        for name in names:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+        return [name for name in names if self.counts[name] >= self.k]
+
+
+class CooldownTable:
+
+    def __init__(self, seconds: float = 10.0, max_entries: int = 10000):
+        self.seconds = seconds
+        self.max_entries = max_entries
+        self.last = {}
+
+    def ready(self, key, now: float = None) -> bool:
+        """
+        True (and cooldown restarted) if key had no action in `seconds`.
+        """
+        now = time.monotonic() if now is None else now
+
+        last = self.last.get(key)
+        if last is not None and now - last < self.seconds:
+            return False
+
+        self.last[key] = now
+        if len(self.last) > self.max_entries:
+            self.prune(now)
+        return True
+
+    def prune(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        self.last = {k: t for k, t in self.last.items()
+                     if now - t < self.seconds}
+
+
+class RateLimiter:
+    """
+    At most one event every `interval` seconds.
+    """
+
+    def __init__(self, interval: float = 10.0):
+        self.interval = interval
+        self.last = None
+        self.allowed = 0
+        self.limited = 0
+
+    def allow(self, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+
+        if self.last is not None and now - self.last < self.interval:
+            self.limited += 1
+            return False
+
+        self.last = now
+        self.allowed += 1
+        return True
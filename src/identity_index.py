@@ -0,0 +1,276 @@
+import argparse
+import time
+
+import numpy as np
+
+from lbph_engine import LBPHEngine, chi_square_distances
+
+#  Identity search index (coarse -> exact)
+#
+# Exhaustive LBPH compares a face with EVERY stored histogram
+# (employees x images). The index works in two steps:
+#
+# 1) coarse: compare the face with a few prototypes per identity
+#    (mean of its histograms, or k-means centres). Prototypes live in
+#    sqrt space (Hellinger), so this is one matrix multiplication.
+#    coarse_dims > 0 additionally projects them with PCA (smaller,
+#    faster, approximate).
+# 2) exact: chi-square re-ranking only against the histograms of the
+#    n_probe best identities.
+#
+# n_probe / prototypes / coarse_dims trade recall against latency.
+# Re-ranking cost does not depend on the headcount at all.
+
+
+class IdentityIndex:
+
+    def __init__(self, engine: LBPHEngine, n_probe: int = 5,
+                 prototypes: int = 1, coarse_dims: int = 0):
+        self.engine = engine
+        self.n_probe = max(1, int(n_probe))
+        self.prototypes = max(1, int(prototypes))
+        self.coarse_dims = int(coarse_dims)
+
+        self.proto_vectors = None     # (P, d) float32
+        self.proto_norms = None       # (P,)
+        self.proto_labels = None      # (P,) int32
+        self.rows_by_label = {}
+        self.projection = None        # (D, coarse_dims) or None
+        self.mean = None
+
+        self.build()
+
+    #  build
+
+    def build(self):
+        labels = self.engine.labels
+
+        order = np.argsort(labels, kind="stable")
+        sorted_labels = labels[order]
+        uniq, starts = np.unique(sorted_labels, return_index=True)
+        ends = list(starts[1:]) + [len(order)]
+
+        protos = []
+        proto_labels = []
+        self.rows_by_label = {}
+
+        for label, s, e in zip(uniq, starts, ends):
+            rows = order[s:e]
+            self.rows_by_label[int(label)] = rows
+
+            vecs = np.sqrt(self.engine.rows_as_float(rows))
+            for centre in _kmeans(vecs, self.prototypes):
+                protos.append(centre)
+                proto_labels.append(int(label))
+
+        if not protos:
+            dim = self.engine.feature_size
+            protos = np.zeros((0, dim), dtype=np.float32)
+        protos = np.asarray(protos, dtype=np.float32)
+
+        if self.coarse_dims and 0 < self.coarse_dims < min(protos.shape):
+            # PCA fitted on the prototypes
+            self.mean = protos.mean(axis=0)
+            _, _, vt = np.linalg.svd(protos - self.mean, full_matrices=False)
+            self.projection = np.ascontiguousarray(
+                vt[:self.coarse_dims].T.astype(np.float32))
+            protos = (protos - self.mean) @ self.projection
+        else:
+            self.projection = None
+            self.mean = None
+
+        self.proto_vectors = np.ascontiguousarray(protos)
+        self.proto_norms = (self.proto_vectors ** 2).sum(axis=1)
+        self.proto_labels = np.asarray(proto_labels, dtype=np.int32)
+
+    #  search
+
+    def _coarse(self, hist):
+        q = np.sqrt(hist)
+        if self.projection is not None:
+            q = (q - self.mean) @ self.projection
+
+        # squared euclidean distance, one GEMM for all queries
+        d = (q ** 2).sum(axis=1)[:, None] + self.proto_norms[None, :]
+        d -= 2.0 * (q @ self.proto_vectors.T)
+        return d
+
+    def candidates(self, hist):
+        """
+        n_probe best identities per query histogram.
+        """
+        if len(self.proto_labels) == 0:
+            return [[] for _ in range(len(hist))]
+
+        d = self._coarse(hist)
+
+        # an identity has at most `prototypes` prototypes, so the nearest
+        # n_probe * prototypes always hold n_probe distinct identities:
+        # partial selection of that slice instead of a full sort
+        m = min(self.n_probe * self.prototypes, d.shape[1])
+        if m < d.shape[1]:
+            near = np.argpartition(d, m - 1, axis=1)[:, :m]
+        else:
+            near = np.broadcast_to(np.arange(m), d.shape)
+
+        out = []
+        for row, idx in zip(d, near):
+            ranked = self.proto_labels[idx[np.argsort(row[idx])]]
+            picked = []
+            for label in ranked:
+                if label not in picked:
+                    picked.append(int(label))
+                    if len(picked) >= self.n_probe:
+                        break
+            out.append(picked)
+        return out
+
+    def search(self, hist):
+        """
+        hist -> (Q, D) float32 histograms
+        Returns list of (label, distance), like LBPHEngine.predict_batch.
+        """
+        results = []
+        for q, labels in zip(hist, self.candidates(hist)):
+            if not labels:
+                results.append((-1, float("inf")))
+                continue
+
+            rows = np.concatenate([self.rows_by_label[l] for l in labels])
+            dist = chi_square_distances(
+                q[None, :], self.engine.rows_as_float(rows),
+                row_sums=self.engine.row_sums()[rows])[0]
+            best = int(dist.argmin())
+            d = float(dist[best])
+            if d < self.engine.threshold:
+                results.append((int(self.engine.labels[rows[best]]), d))
+            else:
+                results.append((-1, float("inf")))
+        return results
+
+    def predict_batch(self, faces):
+        if len(faces) == 0:
+            return []
+        return self.search(self.engine.extract(faces))
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+
+def _kmeans(vecs, k: int, iterations: int = 10):
+    """
+    Small k-means for the prototypes of one identity.
+    """
+    if k <= 1 or len(vecs) <= k:
+        return vecs.mean(axis=0, keepdims=True) if k <= 1 else vecs
+
+    # spread initial centres over the samples
+    centres = vecs[np.linspace(0, len(vecs) - 1, k).astype(int)].copy()
+    for _ in range(iterations):
+        d = ((vecs[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        assign = d.argmin(axis=1)
+        for c in range(k):
+            members = vecs[assign == c]
+            if len(members):
+                centres[c] = members.mean(axis=0)
+    return centres
+
+
+#  Benchmark: recall against exhaustive search
+
+
+def benchmark(engine: LBPHEngine, query_hist, n_probes=(1, 2, 5, 10),
+              prototypes: int = 1, coarse_dims: int = 0):
+    """
+    Returns list of dicts: n_probe, recall (same label as exhaustive),
+    ms per face for index and for exhaustive search.
+    """
+    # one face at a time, like recognizer.predict in the camera loop
+    t0 = time.perf_counter()
+    exact = []
+    for q in query_hist:
+        dist = chi_square_distances(q[None, :], engine.histograms,
+                                    engine.hist_scale,
+                                    row_sums=engine.row_sums())[0]
+        exact.append(engine.labels[dist.argmin()])
+    exhaustive_ms = (time.perf_counter() - t0) * 1000 / len(query_hist)
+
+    report = []
+    for n_probe in n_probes:
+        index = IdentityIndex(engine, n_probe=n_probe,
+                              prototypes=prototypes, coarse_dims=coarse_dims)
+
+        t0 = time.perf_counter()
+        found = index.search(query_hist)
+        index_ms = (time.perf_counter() - t0) * 1000 / len(query_hist)
+
+        hits = sum(1 for (label, _), e in zip(found, exact) if label == e)
+        report.append({
+            "n_probe": n_probe,
+            "recall": round(hits / len(query_hist), 4),
+            "index_ms": round(index_ms, 3),
+            "exhaustive_ms": round(exhaustive_ms, 3),
+        })
+    return report
+
+
+def synthetic_histograms(identities: int, images: int, seed: int = 0,
+                         noise: float = 0.5, cells: int = 64,
+                         patterns: int = 256):
+    """
+    LBPH-like histograms (normalized per cell) for a fake workforce.
+    Returns (histograms, labels, queries, query_labels).
+    """
+    rng = np.random.default_rng(seed)
+
+    def sample(base):
+        h = base * rng.gamma(1.0 / noise, noise, size=base.shape)
+        h = h.astype(np.float32)
+        h /= h.sum(axis=-1, keepdims=True)
+        return h.reshape(len(h), -1)
+
+    base = rng.gamma(0.3, 1.0, size=(identities, cells, patterns))
+
+    hist = np.empty((identities * images, cells * patterns), dtype=np.float32)
+    for i in range(identities):
+        hist[i * images:(i + 1) * images] = sample(
+            np.repeat(base[i:i + 1], images, axis=0))
+    labels = np.repeat(np.arange(identities, dtype=np.int32), images)
+
+    query_labels = rng.integers(0, identities, size=min(200, identities * 2))
+    queries = sample(base[query_labels])
+    return hist, labels, queries, query_labels
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Identity index recall / latency benchmark")
+    parser.add_argument("--identities", type=int, default=200)
+    parser.add_argument("--images", type=int, default=30)
+    parser.add_argument("--prototypes", type=int, default=1)
+    parser.add_argument("--coarse-dims", type=int, default=0)
+    parser.add_argument("--noise", type=float, default=0.5,
+                        help="per image variation (higher = harder)")
+    parser.add_argument("--probes", default="1,2,5,10")
+    args = parser.parse_args()
+
+    print(f" Synthetic workforce: {args.identities} x {args.images} images")
+    hist, labels, queries, _ = synthetic_histograms(args.identities,
+                                                    args.images,
+                                                    noise=args.noise)
+
+    engine = LBPHEngine()
+    engine.histograms = hist
+    engine.labels = labels
+
+    probes = [int(p) for p in args.probes.split(",") if p.strip()]
+    for row in benchmark(engine, queries, probes,
+                         prototypes=args.prototypes,
+                         coarse_dims=args.coarse_dims):
+        print(f" n_probe={row['n_probe']:>3} | recall={row['recall']:.3f} | "
+              f"index {row['index_ms']:.2f} ms/face | "
+              f"exhaustive {row['exhaustive_ms']:.2f} ms/face")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from config import DATASET_DIR, TRAINER_DIR
+from face_store import IMAGE_EXTS, decode_faces
+
+#  In-house LBPH recognizer (NumPy)
+#
+# Same algorithm as cv2.face.LBPHFaceRecognizer (radius 1, 8 neighbors,
+# 8x8 grid, chi-square distance, nearest neighbour), but:
+#
+# - LBP codes + cell histograms are computed with array operations
+#   (no per pixel Python loop), for one face or a stack of faces
+# - all training histograms live in ONE contiguous float32 matrix
+# - distances of every face in a frame against every training histogram
+#   are computed in one predict_batch() call, only over the histogram
+#   bins the face uses (LBP histograms are sparse)
+#
+# It reads trainer.yml written by OpenCV and gives the same labels as
+# recognizer.predict(), so both can be compared on the same model.
+
+FLT_EPSILON = np.finfo(np.float32).eps
+
+# temporary arrays of one distance chunk (bytes): rows x compared bins x
+# 3 float32 temporaries; galleries of a few thousand faces are one chunk
+DISTANCE_CHUNK_BYTES = 32 * 1024 * 1024
+
+
+def lbp_images(stack, radius: int = 1, neighbors: int = 8):
+    """
+    Extended (circular) LBP codes, bit exact with OpenCV's elbp().
+    stack -> uint8 array (H, W) or (B, H, W)
+    returns int32 array (..., H - 2r, W - 2r)
+    """
+    src = np.asarray(stack)
+    rows, cols = src.shape[-2], src.shape[-1]
+    h, w = rows - 2 * radius, cols - 2 * radius
+
+    srcf = None
+    center = src[..., radius:radius + h, radius:radius + w]
+    codes = np.zeros(src.shape[:-2] + (h, w), dtype=np.int32)
+
+    for n in range(neighbors):
+        # sample point (same float math as OpenCV: angle in double,
+        # point rounded to float)
+        angle = 2.0 * np.pi * n / float(neighbors)
+        x = np.float32(radius * np.cos(angle))
+        y = np.float32(-radius * np.sin(angle))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+
+        ty = np.float32(y - fy)
+        tx = np.float32(x - fx)
+        w1 = np.float32((1 - tx) * (1 - ty))
+        w2 = np.float32(tx * (1 - ty))
+        w3 = np.float32((1 - tx) * ty)
+        w4 = np.float32(tx * ty)
+
+        weights = [(w1, fy, fx), (w2, fy, cx), (w3, cy, fx), (w4, cy, cx)]
+        main = max(weights, key=lambda wt: wt[0])
+        rest = sum(float(wt[0]) for wt in weights if wt is not main)
+
+        if main[0] == 1 and rest * 255 < FLT_EPSILON / 2:
+            # sample point on a pixel (n = 0, 2, 4, 6 for radius 1):
+            # the other weights are too small to change t, so
+            # "t > c or |t - c| < eps" is exactly "pixel >= c"
+            _, dy, dx = main
+            pixel = src[..., radius + dy:radius + dy + h,
+                        radius + dx:radius + dx + w]
+            bit = pixel >= center
+        else:
+            if srcf is None:
+                srcf = src.astype(np.float32)
+                centerf = srcf[..., radius:radius + h, radius:radius + w]
+
+            def shifted(dy, dx):
+                return srcf[..., radius + dy:radius + dy + h,
+                            radius + dx:radius + dx + w]
+
+            t = w1 * shifted(fy, fx)
+            t += w2 * shifted(fy, cx)
+            t += w3 * shifted(cy, fx)
+            t += w4 * shifted(cy, cx)
+
+            t -= centerf
+            bit = (t > 0) | (np.abs(t) < FLT_EPSILON)
+
+        codes |= bit.astype(np.int32) << n
+
+    return codes
+
+
+def spatial_histograms(codes, grid_x: int = 8, grid_y: int = 8,
+                       num_patterns: int = 256):
+    """
+    Normalized histogram per grid cell, concatenated (like OpenCV).
+    codes -> int32 (H, W) or (B, H, W)
+    returns float32 (grid_x*grid_y*num_patterns,) or (B, ...)
+    """
+    codes = np.asarray(codes)
+    single = codes.ndim == 2
+    if single:
+        codes = codes[None]
+
+    b, rows, cols = codes.shape
+    cell_h, cell_w = rows // grid_y, cols // grid_x
+    cells = grid_x * grid_y
+
+    # (B, gy, cell_h, gx, cell_w) -> (B, gy, gx, cell_h*cell_w)
+    c = codes[:, :grid_y * cell_h, :grid_x * cell_w]
+    c = c.reshape(b, grid_y, cell_h, grid_x, cell_w).transpose(0, 1, 3, 2, 4)
+    c = c.reshape(b, cells, cell_h * cell_w)
+
+    offsets = (np.arange(b * cells, dtype=np.int64) * num_patterns)
+    idx = (c.reshape(b * cells, -1) + offsets[:, None]).ravel()
+
+    hist = np.bincount(idx, minlength=b * cells * num_patterns)
+    hist = hist.astype(np.float32).reshape(b, cells * num_patterns)
+    # OpenCV multiplies by the float reciprocal (not a division), same
+    # rounding keeps the histograms bit exact
+    hist *= np.float32(1.0 / (cell_h * cell_w))
+
+    return hist[0] if single else hist
+
+
+def chi_square_distances(queries, train, scale=None,
+                         chunk_bytes=DISTANCE_CHUNK_BYTES, row_sums=None):
+    """
+    HISTCMP_CHISQR_ALT between every query and every training row:
+        d(a, b) = sum 2 * (a - b)^2 / (a + b)
+    queries  -> (Q, D) float32
+    train    -> (M, D) float32, or a compact dtype (float16 / uint16
+                counts) that is converted chunk by chunk (times `scale`
+                if given), so a memory mapped matrix is never copied as
+                a whole
+    row_sums -> float64 (M,) sums of the train rows (LBPHEngine.row_sums),
+                summed chunk by chunk when not given
+    returns (Q, M) float64
+
+    2 (a - b)^2 / (a + b) = 2 (a + b) - 8 ab / (a + b), and ab is 0 where
+    the query bin is 0. LBP histograms are sparse (~1/4 of the bins used),
+    so per query only its used bins are compared:
+        d = 2 (sum(a) + sum(b)) - 8 sum over used bins of ab / (a + b)
+    """
+    q_count = queries.shape[0]
+    m_count = train.shape[0]
+    out = np.empty((q_count, m_count), dtype=np.float64)
+
+    for qi, query in enumerate(queries):
+        cols = np.flatnonzero(query)
+        a = query[cols]                                   # (K,)
+        a_sum = float(a.sum(dtype=np.float64))
+        rows = max(1, chunk_bytes // max(1, len(cols) * 4 * 3))
+
+        for start in range(0, m_count, rows):
+            stop = min(start + rows, m_count)
+            if row_sums is None:
+                sums = train[start:stop].sum(axis=1, dtype=np.float64)
+                if scale is not None:
+                    sums *= scale
+            else:
+                sums = row_sums[start:stop]
+            block = np.take(train[start:stop], cols, axis=1)   # (C, K)
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+                if scale is not None:
+                    block *= np.float32(scale)
+            # a > 0 on every compared bin -> a + b never 0
+            prod = block * a
+            block += a
+            prod /= block
+            out[qi, start:stop] = 2.0 * (a_sum + sums) - \
+                8.0 * prod.sum(axis=1, dtype=np.float64)
+
+    return out
+
+
+class LBPHEngine:
+    """
+    predict(face)          -> (label, distance)   like recognizer.predict
+    predict_batch(faces)   -> list of (label, distance)
+    """
+
+    def __init__(self, radius: int = 1, neighbors: int = 8,
+                 grid_x: int = 8, grid_y: int = 8,
+                 threshold: float = float("inf")):
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+
+        self.histograms = np.zeros((0, self.feature_size), dtype=np.float32)
+        self.labels = np.zeros((0,), dtype=np.int32)
+
+        # histograms may be a (memory mapped) compact matrix, see
+        # model_store.py: float value = stored value * hist_scale
+        self.hist_scale = None
+        self._sums = None
+
+    @property
+    def feature_size(self) -> int:
+        return self.grid_x * self.grid_y * (2 ** self.neighbors)
+
+    #  features
+
+    def extract(self, faces):
+        """
+        Histograms for a list of gray faces (any sizes) -> (N, D) float32.
+        Faces with the same shape are processed together as one stack
+        (a uint8 (N, H, W) array is used as is, in blocks of 256).
+        """
+        out = np.empty((len(faces), self.feature_size), dtype=np.float32)
+
+        if isinstance(faces, np.ndarray) and faces.ndim == 3:
+            # already one (N, H, W) stack (face_store.FaceStore.load)
+            for start in range(0, len(faces), 256):
+                codes = lbp_images(faces[start:start + 256], self.radius,
+                                   self.neighbors)
+                out[start:start + 256] = spatial_histograms(
+                    codes, self.grid_x, self.grid_y, 2 ** self.neighbors)
+            return out
+
+        faces = [np.asarray(f, dtype=np.uint8) for f in faces]
+
+        by_shape = {}
+        for i, f in enumerate(faces):
+            by_shape.setdefault(f.shape, []).append(i)
+
+        for idxs in by_shape.values():
+            stack = np.stack([faces[i] for i in idxs])
+            codes = lbp_images(stack, self.radius, self.neighbors)
+            out[idxs] = spatial_histograms(codes, self.grid_x, self.grid_y,
+                                           2 ** self.neighbors)
+        return out
+
+    #  training
+
+    def train(self, faces, labels):
+        self.histograms = np.ascontiguousarray(self.extract(faces))
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+
+    def update(self, faces, labels):
+        new_hist = self.extract(faces)
+        self.histograms = np.ascontiguousarray(
+            np.vstack([self.rows_as_float(), new_hist]))
+        self.hist_scale = None
+        self.labels = np.concatenate(
+            [self.labels, np.asarray(labels, dtype=np.int32).ravel()])
+
+    def remove(self, labels):
+        """
+        Drops every training histogram of the given labels.
+        Returns number of removed rows.
+        """
+        keep = ~np.isin(self.labels, np.asarray(list(labels), dtype=np.int32))
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.histograms = np.ascontiguousarray(self.rows_as_float()[keep])
+            self.hist_scale = None
+            self.labels = self.labels[keep]
+        return removed
+
+    def rows_as_float(self, rows=None):
+        """
+        Training histograms (all, or the given row indices) as float32.
+        """
+        hist = self.histograms if rows is None else self.histograms[rows]
+        if hist.dtype == np.float32:
+            return hist
+
+        hist = hist.astype(np.float32)
+        if self.hist_scale is not None:
+            hist *= np.float32(self.hist_scale)
+        return hist
+
+    def row_sums(self):
+        """
+        float64 sum of every training histogram (chi_square_distances),
+        computed once per histogram matrix.
+        """
+        if self._sums is None or self._sums[0] is not self.histograms:
+            sums = np.empty(len(self.histograms), dtype=np.float64)
+            for start in range(0, len(sums), 4096):
+                sums[start:start + 4096] = self.rows_as_float(
+                    np.arange(start, min(start + 4096, len(sums)))
+                ).sum(axis=1, dtype=np.float64)
+            self._sums = (self.histograms, sums)
+        return self._sums[1]
+
+    #  prediction
+
+    def predict_batch(self, faces):
+        if len(faces) == 0:
+            return []
+        if len(self.labels) == 0:
+            return [(-1, float("inf"))] * len(faces)
+
+        queries = self.extract(faces)
+        dist = chi_square_distances(queries, self.histograms,
+                                    self.hist_scale,
+                                    row_sums=self.row_sums())
+
+        best = dist.argmin(axis=1)
+        results = []
+        for qi, mi in enumerate(best):
+            d = float(dist[qi, mi])
+            if d < self.threshold:
+                results.append((int(self.labels[mi]), d))
+            else:
+                results.append((-1, float("inf")))
+        return results
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+    #  OpenCV model file
+
+    @classmethod
+    def from_opencv_yml(cls, path: str):
+        """
+        Loads trainer.yml written by LBPHFaceRecognizer.save().
+        """
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+        if not fs.isOpened():
+            raise FileNotFoundError(f"Model not found: {path}")
+
+        node = fs.getNode("opencv_lbphfaces")
+        if node.empty():
+            fs.release()
+            raise ValueError(f"Not an LBPH model: {path}")
+
+        threshold = node.getNode("threshold").real()
+        engine = cls(radius=int(node.getNode("radius").real()),
+                     neighbors=int(node.getNode("neighbors").real()),
+                     grid_x=int(node.getNode("grid_x").real()),
+                     grid_y=int(node.getNode("grid_y").real()),
+                     threshold=threshold if threshold < 1e300 else float("inf"))
+
+        hist_node = node.getNode("histograms")
+        histograms = np.empty((hist_node.size(), engine.feature_size),
+                              dtype=np.float32)
+        for i in range(hist_node.size()):
+            histograms[i] = hist_node.at(i).mat().ravel()
+
+        labels = node.getNode("labels").mat()
+        fs.release()
+
+        engine.histograms = histograms
+        engine.labels = np.asarray(labels, dtype=np.int32).ravel()
+        return engine
+
+    def save_opencv_yml(self, path: str):
+        """
+        Writes the model in the trainer.yml format of
+        LBPHFaceRecognizer.save(), so recognizer.read() can load it.
+        """
+        threshold = self.threshold
+        if threshold == float("inf"):
+            threshold = float(np.finfo(np.float64).max)
+
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+        fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+        fs.write("threshold", float(threshold))
+        fs.write("radius", int(self.radius))
+        fs.write("neighbors", int(self.neighbors))
+        fs.write("grid_x", int(self.grid_x))
+        fs.write("grid_y", int(self.grid_y))
+
+        fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+        count = len(self.labels)
+        for start in range(0, count, 256):
+            rows = np.arange(start, min(start + 256, count))
+            for row in self.rows_as_float(rows):
+                fs.write("", row.reshape(1, -1))
+        fs.endWriteStruct()
+
+        fs.write("labels", np.asarray(self.labels, dtype=np.int32).reshape(-1, 1))
+        fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+        fs.endWriteStruct()
+        fs.endWriteStruct()
+        fs.release()
+        return path
+
+
+def compare_with_opencv(model_path: str, faces):
+    """
+    Predicts every face with both recognizers.
+    Returns (same label count, total, max distance difference).
+    """
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    engine = LBPHEngine.from_opencv_yml(model_path)
+
+    ours = engine.predict_batch(faces)
+    same = 0
+    max_diff = 0.0
+    for face, (label, dist) in zip(faces, ours):
+        cv_label, cv_dist = recognizer.predict(face)
+        if cv_label == label:
+            same += 1
+        max_diff = max(max_diff, abs(cv_dist - dist))
+
+    return same, len(faces), max_diff
+
+
+def time_predict(model_path: str, faces, repeat: int = 3) -> dict:
+    """
+    Median ms per face of recognizer.predict() and LBPHEngine.predict()
+    (one face at a time, like the camera loop).
+    """
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    engine = LBPHEngine.from_opencv_yml(model_path)
+
+    timings = {}
+    for name, predict in (("opencv", recognizer.predict),
+                          ("numpy", engine.predict)):
+        samples = []
+        for _ in range(repeat):
+            for face in faces:
+                t0 = time.perf_counter()
+                predict(face)
+                samples.append(time.perf_counter() - t0)
+        timings[name] = float(np.median(samples)) * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare NumPy LBPH engine with OpenCV on trainer.yml")
+    parser.add_argument("--model", default=os.path.join(TRAINER_DIR, "trainer.yml"))
+    parser.add_argument("--dataset", default=DATASET_DIR)
+    parser.add_argument("--limit", type=int, default=200,
+                        help="max dataset images to compare")
+    args = parser.parse_args()
+
+    # read only: images are decoded here, trainer/faces.u8 is not touched
+    paths = sorted(os.path.join(root, f)
+                   for root, _dirs, files in os.walk(args.dataset)
+                   for f in files if f.lower().endswith(IMAGE_EXTS))
+    faces, _hashes, decoded = decode_faces(paths[:args.limit])
+    faces = list(faces[decoded])
+    if not faces:
+        print(f" No readable images in {args.dataset}")
+        return
+
+    same, total, max_diff = compare_with_opencv(args.model, faces)
+    print(f" Same label: {same}/{total} | max distance difference: {max_diff:.6f}")
+
+    timings = time_predict(args.model, faces)
+    print(f" predict p50: OpenCV {timings['opencv']:.2f} ms | NumPy "
+          f"{timings['numpy']:.2f} ms per face")
+
+
+if __name__ == "__main__":
+    main()
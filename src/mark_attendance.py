@@ -1,45 +1,26 @@
+import argparse
+import functools
 import os
+import threading
+import time
 import cv2
-import pandas as pd
 from datetime import datetime
 
-from config import (ATTENDANCE_DIR, TRAINER_DIR, UNKNOWN_DIR,
-                    FRONTAL_DEFAULT_XML, FRONTAL_ALT2_XML, PROFILE_XML,
-                    OFFICE_START_TIME)
-
-
-def detect_faces_3cascades(gray, c1, c2, c3):
-    faces = c1.detectMultiScale(gray,
-                                scaleFactor=1.2,
-                                minNeighbors=5,
-                                minSize=(80, 80))
-    if len(faces) == 0:
-        faces = c2.detectMultiScale(gray,
-                                    scaleFactor=1.2,
-                                    minNeighbors=5,
-                                    minSize=(80, 80))
-    if len(faces) == 0:
-        faces = c3.detectMultiScale(gray,
-                                    scaleFactor=1.2,
-                                    minNeighbors=5,
-                                    minSize=(80, 80))
-    return faces
-
-
-def get_today_file_path():
-    today = datetime.now().strftime("%Y-%m-%d")
-    return os.path.join(ATTENDANCE_DIR, f"{today}.csv")
-
-
-def is_already_marked(file_path: str, name: str) -> bool:
-    if not os.path.exists(file_path):
-        return False
-
-    df = pd.read_csv(file_path)
-    if "Name" not in df.columns:
-        return False
-
-    return name.lower() in df["Name"].astype(str).str.lower().values
+from config import (TRAINER_DIR, UNKNOWN_DIR, LOGS_DIR,
+                    OFFICE_START_TIME, RECOGNITION_THRESHOLD)
+from attendance_ledger import AttendanceLedger
+from background_writer import BackgroundWriter
+from face_detector import CascadeDetector
+from face_tracker import FaceTracker
+from frame_source import FrameDisplay, open_source
+from identity_gate import CooldownTable, RateLimiter, VoteWindow
+from identity_index import IdentityIndex
+from lbph_engine import LBPHEngine
+from model_reload import ModelBundle, ModelReloader, read_model_version
+from model_store import binary_model_is_current, load_model
+from recognition_service import RecognitionClient
+from shards import ShardedRecognizer, load_shards, shards_for_camera
+from pipeline import ProcessPipeline, RecognitionPipeline, format_stats
 
 
 def get_status(current_time_str: str) -> str:
@@ -51,69 +32,150 @@ def get_status(current_time_str: str) -> str:
     return "On Time"
 
 
-def mark_attendance(name: str):
-    file_path = get_today_file_path()
-
-    if is_already_marked(file_path, name):
+def log_event(message: str, writer=None):
+    """
+    Prints message, with a BackgroundWriter it is also appended to
+    logs/attendance_YYYY-MM-DD.log (by the writer thread).
+    """
+    print(message)
+    if writer is not None:
+        now = datetime.now()
+        log_path = os.path.join(LOGS_DIR,
+                                f"attendance_{now.strftime('%Y-%m-%d')}.log")
+        writer.log(log_path, f"{now.strftime('%H:%M:%S')} {message.strip()}")
+
+
+def mark_attendance(name: str, ledger: AttendanceLedger = None, source=None):
+    """
+    ledger -> AttendanceLedger kept by the caller (recognition loop).
+    Without one a fresh ledger is used (loads today's file once).
+    source -> camera id, added to the log line (multi camera host)
+    Returns the new row, None if already marked or not saved.
+    """
+    ledger = ledger or AttendanceLedger()
+
+    try:
+        row = ledger.mark(name, get_status)
+    except Exception as e:
+        print(f" Attendance not saved for {name}: {e}")
+        return None
+    if row is None:
         print(f"Attendance already marked for {name} today ")
-        return
-
-    now = datetime.now()
-    date_str = now.strftime("%Y-%m-%d")
-    time_str = now.strftime("%H:%M")
-
-    status = get_status(time_str)
-
-    row = {"Name": name, "Date": date_str, "Time": time_str, "Status": status}
+        return None
 
-    if not os.path.exists(file_path):
-        df = pd.DataFrame([row])
-        df.to_csv(file_path, index=False)
-    else:
-        df = pd.read_csv(file_path)
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-        df.to_csv(file_path, index=False)
-
-    print(f" Attendance marked: {name} | {time_str} | {status}")
-    print(f"Saved in: {file_path}")
+    where = f" | {source}" if source is not None else ""
+    log_event(f" Attendance marked: {name} | {row['Time']} | {row['Status']}"
+              f"{where}", ledger.writer)
+    print(f"Saved in: {ledger.file_path}")
+    return row
 
 
-def save_unknown_face(frame):
+def save_unknown_face(frame, writer=None, box=None, source=None):
+    """
+    writer -> BackgroundWriter (jpeg quality / crop only come from it),
+              without one the frame is written right here.
+    source -> camera id, part of the file name (multi camera host)
+    """
     ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     file_name = f"unknown_{ts}.jpg"
+    if source is not None:
+        tag = "".join(c if c.isalnum() or c in "-_" else "_"
+                      for c in str(source))
+        file_name = f"unknown_{tag}_{ts}.jpg"
     save_path = os.path.join(UNKNOWN_DIR, file_name)
-    cv2.imwrite(save_path, frame)
-    print(f"Unknown person saved: {save_path}")
 
+    if writer is None:
+        cv2.imwrite(save_path, frame)
+    elif not writer.save_image(save_path, frame, box):
+        print("Unknown snapshot dropped (writer queue full)")
+        return
 
-def main():
-    #  Check xml files
-    for xml_path in [FRONTAL_DEFAULT_XML, FRONTAL_ALT2_XML, PROFILE_XML]:
-        if not os.path.exists(xml_path):
-            print(" Cascade not found:", xml_path)
-            print(" Put xml files inside models folder")
-            return
-
-    #  Load cascades
-    cascade1 = cv2.CascadeClassifier(FRONTAL_DEFAULT_XML)
-    cascade2 = cv2.CascadeClassifier(FRONTAL_ALT2_XML)
-    cascade3 = cv2.CascadeClassifier(PROFILE_XML)
+    log_event(f"Unknown person saved: {save_path}", writer)
+
+
+def load_detector(**options):
+    """
+    options -> CascadeDetector(adaptive=..., budget_ms=..., parallel=...)
+    """
+    try:
+        return CascadeDetector(**options)
+    except FileNotFoundError as e:
+        print(f" {e}")
+        print(" Put xml files inside models folder")
+        return None
+
+
+def load_recognizer(engine: str = "opencv", index_probe: int = 0,
+                    shards=None, shard_fallback: bool = False,
+                    service: str = None):
+    """
+    engine:
+      "opencv" -> cv2.face.LBPHFaceRecognizer
+      "numpy"  -> LBPHEngine (same labels, batched predict), loaded from
+                  trainer.lbph when it is newer than trainer.yml
+    index_probe > 0 (numpy engine) -> IdentityIndex, exact search only
+    inside the N most similar identities
+    shards -> only these shard models (shards.py, numpy engine), with
+    shard_fallback the global model (engine above) is searched for faces
+    the shards do not recognize
+    service -> address of recognition_service.py, nothing is loaded here
+    (the service has its own engine / shards)
+    """
+    if service:
+        client = RecognitionClient(service)
+        try:
+            health = client.health()
+        except (OSError, RuntimeError) as e:
+            print(f" Recognition service not reachable: {service} ({e})")
+            return None
+        print(f" Using recognition service {service} "
+              f"({health.get('identities', 0)} identities)")
+        return client
+
+    if shards:
+        try:
+            local = load_shards(shards)
+        except FileNotFoundError as e:
+            print(f" {e}")
+            return None
+        if index_probe > 0:
+            local = IdentityIndex(local, n_probe=index_probe)
+
+        fallback = None
+        if shard_fallback:
+            fallback = load_recognizer(engine, index_probe)
+            if fallback is None:
+                return None
+        return ShardedRecognizer(local, fallback)
 
-    #  Load trained model
     model_path = os.path.join(TRAINER_DIR, "trainer.yml")
     if not os.path.exists(model_path):
         print(" trainer.yml not found! Please run train_model.py first.")
-        return
+        return None
+
+    if engine == "numpy":
+        if binary_model_is_current():
+            # memory mapped binary model (model_store.py), no text parsing;
+            # Windows cannot replace a mapped file -> train_model.py would
+            # fail while this runs, so it is read into memory there
+            lbph, _names = load_model(mmap=os.name != "nt")
+        else:
+            lbph = LBPHEngine.from_opencv_yml(model_path)
+        if index_probe > 0:
+            return IdentityIndex(lbph, n_probe=index_probe)
+        return lbph
 
     recognizer = cv2.face.LBPHFaceRecognizer_create()
     recognizer.read(model_path)
+    return recognizer
 
-    #  Load labels mapping
+
+def load_labels():
     labels_path = os.path.join(TRAINER_DIR, "labels.txt")
     if not os.path.exists(labels_path):
         print(" labels.txt not found!")
         print(" Run train_model.py again (it will create labels.txt)")
-        return
+        return None
 
     id_name_map = {}
     with open(labels_path, "r", encoding="utf-8") as f:
@@ -125,69 +187,545 @@ def main():
                     pid = int(parts[0])
                     pname = parts[1]
                     id_name_map[pid] = pname
+    return id_name_map
 
-    #  Start camera
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print(" Camera not opening")
-        return
 
-    print(" Camera started. Press 'q' to quit.")
+def labels_for(recognizer):
+    """
+    id_name_map for this recognizer: a RecognitionClient learns it from
+    the service (it follows the service's hot reloads), else labels.txt.
+    """
+    if isinstance(recognizer, RecognitionClient):
+        return recognizer.id_name_map
+    return load_labels()
 
-    last_marked_name = None
-    last_action_time = 0
+
+def predict_face(face_roi, recognizer, id_name_map):
+    """
+    Returns (name or None, confidence) for one face crop.
+    """
+    label_id, confidence = recognizer.predict(face_roi)
+    return label_to_name(label_id, confidence, id_name_map), confidence
+
+
+def label_to_name(label_id, confidence, id_name_map):
+    if confidence < RECOGNITION_THRESHOLD and label_id in id_name_map:
+        return id_name_map[label_id]
+    return None
+
+
+#  Recognize every face in one frame
+# returns list of ((x, y, w, h), name or None, confidence, fresh)
+# fresh -> the name comes from a predict on THIS frame (always here,
+#          FaceTracker reuses names between full detections)
+
+
+def recognize_faces(gray, detector, recognizer, id_name_map):
+    results = []
+
+    #  Detect using 3 cascades
+    faces = detector.detect(gray)
+    rois = [gray[y:y + h, x:x + w] for (x, y, w, h) in faces]
+
+    #  all faces of the frame in one call when the engine supports it
+    if hasattr(recognizer, "predict_batch"):
+        predictions = recognizer.predict_batch(rois)
+    else:
+        predictions = [recognizer.predict(roi) for roi in rois]
+
+    for (x, y, w, h), (label_id, confidence) in zip(faces, predictions):
+        name = label_to_name(label_id, confidence, id_name_map)
+        results.append(((x, y, w, h), name, confidence, True))
+
+    return results
+
+
+def load_model_pair(engine="opencv", index_probe=0, shards=None,
+                    shard_fallback=False):
+    """
+    (recognizer, id_name_map) for ModelReloader, None if either fails.
+    """
+    id_name_map = load_labels()
+    if id_name_map == {}:
+        # train_model.py removed everybody: recognize nobody
+        return LBPHEngine(), id_name_map
+    recognizer = load_recognizer(engine, index_probe, shards=shards,
+                                 shard_fallback=shard_fallback)
+    if recognizer is None or id_name_map is None:
+        return None
+    return recognizer, id_name_map
+
+
+def start_model_reloader(recognizer, id_name_map, reload_every=0,
+                         service=None, **load_options):
+    """
+    ModelReloader watching trainer/ every reload_every seconds (started),
+    None when hot reload is off or a recognition service does the
+    recognizing (the service reloads its own model, see its
+    --reload-every).
+    """
+    if reload_every <= 0 or service:
+        return None
+    version = read_model_version().get("version", 0)
+    return ModelReloader(functools.partial(load_model_pair, **load_options),
+                         ModelBundle(version, recognizer, id_name_map),
+                         interval=reload_every).start()
+
+
+def make_recognizer_fn(detector, recognizer, id_name_map, detect_every=1,
+                       models=None):
+    """
+    Returns recognize(gray) -> results.
+    detect_every > 1 -> full detection only every N frames, faces are
+    followed by FaceTracker in between and keep their identity.
+    models -> ModelReloader: recognizer + labels come from models.current
+    for every frame (hot reload), the two arguments are ignored.
+    """
+    fixed = ModelBundle(0, recognizer, id_name_map)
+    tracker = FaceTracker(detect_every=detect_every) \
+        if detect_every > 1 else None
+    last_version = [(models.current if models is not None else fixed).version]
+
+    def recognize(gray):
+        # one bundle per frame: model and labels always match
+        bundle = models.current if models is not None else fixed
+
+        if tracker is None:
+            return recognize_faces(gray, detector, bundle.recognizer,
+                                   bundle.id_name_map)
+
+        if bundle.version != last_version[0]:
+            # tracked names come from the old model -> detect again
+            tracker.reset()
+            last_version[0] = bundle.version
+
+        return tracker.update(
+            gray, detector.detect,
+            lambda roi: predict_face(roi, bundle.recognizer,
+                                     bundle.id_name_map))
+
+    if tracker is not None:
+        recognize.tracker = tracker
+    return recognize
+
+
+def draw_results(frame, results):
+    for (x, y, w, h), name, confidence, _fresh in results:
+        if name:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            cv2.putText(frame, f"{name} ({int(confidence)})", (x, y - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        else:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
+            cv2.putText(frame, "Unknown", (x, y - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+
+
+class AttendanceActions:
+    """
+    Marks attendance / saves unknown snapshots for recognition results.
+
+    - a name is marked only after k of the last n frames agree on it;
+      only fresh predicts vote (a name FaceTracker reused from an earlier
+      predict is one vote, not one per frame), frames without any fresh
+      predict are not counted
+    - every name has its own cooldown (default 10 sec)
+    - names already in today's ledger are skipped without any I/O
+    - unknown snapshots have their own rate limit
+
+    Thread safe, so pipeline workers can share one instance.
+    One instance per camera (votes are per frame sequence), cameras can
+    share the ledger.
+    """
+
+    def __init__(self, ledger: AttendanceLedger = None,
+                 vote_k: int = 3, vote_n: int = 5,
+                 cooldown: float = 10.0, unknown_interval: float = 10.0,
+                 source=None):
+        self.ledger = ledger or AttendanceLedger()
+        self.source = source
+        self.writer = self.ledger.writer
+        self.votes = VoteWindow(vote_k, vote_n)
+        self.cooldowns = CooldownTable(cooldown)
+        self.unknown_limiter = RateLimiter(unknown_interval)
+        self.marked = 0
+        self._lock = threading.Lock()
+
+    def handle(self, frame, results):
+        with self._lock:
+            now = time.monotonic()
+
+            fresh = [name for _box, name, _conf, is_fresh in results
+                     if is_fresh]
+            voted = self.votes.add_frame([n for n in fresh if n]) \
+                if fresh or not results else []
+            for name in voted:
+                if not self.cooldowns.ready(name, now):
+                    continue
+                if self.ledger.is_marked(name):
+                    continue
+                if mark_attendance(name, self.ledger, self.source):
+                    self.marked += 1
+
+            # frame is None when a process pipeline could not keep it
+            unknown_boxes = [box for box, name, _conf, _fresh in results
+                             if not name]
+            if unknown_boxes and frame is not None and \
+                    self.unknown_limiter.allow(now):
+                save_unknown_face(frame, self.writer, unknown_boxes[0],
+                                  self.source)
+
+
+def run_serial(cap, detector, recognizer, id_name_map, display, actions,
+               detect_every=1, models=None):
+    recognize = make_recognizer_fn(detector, recognizer, id_name_map,
+                                   detect_every, models)
 
     while True:
         ret, frame = cap.read()
         if not ret:
-            print(" Failed to read from camera")
+            print(f" No more frames from {cap}")
             break
 
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-        #  Detect using 3 cascades
-        faces = detect_faces_3cascades(gray, cascade1, cascade2, cascade3)
+        results = recognize(gray)
+        actions.handle(frame, results)
 
-        for (x, y, w, h) in faces:
-            face_roi = gray[y:y + h, x:x + w]
+        if not display.headless:
+            draw_results(frame, results)
 
-            label_id, confidence = recognizer.predict(face_roi)
+        if not display.show(frame):
+            break
 
-            threshold = 70  # adjust for accuracy
+    if hasattr(recognize, "tracker"):
+        print(" Tracker stats:", recognize.tracker.stats())
+    print(" Detector stats:", detector.report())
+
+
+def run_pipeline(cap, recognizer, id_name_map, display, actions, workers=1,
+                 stats_every=0, detect_every=1, detector_options=None,
+                 models=None):
+    """
+    Capture / recognition / display in separate stages.
+    Recognition always works on the newest frame (older ones are dropped).
+    """
+    detectors = []
+
+    def make_processor():
+        # CascadeDetector / FaceTracker are not thread safe
+        # -> one set per worker (tracking works best with --workers 1)
+        detector = load_detector(**(detector_options or {}))
+        detectors.append(detector)
+        recognize = make_recognizer_fn(detector, recognizer, id_name_map,
+                                       detect_every, models)
+
+        def process(frame):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            results = recognize(gray)
+            actions.handle(frame, results)
+            return results
+
+        return process
+
+    pipeline = RecognitionPipeline(cap.read, make_processor, workers=workers)
+    pipeline.start()
+
+    last_stats = time.monotonic()
+
+    try:
+        while pipeline.running:
+            packet = pipeline.next_result(timeout=0.5)
+
+            if packet is not None and not display.headless:
+                draw_results(packet.frame, packet.results)
+                if not display.show(packet.frame):
+                    break
+            elif not display.poll():
+                break
+
+            if stats_every and time.monotonic() - last_stats >= stats_every:
+                print(format_stats(pipeline.stats()))
+                last_stats = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        for detector in detectors:
+            detector.close()
+
+    if pipeline.error:
+        print(f" {pipeline.error}: {cap}")
+
+    print(" Pipeline stats:", format_stats(pipeline.stats()))
+
+
+def make_process_recognizer(engine="opencv", index_probe=0, shards=None,
+                            shard_fallback=False, service=None,
+                            detect_every=1, detector_options=None,
+                            reload_every=0):
+    """
+    Runs inside every recognition PROCESS (run_processes): loads its own
+    cascades, model and labels (and watches for a new model), returns
+    process(frame) -> results.
+    """
+    detector = load_detector(**(detector_options or {}))
+    recognizer = load_recognizer(engine, index_probe, shards=shards,
+                                 shard_fallback=shard_fallback,
+                                 service=service)
+    id_name_map = labels_for(recognizer)
+    if detector is None or recognizer is None or id_name_map is None:
+        raise RuntimeError("recognition worker could not load its model")
+
+    models = start_model_reloader(
+        recognizer, id_name_map, reload_every, service,
+        engine=engine, index_probe=index_probe, shards=shards,
+        shard_fallback=shard_fallback)
+    recognize = make_recognizer_fn(detector, recognizer, id_name_map,
+                                   detect_every, models)
+
+    def process(frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # plain ints / floats, results go back through a pipe
+        return [(tuple(int(v) for v in box), name, float(conf), bool(fresh))
+                for box, name, conf, fresh in recognize(gray)]
+
+    return process
+
+
+def run_processes(source, display, actions, workers=1, stats_every=0,
+                  max_shape=None, recognizer_options=None):
+    """
+    Capture and recognition in separate processes, frames move through
+    shared memory (pipeline.ProcessPipeline). Attendance / snapshots /
+    display stay in this process.
+    """
+    make_processor = functools.partial(make_process_recognizer,
+                                       **(recognizer_options or {}))
+    pipeline = ProcessPipeline(source, make_processor, workers=workers,
+                               max_shape=max_shape)
+    pipeline.start()
+
+    last_stats = time.monotonic()
+
+    try:
+        while pipeline.running:
+            packet = pipeline.next_result(timeout=0.5)
+
+            if packet is not None:
+                actions.handle(packet.frame, packet.results)
+
+            if packet is not None and packet.frame is not None and \
+                    not display.headless:
+                draw_results(packet.frame, packet.results)
+                if not display.show(packet.frame):
+                    break
+            elif not display.poll():
+                break
+
+            if stats_every and time.monotonic() - last_stats >= stats_every:
+                print(format_stats(pipeline.stats()))
+                last_stats = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+
+    if pipeline.error:
+        print(f" {pipeline.error}: {source}")
+
+    print(" Pipeline stats:", format_stats(pipeline.stats()))
+
+
+def add_recognition_arguments(parser):
+    """
+    Options shared by mark_attendance.py and camera_host.py.
+    """
+    parser.add_argument("--engine", choices=["opencv", "numpy"],
+                        default="opencv",
+                        help="LBPH implementation used for predict")
+    parser.add_argument("--index-probe", type=int, default=0,
+                        help="numpy engine: search only the N closest identities (0 = all)")
+    parser.add_argument("--stats-every", type=float, default=0,
+                        help="print pipeline stats every N seconds (0 = only at exit)")
+    parser.add_argument("--detect-every", type=int, default=1,
+                        help="full face detection every N frames, track faces in between")
+    parser.add_argument("--cascade-order", choices=["adaptive", "fixed"],
+                        default="adaptive",
+                        help="adaptive = try cascades by recent hit rate")
+    parser.add_argument("--parallel-cascades", action="store_true",
+                        help="run the 3 cascades at once, first hit wins")
+    parser.add_argument("--detect-budget-ms", type=float, default=0,
+                        help="per frame detection budget, skip remaining cascades (0 = off)")
+    parser.add_argument("--jpeg-quality", type=int, default=90,
+                        help="unknown snapshot JPEG quality")
+    parser.add_argument("--unknown-crop-only", action="store_true",
+                        help="save only the unknown face, not the full frame")
+    parser.add_argument("--writer-queue", type=int, default=256,
+                        help="max pending background writes")
+    parser.add_argument("--vote-k", type=int, default=3,
+                        help="mark a name after it is seen in K ...")
+    parser.add_argument("--vote-n", type=int, default=5,
+                        help="... of the last N frames")
+    parser.add_argument("--cooldown", type=float, default=10,
+                        help="seconds between actions for the same name")
+    parser.add_argument("--unknown-interval", type=float, default=10,
+                        help="min seconds between unknown snapshots")
+    parser.add_argument("--shard-fallback", action="store_true",
+                        help="search the global model for faces the shards "
+                             "do not know")
+    parser.add_argument("--service", default="",
+                        help="use a running recognition_service.py "
+                             "(http://127.0.0.1:8765 or unix:/path) instead "
+                             "of loading the model; the service hot reloads "
+                             "the model itself")
+
+
+def detector_options_from(args) -> dict:
+    return {
+        "adaptive": args.cascade_order == "adaptive",
+        "parallel": args.parallel_cascades,
+        "budget_ms": args.detect_budget_ms,
+    }
 
-            if confidence < threshold and label_id in id_name_map:
-                name = id_name_map[label_id]
 
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                cv2.putText(frame, f"{name} ({int(confidence)})", (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+def main():
+    parser = argparse.ArgumentParser(description="Mark Attendance")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file or image folder")
+    parser.add_argument("--headless", action="store_true",
+                        help="no GUI windows (servers / CI), stop with Ctrl+C")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run capture / recognition / display as separate threads")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="recognition worker threads (pipeline mode) / "
+                             "processes (--processes)")
+    parser.add_argument("--processes", action="store_true",
+                        help="capture and recognition in separate processes, "
+                             "frames through shared memory")
+    parser.add_argument("--max-frame-size", default="1920x1080",
+                        help="biggest frame WxH of the shared memory ring "
+                             "(--processes)")
+    parser.add_argument("--shards", default="",
+                        help="comma separated shard models to search "
+                             "(data/shards.json)")
+    parser.add_argument("--camera", default="",
+                        help="camera name, its shards come from data/shards.json")
+    parser.add_argument("--reload-every", type=float, default=2.0,
+                        help="check trainer/ for a retrained model every N "
+                             "seconds and swap it in (0 = off)")
+    add_recognition_arguments(parser)
+    args = parser.parse_args()
+
+    detector_options = detector_options_from(args)
 
-                #  avoid repeated action in 10 sec
-                current_time = datetime.now().timestamp()
+    #  Load cascades
+    detector = load_detector(**detector_options)
+    if detector is None:
+        return
+
+    #  Shards of this camera (empty = global model)
+    shards = [s.strip() for s in args.shards.split(",") if s.strip()]
+    if args.camera:
+        shards += [s for s in shards_for_camera(args.camera) if s not in shards]
+        if not shards:
+            print(f" No shards for camera '{args.camera}', using global model")
 
-                if (name != last_marked_name) or (current_time -
-                                                  last_action_time > 10):
-                    mark_attendance(name)
-                    last_marked_name = name
-                    last_action_time = current_time
+    #  Load trained model
+    recognizer = load_recognizer(args.engine, args.index_probe,
+                                 shards=shards,
+                                 shard_fallback=args.shard_fallback,
+                                 service=args.service)
+    if recognizer is None:
+        return
+    if shards and not args.service:
+        print(f" Searching shards: {', '.join(shards)}"
+              f"{' (+ global fallback)' if args.shard_fallback else ''}")
 
-            else:
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
-                cv2.putText(frame, "Unknown", (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+    #  Load labels mapping
+    id_name_map = labels_for(recognizer)
+    if id_name_map is None:
+        return
 
-                current_time = datetime.now().timestamp()
-                if current_time - last_action_time > 10:
-                    save_unknown_face(frame)
-                    last_action_time = current_time
+    #  Start camera / video / image folder
+    cap = open_source(args.source)
+    if not cap.isOpened():
+        print(f" Frame source not opening: {cap}")
+        return
 
-        cv2.imshow("Smart Attendance System", frame)
+    display = FrameDisplay("Smart Attendance System", headless=args.headless)
 
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
+    if args.headless:
+        print(f" Reading from {cap} (headless). Press Ctrl+C to stop.")
+    else:
+        print(f" Reading from {cap}. Press 'q' to quit.")
+
+    #  All file writes happen on a background thread
+    writer = BackgroundWriter(max_queue=args.writer_queue,
+                              jpeg_quality=args.jpeg_quality,
+                              crop_only=args.unknown_crop_only)
+    actions = AttendanceActions(AttendanceLedger(writer=writer),
+                                vote_k=args.vote_k,
+                                vote_n=args.vote_n,
+                                cooldown=args.cooldown,
+                                unknown_interval=args.unknown_interval)
+
+    #  Retrained model -> loaded in the background, swapped between frames
+    # (--processes: every worker process watches for itself)
+    models = None
+    if not args.processes:
+        models = start_model_reloader(
+            recognizer, id_name_map, args.reload_every, args.service,
+            engine=args.engine, index_probe=args.index_probe,
+            shards=shards, shard_fallback=args.shard_fallback)
+
+    if args.processes:
+        # the capture process opens the source itself
+        cap.release()
+        width, height = (int(v) for v in args.max_frame_size.lower().split("x"))
+        run_processes(args.source, display, actions,
+                      workers=args.workers,
+                      stats_every=args.stats_every,
+                      max_shape=(height, width, 3),
+                      recognizer_options={
+                          "engine": args.engine,
+                          "index_probe": args.index_probe,
+                          "shards": shards,
+                          "shard_fallback": args.shard_fallback,
+                          "service": args.service,
+                          "reload_every": args.reload_every,
+                          "detect_every": args.detect_every,
+                          "detector_options": detector_options,
+                      })
+    elif args.pipeline:
+        run_pipeline(cap, recognizer, id_name_map, display, actions,
+                     workers=args.workers,
+                     stats_every=args.stats_every,
+                     detect_every=args.detect_every,
+                     detector_options=detector_options,
+                     models=models)
+    else:
+        try:
+            run_serial(cap, detector, recognizer, id_name_map, display,
+                       actions, detect_every=args.detect_every,
+                       models=models)
+        except KeyboardInterrupt:
+            pass
+
+    detector.close()
+    if models is not None:
+        models.stop()
+        recognizer = models.current.recognizer
+        print(" Model reload stats:", models.stats())
+
+    #  write everything still queued before exit
+    writer.close()
+    print(" Writer stats:", writer.stats())
+    if hasattr(recognizer, "stats"):
+        print(" Recognizer stats:", recognizer.stats())
 
     cap.release()
-    cv2.destroyAllWindows()
+    display.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from config import TRAINER_DIR
+
+#  Model versions + hot reload
+#
+# train_model.py writes trainer.yml, trainer.lbph, labels.txt (and shard
+# models) one after the other. When everything is written it publishes
+# trainer/model_version.json LAST:
+#
+#   {"version": 7, "published": "...", "files": {"labels.txt":
+#    {"size": 120, "mtime_ns": ...}, "trainer.yml": {...}, ...}}
+#
+# A running recognizer (ModelReloader) polls the artifacts, and once
+# they stop changing and match the published version it loads model +
+# labels in a background thread and swaps them in as ONE ModelBundle.
+# The recognition loop reads `reloader.current` once per frame, so a
+# frame never sees a new model with old labels (or the other way round)
+# and never waits for a load.
+
+MODEL_VERSION_PATH = os.path.join(TRAINER_DIR, "model_version.json")
+
+MODEL_FILES = ("trainer.yml", "trainer.lbph", "labels.txt",
+               os.path.join("shards", "manifest.json"))
+
+
+def _file_stats(trainer_dir: str = TRAINER_DIR) -> dict:
+    stats = {}
+    for name in MODEL_FILES:
+        path = os.path.join(trainer_dir, name)
+        if os.path.exists(path):
+            st = os.stat(path)
+            stats[name.replace(os.sep, "/")] = {"size": st.st_size,
+                                                "mtime_ns": st.st_mtime_ns}
+    return stats
+
+
+def read_model_version(path: str = MODEL_VERSION_PATH) -> dict:
+    """
+    Published version info, {} if there is none (or it is unreadable).
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def publish_model_version(trainer_dir: str = TRAINER_DIR,
+                          path: str = MODEL_VERSION_PATH) -> int:
+    """
+    Called after every artifact is written. Bumps the version only if a
+    file changed since the last publish. Returns the current version.
+    """
+    old = read_model_version(path)
+    files = _file_stats(trainer_dir)
+    if old.get("files") == files:
+        return int(old.get("version", 0))
+
+    info = {
+        "version": int(old.get("version", 0)) + 1,
+        "published": datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_path, path)
+    return info["version"]
+
+
+class ModelBundle:
+    """
+    Recognizer + the label map it was trained with, never used apart.
+    """
+
+    __slots__ = ("version", "recognizer", "id_name_map", "loaded")
+
+    def __init__(self, version: int, recognizer, id_name_map: dict):
+        self.version = version
+        self.recognizer = recognizer
+        self.id_name_map = id_name_map
+        self.loaded = time.monotonic()
+
+
+class FixedModel:
+    """
+    Same `current` / stop() / stats() as ModelReloader, for a model that
+    is never reloaded (hot reload off).
+    """
+
+    def __init__(self, bundle: ModelBundle):
+        self.current = bundle
+
+    def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"version": self.current.version, "reloads": 0,
+                "failures": 0, "last_load_s": 0.0}
+
+
+class ModelReloader:
+    """
+    loader()  -> (recognizer, id_name_map) or None on failure
+    bundle    -> ModelBundle in use right now
+    interval  -> seconds between checks of the trainer folder
+
+    `current` is replaced (one attribute assignment) after a new bundle
+    is completely loaded; readers just take `reloader.current`.
+    """
+
+    def __init__(self, loader, bundle: ModelBundle, interval: float = 2.0,
+                 trainer_dir: str = TRAINER_DIR,
+                 version_path: str = MODEL_VERSION_PATH):
+        self.loader = loader
+        self.current = bundle
+        self.interval = max(0.1, interval)
+        self.trainer_dir = trainer_dir
+        self.version_path = version_path
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._loaded_sig = self._signature()
+        self._last_sig = self._loaded_sig
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_load_s = 0.0
+
+    def _signature(self):
+        version = read_model_version(self.version_path)
+        return (version.get("version"), json.dumps(
+            _file_stats(self.trainer_dir), sort_keys=True))
+
+    #  lifecycle
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name="model-reload", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.failures += 1
+                print(f" Model reload failed: {e}")
+
+    #  one poll
+
+    def check(self) -> bool:
+        """
+        Loads + swaps in the new model if the trainer files changed and
+        have settled. True if a new bundle was published.
+        """
+        sig = self._signature()
+        settled = sig == self._last_sig
+        self._last_sig = sig
+        if not settled or sig == self._loaded_sig:
+            return False
+
+        # training still writing -> the published list does not match
+        version = read_model_version(self.version_path)
+        if version and version.get("files") != _file_stats(self.trainer_dir):
+            return False
+
+        t0 = time.perf_counter()
+        loaded = self.loader()
+        if loaded is None:
+            self.failures += 1
+            self._loaded_sig = sig     # retry only after the next change
+            return False
+
+        recognizer, id_name_map = loaded
+        number = version.get("version", self.current.version + 1)
+        self.current = ModelBundle(number, recognizer, id_name_map)
+        self._loaded_sig = sig
+        self.reloads += 1
+        self.last_load_s = time.perf_counter() - t0
+
+        print(f" Model v{number} loaded in {self.last_load_s:.2f} s "
+              f"({len(id_name_map)} identities), swapped in")
+        return True
+
+    def stats(self) -> dict:
+        return {"version": self.current.version,
+                "reloads": self.reloads,
+                "failures": self.failures,
+                "last_load_s": round(self.last_load_s, 3)}
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from config import FACE_SIZE, TRAINER_DIR
+from lbph_engine import LBPHEngine
+
+#  Binary LBPH model file (trainer/trainer.lbph)
+#
+# trainer.yml stores every histogram as text, for a big workforce it is
+# huge and slow to parse. trainer.lbph is:
+#
+#   8 bytes   magic "SALBPH01"
+#   4 bytes   header length (little endian uint32)
+#   N bytes   JSON header (params, dtype, shapes, offsets, names)
+#   padding   -> histogram matrix starts at a 64 byte boundary
+#   raw       histogram matrix (count x dim), dtype from header
+#   raw       labels (int32)
+#
+# load_model() memory maps the histogram matrix (np.memmap): startup
+# only reads the header, pages are loaded on first use and shared by
+# every process that maps the same file.
+#
+# dtype:
+#   float32 -> same values as OpenCV (default)
+#   float16 -> half size, tiny distance differences
+#   uint16  -> LBP counts per cell, half size and exact
+#              (value = count * hist_scale)
+
+MAGIC = b"SALBPH01"
+ALIGN = 64
+
+MODEL_BIN_PATH = os.path.join(TRAINER_DIR, "trainer.lbph")
+MODEL_YML_PATH = os.path.join(TRAINER_DIR, "trainer.yml")
+LABELS_PATH = os.path.join(TRAINER_DIR, "labels.txt")
+
+DTYPES = ("float32", "float16", "uint16")
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _cell_pixels(engine: LBPHEngine, face_size):
+    w, h = face_size
+    lbp_w = w - 2 * engine.radius
+    lbp_h = h - 2 * engine.radius
+    return (lbp_w // engine.grid_x) * (lbp_h // engine.grid_y)
+
+
+def save_model(engine: LBPHEngine, path: str = MODEL_BIN_PATH,
+               dtype: str = "float32", names: dict = None,
+               face_size=None):
+    """
+    Writes engine histograms + labels (+ optional id -> name map).
+    The file is written next to the target and renamed, so a running
+    reader never sees a half written model.
+
+    uint16 needs face_size (training image size) to turn histogram
+    values back into per cell counts.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}")
+
+    hist = engine.rows_as_float()
+    labels = np.asarray(engine.labels, dtype=np.int32)
+    count, dim = hist.shape
+
+    hist_scale = None
+    if dtype == "uint16":
+        if face_size is None:
+            raise ValueError("uint16 format needs face_size")
+        cell = _cell_pixels(engine, face_size)
+        data = np.rint(hist * cell).astype(np.uint16)
+        hist_scale = 1.0 / cell
+    else:
+        data = hist.astype(dtype)
+
+    header = {
+        "version": 1,
+        "radius": engine.radius,
+        "neighbors": engine.neighbors,
+        "grid_x": engine.grid_x,
+        "grid_y": engine.grid_y,
+        "threshold": None if engine.threshold == float("inf")
+        else engine.threshold,
+        "count": count,
+        "dim": dim,
+        "dtype": dtype,
+        "hist_scale": hist_scale,
+        "names": {str(k): v for k, v in (names or {}).items()},
+    }
+
+    # offsets are part of the header -> repeat until they are stable
+    header["hist_offset"] = 0
+    header["labels_offset"] = 0
+    while True:
+        blob = json.dumps(header).encode("utf-8")
+        hist_offset = _aligned(len(MAGIC) + 4 + len(blob))
+        labels_offset = _aligned(hist_offset + data.nbytes)
+        if (header["hist_offset"], header["labels_offset"]) == \
+                (hist_offset, labels_offset):
+            break
+        header["hist_offset"] = hist_offset
+        header["labels_offset"] = labels_offset
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(blob)))
+        f.write(blob)
+        f.write(b"\0" * (hist_offset - f.tell()))
+        f.write(np.ascontiguousarray(data).tobytes())
+        f.write(b"\0" * (labels_offset - f.tell()))
+        f.write(labels.tobytes())
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a trainer.lbph model file: {path}")
+        (size,) = struct.unpack("<I", f.read(4))
+        return json.loads(f.read(size).decode("utf-8"))
+
+
+def load_model(path: str = MODEL_BIN_PATH, mmap: bool = True):
+    """
+    Returns (LBPHEngine, names) where names is {id: name} stored in the
+    file (empty if the model was saved without it).
+    """
+    header = read_header(path)
+
+    threshold = header.get("threshold")
+    engine = LBPHEngine(radius=header["radius"],
+                        neighbors=header["neighbors"],
+                        grid_x=header["grid_x"],
+                        grid_y=header["grid_y"],
+                        threshold=float("inf") if threshold is None
+                        else threshold)
+
+    shape = (header["count"], header["dim"])
+    dtype = np.dtype(header["dtype"])
+
+    if header["count"] == 0:
+        engine.histograms = np.zeros(shape, dtype=dtype)
+    elif mmap:
+        engine.histograms = np.memmap(path, dtype=dtype, mode="r",
+                                      offset=header["hist_offset"],
+                                      shape=shape)
+    else:
+        with open(path, "rb") as f:
+            f.seek(header["hist_offset"])
+            engine.histograms = np.fromfile(f, dtype=dtype,
+                                            count=shape[0] * shape[1])
+        engine.histograms = engine.histograms.reshape(shape)
+
+    with open(path, "rb") as f:
+        f.seek(header["labels_offset"])
+        engine.labels = np.fromfile(f, dtype=np.int32, count=header["count"])
+
+    engine.hist_scale = header.get("hist_scale")
+
+    names = {int(k): v for k, v in header.get("names", {}).items()}
+    return engine, names
+
+
+def convert_yml(yml_path: str = MODEL_YML_PATH,
+                out_path: str = MODEL_BIN_PATH,
+                dtype: str = "float32", names: dict = None,
+                face_size=None):
+    engine = LBPHEngine.from_opencv_yml(yml_path)
+    return save_model(engine, out_path, dtype=dtype, names=names,
+                      face_size=face_size)
+
+
+def binary_model_is_current(bin_path: str = MODEL_BIN_PATH,
+                            yml_path: str = MODEL_YML_PATH) -> bool:
+    """
+    True if trainer.lbph exists and is not older than trainer.yml.
+    """
+    if not os.path.exists(bin_path):
+        return False
+    if not os.path.exists(yml_path):
+        return True
+    return os.path.getmtime(bin_path) >= os.path.getmtime(yml_path)
+
+
+def read_labels(path: str = LABELS_PATH) -> dict:
+    """
+    labels.txt ("id,name" per line) -> {id: name}, {} if there is no file
+    """
+    id_name_map = {}
+    if not os.path.exists(path):
+        return id_name_map
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) == 2:
+                id_name_map[int(parts[0])] = parts[1]
+    return id_name_map
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert trainer.yml to the binary trainer.lbph format")
+    parser.add_argument("--yml", default=MODEL_YML_PATH)
+    parser.add_argument("--out", default=MODEL_BIN_PATH)
+    parser.add_argument("--dtype", choices=DTYPES, default="float32")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.yml):
+        print(f" Model not found: {args.yml}")
+        return
+
+    names = read_labels()
+    convert_yml(args.yml, args.out, dtype=args.dtype, names=names,
+                face_size=FACE_SIZE)
+
+    yml_mb = os.path.getsize(args.yml) / 1e6
+    bin_mb = os.path.getsize(args.out) / 1e6
+    print(f" {args.yml} ({yml_mb:.1f} MB) -> {args.out} ({bin_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
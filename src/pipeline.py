@@ -0,0 +1,706 @@
+import multiprocessing as mp
+import queue
+import signal
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from frame_ring import DEFAULT_MAX_SHAPE, FrameReader, FrameRing
+from frame_source import open_source
+
+
+#  Pipelined recognition:
+#
+#   capture thread  ->  [latest frame slot]  ->  recognition worker(s)
+#                                                      |
+#   display stage   <-  [latest result slot]  <--------+
+#
+# Every slot only keeps the NEWEST item. If a stage is slower than the
+# one before it, older items are overwritten (and counted as drops)
+# instead of piling up, so the frame being recognized is never more
+# than one frame behind the camera.
+
+
+class LatestSlot:
+    """
+    Single item mailbox.
+    put() overwrites whatever is waiting, get() takes the newest item.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+
+        self.put_count = 0
+        self.get_count = 0
+        self.drop_count = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                # reader did not pick the previous item in time
+                self.drop_count += 1
+            self._item = item
+            self.put_count += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Returns newest item, or None on timeout / when slot is closed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while self._item is None and not self._closed:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                self._cond.wait(remaining)
+
+            item = self._item
+            self._item = None
+            if item is not None:
+                self.get_count += 1
+            return item
+
+    def depth(self) -> int:
+        with self._cond:
+            return 0 if self._item is None else 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queue_depth": 0 if self._item is None else 1,
+                "put": self.put_count,
+                "get": self.get_count,
+                "dropped": self.drop_count,
+            }
+
+
+class FramePacket:
+    """
+    One captured frame travelling through the pipeline.
+    seq      -> increasing frame number (from capture thread)
+    captured -> time.monotonic() when frame was read
+    results  -> filled by recognition worker
+    source   -> camera / video id (multi source host)
+    """
+
+    __slots__ = ("seq", "captured", "frame", "results", "source")
+
+    def __init__(self, seq: int, captured: float, frame, source=None):
+        self.seq = seq
+        self.captured = captured
+        self.frame = frame
+        self.results = None
+        self.source = source
+
+
+class RecognitionPipeline:
+    """
+    Runs capture + recognition in background threads.
+    The display/render stage stays in the caller thread (cv2.imshow must
+    run on the main thread), it just pulls from `pipeline.results`.
+
+    read_frame()        -> (ret, frame) e.g. cap.read
+    make_processor()    -> called once per worker, returns process(frame)
+                           (so every worker owns its own cascades)
+    """
+
+    def __init__(self, read_frame, make_processor, workers: int = 1):
+        self.read_frame = read_frame
+        self.make_processor = make_processor
+        self.num_workers = max(1, int(workers))
+
+        self.frames = LatestSlot("capture")
+        self.results = LatestSlot("recognition")
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self.captured = 0
+        self.processed = 0
+        self.stale_results = 0
+        self.rendered = 0
+        self.last_latency = 0.0
+        self.last_rendered_seq = -1
+        self.error = None
+        self.exception = None
+
+    #  lifecycle
+
+    def start(self):
+        t = threading.Thread(target=self._capture_loop,
+                             name="capture",
+                             daemon=True)
+        self._threads.append(t)
+
+        for i in range(self.num_workers):
+            process = self.make_processor()
+            t = threading.Thread(target=self._worker_loop,
+                                 args=(process,),
+                                 name=f"recognition-{i}",
+                                 daemon=True)
+            self._threads.append(t)
+
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        self.frames.close()
+        self.results.close()
+        for t in self._threads:
+            t.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        """
+        False after stop(), at the end of the source or when a worker
+        failed (error / exception tell why).
+        """
+        return not self._stop.is_set()
+
+    def _fail(self, exc: Exception):
+        # first failure wins, the display loop sees running == False
+        with self._lock:
+            if self.exception is None:
+                self.exception = exc
+                self.error = (f"Recognition failed "
+                              f"({type(exc).__name__}: {exc})")
+        self._stop.set()
+        self.frames.close()
+        self.results.close()
+
+    #  stages
+
+    def _capture_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            ret, frame = self.read_frame()
+            if not ret:
+                self.error = "No more frames from source"
+                self._stop.set()
+                self.frames.close()
+                self.results.close()
+                break
+
+            seq += 1
+            self.captured = seq
+            self.frames.put(FramePacket(seq, time.monotonic(), frame))
+
+    def _worker_loop(self, process):
+        while not self._stop.is_set():
+            packet = self.frames.get(timeout=0.5)
+            if packet is None:
+                continue
+
+            try:
+                packet.results = process(packet.frame)
+            except Exception as e:
+                self._fail(e)
+                break
+
+            with self._lock:
+                self.processed += 1
+
+            self.results.put(packet)
+
+    def next_result(self, timeout: float = 0.5):
+        """
+        Display stage helper.
+        Returns newest FramePacket with results, skipping packets that are
+        older than one already rendered (possible with > 1 worker).
+        Raises RuntimeError once a worker failed.
+        """
+        if self.exception is not None:
+            raise RuntimeError(self.error) from self.exception
+        packet = self.results.get(timeout=timeout)
+        if packet is None:
+            return None
+
+        if packet.seq <= self.last_rendered_seq:
+            self.stale_results += 1
+            return None
+
+        self.last_rendered_seq = packet.seq
+        self.rendered += 1
+        self.last_latency = time.monotonic() - packet.captured
+        return packet
+
+    #  metrics
+
+    def stats(self) -> dict:
+        capture = self.frames.stats()
+        capture["frames"] = self.captured
+
+        recognition = self.results.stats()
+        recognition["processed"] = self.processed
+        recognition["workers"] = self.num_workers
+
+        display = {
+            "rendered": self.rendered,
+            "stale_dropped": self.stale_results,
+            "latency_ms": round(self.last_latency * 1000, 1),
+        }
+
+        return {
+            "capture": capture,
+            "recognition": recognition,
+            "display": display,
+        }
+
+
+#  Multi source host:
+#
+#   capture thread per source -> [newest frame per source] -> shared
+#   recognition workers (one model for all sources)
+#
+# SourceScheduler hands sources to workers round robin and never gives
+# the same source to two workers at once, so frames of one camera are
+# processed in order and per camera state (tracker, votes) needs no
+# extra locking.
+
+
+class SourceScheduler:
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}        # source -> newest FramePacket
+        self._ready = deque()     # sources with a packet and no worker
+        self._busy = set()
+        self._closed = False
+
+        self.put_count = {}
+        self.drop_count = {}
+
+    def put(self, packet: FramePacket):
+        source = packet.source
+        with self._cond:
+            self.put_count[source] = self.put_count.get(source, 0) + 1
+            if source in self._pending:
+                # no worker took the previous frame of this source
+                self.drop_count[source] = self.drop_count.get(source, 0) + 1
+            elif source not in self._busy:
+                self._ready.append(source)
+            self._pending[source] = packet
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Newest packet of the next waiting source (source is then busy
+        until done() is called), None on timeout / close.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while not self._ready and not self._closed:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                self._cond.wait(remaining)
+
+            if not self._ready:
+                return None
+            source = self._ready.popleft()
+            self._busy.add(source)
+            return self._pending.pop(source)
+
+    def done(self, source):
+        with self._cond:
+            self._busy.discard(source)
+            if source in self._pending:
+                self._ready.append(source)
+                self._cond.notify()
+
+    def idle(self) -> bool:
+        with self._cond:
+            return not self._pending and not self._busy
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {source: {"put": self.put_count.get(source, 0),
+                             "dropped": self.drop_count.get(source, 0),
+                             "pending": int(source in self._pending)}
+                    for source in self.put_count}
+
+
+class MultiSourcePipeline:
+    """
+    sources        -> {source_id: read_frame}   read_frame() -> (ret, frame)
+    make_processor -> called once per worker, returns process(packet)
+                      (packet.source tells the camera)
+    workers        -> shared recognition threads for all sources
+
+    Recognized packets of every source are put in results[source_id]
+    (LatestSlot) for an optional display stage.
+    """
+
+    def __init__(self, sources: dict, make_processor, workers: int = 2):
+        self.sources = dict(sources)
+        self.make_processor = make_processor
+        self.num_workers = max(1, int(workers))
+
+        self.scheduler = SourceScheduler()
+        self.results = {source: LatestSlot(f"results-{source}")
+                        for source in self.sources}
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._capture_threads = []
+        self._worker_threads = []
+
+        self.captured = {source: 0 for source in self.sources}
+        self.processed = {source: 0 for source in self.sources}
+        self.latency = {source: 0.0 for source in self.sources}
+        self.errors = {}
+
+    #  lifecycle
+
+    def start(self):
+        for source, read_frame in self.sources.items():
+            t = threading.Thread(target=self._capture_loop,
+                                 args=(source, read_frame),
+                                 name=f"capture-{source}",
+                                 daemon=True)
+            self._capture_threads.append(t)
+
+        for i in range(self.num_workers):
+            process = self.make_processor()
+            t = threading.Thread(target=self._worker_loop,
+                                 args=(process,),
+                                 name=f"recognition-{i}",
+                                 daemon=True)
+            self._worker_threads.append(t)
+
+        for t in self._capture_threads + self._worker_threads:
+            t.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        self.scheduler.close()
+        for slot in self.results.values():
+            slot.close()
+        for t in self._capture_threads + self._worker_threads:
+            t.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        """
+        False after stop(), when a worker failed (errors) or when every
+        source ended and every frame was processed.
+        """
+        if self._stop.is_set():
+            return False
+        return any(t.is_alive() for t in self._worker_threads)
+
+    def _captures_done(self) -> bool:
+        return not any(t.is_alive() for t in self._capture_threads)
+
+    #  stages
+
+    def _capture_loop(self, source, read_frame):
+        seq = 0
+        while not self._stop.is_set():
+            ret, frame = read_frame()
+            if not ret:
+                with self._lock:
+                    self.errors[source] = "No more frames from source"
+                break
+
+            seq += 1
+            self.captured[source] = seq
+            self.scheduler.put(FramePacket(seq, time.monotonic(), frame,
+                                           source))
+
+    def _worker_loop(self, process):
+        while not self._stop.is_set():
+            packet = self.scheduler.get(timeout=0.2)
+            if packet is None:
+                if self._captures_done() and self.scheduler.idle():
+                    break
+                continue
+
+            try:
+                packet.results = process(packet)
+            except Exception as e:
+                # stop the host instead of losing a worker silently
+                with self._lock:
+                    self.errors[packet.source] = \
+                        f"Recognition failed ({type(e).__name__}: {e})"
+                self._stop.set()
+                self.scheduler.close()
+                for slot in self.results.values():
+                    slot.close()
+                break
+            finally:
+                self.scheduler.done(packet.source)
+
+            with self._lock:
+                self.processed[packet.source] += 1
+                self.latency[packet.source] = \
+                    time.monotonic() - packet.captured
+
+            self.results[packet.source].put(packet)
+
+    #  metrics
+
+    def stats(self) -> dict:
+        scheduled = self.scheduler.stats()
+        with self._lock:
+            return {
+                source: {
+                    "frames": self.captured[source],
+                    "processed": self.processed[source],
+                    "dropped": scheduled.get(source, {}).get("dropped", 0),
+                    "latency_ms": round(self.latency[source] * 1000, 1),
+                    "error": self.errors.get(source),
+                }
+                for source in self.sources
+            }
+
+
+#  Process pipeline:
+#
+#   capture PROCESS -> [FrameRing, shared memory] -> recognition PROCESSES
+#                                                         |
+#   caller (actions + display)  <-  results queue  <------+
+#
+# Same flow as RecognitionPipeline without the GIL between the stages.
+# Frames are captured straight into a ring slot and read in place by the
+# workers; only (seq, results) travel back through a queue. The caller
+# reads the frame of a result from the ring again (if it was not
+# overwritten yet) to draw it / save unknown snapshots.
+
+
+def _capture_main(source, loop, ring, stop):
+    # Ctrl+C is handled by the parent (it sets `stop`)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cap = open_source(source, loop=loop)
+    if not cap.isOpened():
+        ring.close()
+        ring.release()
+        return
+
+    shape = None
+    try:
+        while not stop.is_set():
+            slot = ring.begin_write()
+            buf = ring.buffer(slot, shape) if shape is not None else None
+            ret, frame = cap.read(buf)
+            if not ret:
+                break
+
+            captured = time.monotonic()
+            if buf is None or not np.shares_memory(frame, buf):
+                # first frame / source that allocates its own frames
+                np.copyto(ring.buffer(slot, frame.shape), frame)
+            shape = frame.shape
+            ring.publish(slot, shape, captured)
+    finally:
+        ring.close()
+        cap.release()
+        ring.release()
+
+
+def _worker_main(ring, reader_id, make_processor, results, stop):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    process = make_processor()
+    reader = FrameReader(ring, reader_id, group=0)
+
+    try:
+        while not stop.is_set():
+            got = reader.get(timeout=0.2)
+            if got is None:
+                if ring.closed:
+                    break
+                continue
+
+            seq, captured, frame = got
+            results.put((seq, captured, process(frame)))
+    finally:
+        reader.release()
+        results.put(None)
+        ring.release()
+
+
+class ProcessPipeline:
+    """
+    source         -> frame source spec (opened by the capture process)
+    make_processor -> picklable, called once in every worker process,
+                      returns process(frame) -> results (must not keep
+                      the frame, it lives in shared memory)
+    workers        -> recognition processes
+
+    next_result() returns every FramePacket in the order results arrive;
+    packet.frame is None when the frame is no longer in the ring or is
+    older than one already returned.
+    """
+
+    def __init__(self, source, make_processor, workers: int = 1,
+                 loop: bool = False, max_shape=DEFAULT_MAX_SHAPE,
+                 slots: int = None):
+        self.source = source
+        self.loop = loop
+        self.make_processor = make_processor
+        self.num_workers = max(1, int(workers))
+
+        # spawn: no fork of a process that already runs threads
+        self._ctx = mp.get_context("spawn")
+        # readers 0..workers-1 = workers (group 0), last = caller (group 1)
+        self.ring = FrameRing(slots=slots, readers=self.num_workers + 1,
+                              groups=2, max_shape=max_shape, ctx=self._ctx)
+        self._frames = FrameReader(self.ring, self.num_workers, group=1)
+        self._results = self._ctx.Queue()
+        self._stop = self._ctx.Event()
+        self._processes = []
+        self._finished = 0
+        self._ring_stats = None
+
+        self.processed = 0
+        self.stale_results = 0
+        self.expired = 0
+        self.rendered = 0
+        self.last_latency = 0.0
+        self.last_rendered_seq = -1
+        self.error = None
+
+    #  lifecycle
+
+    def start(self):
+        self._processes.append(self._ctx.Process(
+            target=_capture_main,
+            args=(self.source, self.loop, self.ring, self._stop),
+            name="capture", daemon=True))
+
+        for i in range(self.num_workers):
+            self._processes.append(self._ctx.Process(
+                target=_worker_main,
+                args=(self.ring, i, self.make_processor, self._results,
+                      self._stop),
+                name=f"recognition-{i}", daemon=True))
+
+        for p in self._processes:
+            p.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self.ring.close()
+
+        # workers exit only after their queued results are flushed
+        deadline = time.monotonic() + timeout
+        while any(p.is_alive() for p in self._processes) and \
+                time.monotonic() < deadline:
+            try:
+                self._results.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        for p in self._processes:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+
+        self._ring_stats = self.ring.stats()
+        self._frames.release()
+        self.ring.release()
+
+    @property
+    def running(self) -> bool:
+        return not self._stop.is_set() and \
+            self._finished < self.num_workers
+
+    #  results
+
+    def next_result(self, timeout: float = 0.5):
+        try:
+            item = self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+        if item is None:
+            # one worker finished (ring closed)
+            self._finished += 1
+            if self._finished >= self.num_workers and self.ring.closed:
+                self.error = "No more frames from source"
+            return None
+
+        seq, captured, results = item
+        self.processed += 1
+        packet = FramePacket(seq, captured, None, self.source)
+        packet.results = results
+
+        if seq <= self.last_rendered_seq:
+            self.stale_results += 1
+            return packet
+
+        packet.frame = self._frames.get_seq(seq)
+        if packet.frame is None:
+            self.expired += 1
+            return packet
+
+        self.last_rendered_seq = seq
+        self.rendered += 1
+        self.last_latency = time.monotonic() - captured
+        return packet
+
+    #  metrics
+
+    def stats(self) -> dict:
+        ring = self._ring_stats or self.ring.stats()
+        return {
+            "capture": {
+                "frames": ring["written"],
+                "queue_depth": ring["written"] - ring["cursor"][0],
+                "dropped": ring["dropped"][0],
+                "slots": ring["slots"],
+            },
+            "recognition": {
+                "processed": self.processed,
+                "workers": self.num_workers,
+                "queue_depth": 0,
+                "dropped": 0,
+            },
+            "display": {
+                "rendered": self.rendered,
+                "stale_dropped": self.stale_results + self.expired,
+                "latency_ms": round(self.last_latency * 1000, 1),
+            },
+        }
+
+
+def format_source_stats(stats: dict) -> str:
+    return " | ".join(
+        f"{source}: frames={s['frames']} done={s['processed']} "
+        f"dropped={s['dropped']} latency={s['latency_ms']}ms"
+        for source, s in stats.items())
+
+
+def format_stats(stats: dict) -> str:
+    c = stats["capture"]
+    r = stats["recognition"]
+    d = stats["display"]
+    return (f"capture: frames={c['frames']} depth={c['queue_depth']} "
+            f"dropped={c['dropped']} | "
+            f"recognition: done={r['processed']} workers={r['workers']} "
+            f"depth={r['queue_depth']} dropped={r['dropped']} | "
+            f"display: shown={d['rendered']} stale={d['stale_dropped']} "
+            f"latency={d['latency_ms']}ms")
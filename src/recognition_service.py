@@ -0,0 +1,678 @@
+import argparse
+import functools
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from config import RECOGNITION_THRESHOLD
+from model_reload import (FixedModel, ModelBundle, ModelReloader,
+                          read_model_version)
+
+#  Local recognition service
+#
+# One long running process loads the model once per host, every tool
+# (mark_attendance.py --service, batch_attendance.py --service ...) asks it:
+#
+#   python recognition_service.py                      # http://127.0.0.1:8765
+#   python recognition_service.py --unix /tmp/attendance.sock
+#
+#   POST /predict            gray face crops -> label / name / confidence
+#   POST /predict?detect=1   frames -> detected faces + identities
+#   GET  /health             model version, identities, uptime
+#   GET  /metrics            requests, batch sizes, latency, queue depth
+#
+# Request body: uint8 arrays back to back, shapes in a header
+#   X-Shapes: 120x120,96x96        (h x w, h x w x 3 for BGR)
+# or ONE encoded image (Content-Type: image/jpeg, image/png).
+#
+# Faces of requests arriving within --batch-window-ms of each other are
+# predicted in ONE predict_batch call (one batcher thread owns the model,
+# so the OpenCV recognizer works too, it just has no vectorized batch).
+#
+# The service watches trainer/ like mark_attendance.py (--reload-every):
+# a retrained model + labels are swapped in as one ModelBundle between
+# two batches, every answer is labelled with the bundle it came from.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+#  Micro batching
+
+
+class _Job:
+    __slots__ = ("faces", "future", "queued")
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.future = Future()
+        self.queued = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    submit(faces) -> Future with (bundle, [(label, distance)]) for those
+    faces, bundle = the ModelBundle that predicted them.
+    One thread collects the jobs of `window_ms` (at most `max_batch`
+    faces) and runs predict_batch once for all of them.
+
+    models -> ModelReloader / FixedModel, `models.current` is read once
+              per batch
+    """
+
+    def __init__(self, models, window_ms: float = 2.0,
+                 max_batch: int = 64):
+        self.models = models
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="batcher",
+                                        daemon=True)
+
+        self.batches = 0
+        self.faces = 0
+        self.max_seen = 0
+        self.predict_s = 0.0
+        self._thread.start()
+
+    def submit(self, faces) -> Future:
+        job = _Job(list(faces))
+        if not job.faces:
+            job.future.set_result((self.models.current, []))
+        else:
+            self._queue.put(job)
+        return job.future
+
+    @staticmethod
+    def _predict(recognizer, faces):
+        if hasattr(recognizer, "predict_batch"):
+            return recognizer.predict_batch(faces)
+        return [recognizer.predict(face) for face in faces]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            jobs = [job]
+            count = len(job.faces)
+            deadline = time.monotonic() + self.window
+            stop = False
+            while count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    job = self._queue.get(timeout=remaining) \
+                        if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                jobs.append(job)
+                count += len(job.faces)
+
+            faces = [face for j in jobs for face in j.faces]
+            bundle = self.models.current
+            t0 = time.perf_counter()
+            try:
+                results = self._predict(bundle.recognizer, faces)
+            except Exception as e:
+                for j in jobs:
+                    j.future.set_exception(e)
+                results = None
+            elapsed = time.perf_counter() - t0
+
+            if results is not None:
+                start = 0
+                for j in jobs:
+                    j.future.set_result((bundle, [
+                        (int(label), float(dist)) for label, dist in
+                        results[start:start + len(j.faces)]]))
+                    start += len(j.faces)
+
+            with self._lock:
+                self.batches += 1
+                self.faces += len(faces)
+                self.max_seen = max(self.max_seen, len(faces))
+                self.predict_s += elapsed
+
+            if stop:
+                return
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(5.0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "faces": self.faces,
+                "mean_batch": round(self.faces / max(self.batches, 1), 2),
+                "max_batch": self.max_seen,
+                "predict_ms_per_face": round(
+                    self.predict_s * 1000 / max(self.faces, 1), 3),
+                "queue_depth": self._queue.qsize(),
+            }
+
+
+#  Request bodies
+
+
+def parse_shapes(header: str) -> list:
+    """
+    "120x120,480x640x3" -> [(120, 120), (480, 640, 3)]
+    """
+    shapes = []
+    for item in header.split(","):
+        item = item.strip()
+        if item:
+            shapes.append(tuple(int(v) for v in item.lower().split("x")))
+    return shapes
+
+
+def decode_arrays(body: bytes, content_type: str, shapes_header: str):
+    """
+    Request body -> list of uint8 images (see header comment).
+    """
+    if content_type.startswith("image/"):
+        img = cv2.imdecode(np.frombuffer(body, dtype=np.uint8),
+                           cv2.IMREAD_UNCHANGED)
+        if img is None:
+            raise ValueError("image could not be decoded")
+        return [img]
+
+    shapes = parse_shapes(shapes_header or "")
+    if not shapes:
+        raise ValueError("X-Shapes header missing")
+
+    sizes = [int(np.prod(shape)) for shape in shapes]
+    if sum(sizes) != len(body):
+        raise ValueError(f"body has {len(body)} bytes, X-Shapes needs "
+                         f"{sum(sizes)}")
+
+    arrays = []
+    offset = 0
+    for shape, size in zip(shapes, sizes):
+        arrays.append(np.frombuffer(body, dtype=np.uint8, count=size,
+                                    offset=offset).reshape(shape))
+        offset += size
+    return arrays
+
+
+def encode_arrays(arrays):
+    """
+    list of uint8 images -> (body, X-Shapes header)
+    """
+    arrays = [np.ascontiguousarray(a, dtype=np.uint8) for a in arrays]
+    shapes = ",".join("x".join(str(v) for v in a.shape) for a in arrays)
+    return b"".join(a.tobytes() for a in arrays), shapes
+
+
+def to_gray(img):
+    if img.ndim == 3 and img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
+    if img.ndim == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img
+
+
+#  Service
+
+
+class RecognitionService:
+    """
+    Model + labels (models.current) + batcher + a pool of cascade
+    detectors (detectors are not thread safe, every request borrows one).
+
+    models -> ModelReloader (hot reload) or FixedModel
+    """
+
+    def __init__(self, models, detector_factory=None,
+                 window_ms: float = 2.0, max_batch: int = 64,
+                 info: dict = None):
+        self.models = models
+        self.batcher = MicroBatcher(models, window_ms, max_batch)
+        self.detector_factory = detector_factory
+        self.info = dict(info or {})
+
+        self._detectors = queue.Queue()
+        self._detector_count = 0
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+
+        self.requests = 0
+        self.errors = 0
+        self.frames = 0
+        self.latency = deque(maxlen=2048)
+
+    #  detectors
+
+    def _borrow_detector(self):
+        try:
+            return self._detectors.get_nowait()
+        except queue.Empty:
+            pass
+        if self.detector_factory is None:
+            raise ValueError("service runs without face detection")
+        detector = self.detector_factory()
+        if detector is None:
+            raise ValueError("cascade files missing on the service host")
+        with self._lock:
+            self._detector_count += 1
+        return detector
+
+    #  requests
+
+    @staticmethod
+    def identify(bundle: ModelBundle, label: int, distance: float) -> dict:
+        # labels of the bundle that predicted, never of a newer one
+        known = label >= 0 and np.isfinite(distance)
+        name = None
+        if known and distance < RECOGNITION_THRESHOLD:
+            name = bundle.id_name_map.get(label)
+        return {"label": label if known else -1,
+                "name": name,
+                "confidence": float(distance) if known else None}
+
+    def predict_faces(self, images) -> list:
+        faces = [to_gray(img) for img in images]
+        bundle, predictions = self.batcher.submit(faces).result()
+        return [self.identify(bundle, label, dist)
+                for label, dist in predictions]
+
+    def predict_frames(self, images) -> list:
+        """
+        Every frame -> list of faces (box + identity).
+        """
+        grays = [to_gray(img) for img in images]
+        detector = self._borrow_detector()
+        try:
+            boxes = [[tuple(int(v) for v in box) for box in detector.detect(g)]
+                     for g in grays]
+        finally:
+            self._detectors.put(detector)
+
+        rois = [g[y:y + h, x:x + w]
+                for g, frame_boxes in zip(grays, boxes)
+                for (x, y, w, h) in frame_boxes]
+        bundle, predictions = self.batcher.submit(rois).result()
+        predictions = iter(predictions)
+
+        out = []
+        for frame_boxes in boxes:
+            faces = []
+            for box in frame_boxes:
+                face = self.identify(bundle, *next(predictions))
+                face["box"] = list(box)
+                faces.append(face)
+            out.append(faces)
+        return out
+
+    def record(self, elapsed: float, frames: int = 0, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.frames += frames
+            self.errors += int(error)
+            self.latency.append(elapsed)
+
+    #  health / metrics
+
+    def health(self) -> dict:
+        bundle = self.models.current
+        health = {"status": "ok",
+                  "uptime_s": round(time.monotonic() - self.started, 1),
+                  "model_version": bundle.version,
+                  "identities": len(bundle.id_name_map),
+                  **self.info}
+        if hasattr(bundle.recognizer, "labels"):
+            health["model_rows"] = int(len(bundle.recognizer.labels))
+        return health
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lat = np.array(self.latency) * 1000.0
+            requests = {"total": self.requests, "errors": self.errors,
+                        "frames": self.frames,
+                        "detectors": self._detector_count}
+        if len(lat):
+            requests.update({
+                "p50_ms": round(float(np.percentile(lat, 50)), 3),
+                "p95_ms": round(float(np.percentile(lat, 95)), 3),
+                "max_ms": round(float(lat.max()), 3),
+            })
+        return {"uptime_s": round(time.monotonic() - self.started, 1),
+                "requests": requests,
+                "batching": self.batcher.stats(),
+                "model": self.models.stats()}
+
+    def close(self):
+        self.models.stop()
+        self.batcher.close()
+        while not self._detectors.empty():
+            self._detectors.get_nowait().close()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # keep alive: clients reuse one connection per thread
+    protocol_version = "HTTP/1.1"
+    verbose = False
+
+    @property
+    def service(self) -> RecognitionService:
+        return self.server.service
+
+    def address_string(self):
+        # unix socket clients have no (host, port)
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return "unix"
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send_json(200, self.service.health())
+        elif path == "/metrics":
+            self._send_json(200, self.service.metrics())
+        else:
+            self._send_json(404, {"error": f"unknown path {path}"})
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+
+        if url.path != "/predict":
+            self.rfile.read(length)
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": "request too large"})
+            return
+
+        body = self.rfile.read(length)
+        detect = parse_qs(url.query).get("detect", ["0"])[0] not in ("0", "")
+
+        try:
+            images = decode_arrays(body,
+                                   self.headers.get("Content-Type", ""),
+                                   self.headers.get("X-Shapes", ""))
+            if detect:
+                payload = {"frames": self.service.predict_frames(images)}
+            else:
+                payload = {"faces": self.service.predict_faces(images)}
+        except ValueError as e:
+            self.service.record(time.perf_counter() - t0, error=True)
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.service.record(time.perf_counter() - t0, error=True)
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        self.service.record(time.perf_counter() - t0,
+                            frames=len(images) if detect else 0)
+        self._send_json(200, payload)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: RecognitionService, host: str = DEFAULT_HOST,
+                port: int = DEFAULT_PORT, unix_path: str = None):
+    """
+    HTTP server bound to localhost (or a unix socket), not started.
+    port=0 picks a free port (server.server_address).
+    """
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = UnixHTTPServer(unix_path, ServiceHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def service_url(server) -> str:
+    if isinstance(server.server_address, tuple):
+        host, port = server.server_address[:2]
+        return f"http://{host}:{port}"
+    return f"unix:{server.server_address}"
+
+
+#  Client
+
+
+class _UnixConnection(http.client.HTTPConnection):
+
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class RecognitionClient:
+    """
+    Talks to the service. Same predict / predict_batch interface as the
+    local recognizers, so it can replace them in mark_attendance.py.
+
+    address -> "http://127.0.0.1:8765" or "unix:/tmp/attendance.sock"
+    Thread safe (one keep-alive connection per thread).
+    id_name_map is filled from the names the service answers with, so it
+    follows the model the service has loaded (hot reload).
+    """
+
+    def __init__(self, address: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}",
+                 timeout: float = 10.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.request_s = 0.0
+        self.id_name_map = {}
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.address.startswith("unix:"):
+                conn = _UnixConnection(self.address[len("unix:"):],
+                                       self.timeout)
+            else:
+                url = urlsplit(self.address)
+                conn = http.client.HTTPConnection(
+                    url.hostname or DEFAULT_HOST, url.port or DEFAULT_PORT,
+                    timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method: str, path: str, body=None, headers=None):
+        t0 = time.perf_counter()
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException, OSError):
+                # server closed the keep-alive connection -> one retry
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+        payload = json.loads(data.decode("utf-8")) if data else {}
+        if response.status != 200:
+            raise RuntimeError(f"recognition service: {response.status} "
+                               f"{payload.get('error', '')}")
+
+        with self._lock:
+            self.requests += 1
+            self.request_s += time.perf_counter() - t0
+        return payload
+
+    def _learn(self, faces):
+        for f in faces:
+            if f["name"] is not None:
+                self.id_name_map[f["label"]] = f["name"]
+
+    def _post(self, images, detect: bool = False):
+        body, shapes = encode_arrays(images)
+        path = "/predict?detect=1" if detect else "/predict"
+        return self._request("POST", path, body,
+                             {"Content-Type": "application/octet-stream",
+                              "X-Shapes": shapes})
+
+    #  recognizer interface
+
+    def predict_batch(self, faces):
+        if len(faces) == 0:
+            return []
+        found = self._post(faces)["faces"]
+        self._learn(found)
+        return [(f["label"], f["confidence"] if f["confidence"] is not None
+                 else float("inf")) for f in found]
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+    def predict_frames(self, frames) -> list:
+        """
+        Detection + recognition on the service:
+        per frame a list of {"box", "label", "name", "confidence"}.
+        """
+        found = self._post(frames, detect=True)["frames"]
+        for faces in found:
+            self._learn(faces)
+        return found
+
+    def health(self) -> dict:
+        return self._request("GET", "/health")
+
+    def metrics(self) -> dict:
+        return self._request("GET", "/metrics")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"service": self.address,
+                    "requests": self.requests,
+                    "mean_ms": round(self.request_s * 1000
+                                     / max(self.requests, 1), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local recognition service (model loaded once per host)")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="bind address (keep it on loopback)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default="",
+                        help="serve on this unix socket instead of TCP")
+    parser.add_argument("--engine", choices=["opencv", "numpy"],
+                        default="numpy",
+                        help="numpy = vectorized predict_batch")
+    parser.add_argument("--index-probe", type=int, default=0)
+    parser.add_argument("--shards", default="",
+                        help="comma separated shard models to search")
+    parser.add_argument("--shard-fallback", action="store_true")
+    parser.add_argument("--batch-window-ms", type=float, default=2.0,
+                        help="collect requests this long into one batch")
+    parser.add_argument("--max-batch", type=int, default=64,
+                        help="max faces per predict_batch")
+    parser.add_argument("--reload-every", type=float, default=2.0,
+                        help="check trainer/ for a retrained model every N "
+                             "seconds and swap it in (0 = off)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="log every request")
+    args = parser.parse_args()
+
+    # mark_attendance imports this module (RecognitionClient)
+    from mark_attendance import (load_detector, load_labels,
+                                 load_model_pair, load_recognizer)
+
+    shards = [s.strip() for s in args.shards.split(",") if s.strip()]
+    recognizer = load_recognizer(args.engine, args.index_probe,
+                                 shards=shards,
+                                 shard_fallback=args.shard_fallback)
+    if recognizer is None:
+        return
+    id_name_map = load_labels()
+    if id_name_map is None:
+        return
+
+    info = {"engine": args.engine, "shards": shards,
+            "pid": os.getpid()}
+
+    bundle = ModelBundle(read_model_version().get("version", 0),
+                         recognizer, id_name_map)
+    if args.reload_every > 0:
+        models = ModelReloader(
+            functools.partial(load_model_pair, args.engine, args.index_probe,
+                              shards=shards,
+                              shard_fallback=args.shard_fallback),
+            bundle, interval=args.reload_every).start()
+    else:
+        models = FixedModel(bundle)
+
+    service = RecognitionService(models,
+                                 detector_factory=load_detector,
+                                 window_ms=args.batch_window_ms,
+                                 max_batch=args.max_batch, info=info)
+    ServiceHandler.verbose = args.verbose
+    server = make_server(service, args.host, args.port, args.unix or None)
+
+    print(f" Recognition service on {service_url(server)} "
+          f"({len(id_name_map)} identities, engine {args.engine}). "
+          f"Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+    print(" Metrics:", json.dumps(service.metrics()))
+
+
+if __name__ == "__main__":
+    main()
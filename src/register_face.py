@@ -1,126 +1,189 @@
+import argparse
 import os
+import time
 import cv2
 
-from config import (
-    DATASET_DIR,
-    FRONTAL_DEFAULT_XML,
-    FRONTAL_ALT2_XML,
-    PROFILE_XML,
-    FACE_SIZE
-)
+from config import DATASET_DIR, FACE_SIZE
+from background_writer import BackgroundWriter
+from enrollment import EnrollmentGate
+from face_detector import CascadeDetector
+from frame_source import FrameDisplay, open_source
 
 
-def detect_faces_3cascades(gray, c1, c2, c3):
+def existing_faces(person_dir: str):
     """
-    Try face detection with 3 cascades.
-    Priority:
-      1) frontal_default
-      2) frontal_alt2
-      3) profile_face
+    Returns (gray faces already saved, next free image number).
     """
-    faces = c1.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(80, 80))
-    if len(faces) == 0:
-        faces = c2.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(80, 80))
-    if len(faces) == 0:
-        faces = c3.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(80, 80))
-    return faces
-
-
-def register_face(person_name: str, max_images: int = 30):
+    faces = []
+    last = 0
+    for img_name in os.listdir(person_dir):
+        stem, ext = os.path.splitext(img_name)
+        if ext.lower() not in (".png", ".jpg", ".jpeg"):
+            continue
+        if stem.isdigit():
+            last = max(last, int(stem))
+        img = cv2.imread(os.path.join(person_dir, img_name),
+                         cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            faces.append(cv2.resize(img, FACE_SIZE))
+    return faces, last + 1
+
+
+def register_face(person_name: str, max_images: int = 30, source="0",
+                  headless: bool = False, min_sharpness: float = 50.0,
+                  min_hash_distance: int = 6, min_poses: int = 3,
+                  timeout: float = 120.0):
     """
     Saves cropped face images into:
     dataset/PersonName/1.jpg ...
-    """
 
-    # Check xml files
-    for xml_path in [FRONTAL_DEFAULT_XML, FRONTAL_ALT2_XML, PROFILE_XML]:
-        if not os.path.exists(xml_path):
-            print(" Cascade not found:", xml_path)
-            print("Put xml files inside models folder")
-            return
+    source   -> camera index, video file or image folder
+    headless -> no GUI windows
+    timeout  -> seconds before capture stops with the samples saved so
+                far (some pose bins may never fill), 0 = no limit
+
+    Only sharp, new (pose / size) and non duplicate faces are kept
+    (enrollment.EnrollmentGate), images are written by a background
+    thread so the camera loop never waits for the disk.
+    """
 
-    # Load cascades
-    cascade1 = cv2.CascadeClassifier(FRONTAL_DEFAULT_XML)
-    cascade2 = cv2.CascadeClassifier(FRONTAL_ALT2_XML)
-    cascade3 = cv2.CascadeClassifier(PROFILE_XML)
+    # Load cascades (checks xml files)
+    try:
+        detector = CascadeDetector()
+    except FileNotFoundError as e:
+        print(f" {e}")
+        print("Put xml files inside models folder")
+        return
 
     # Create person folder
     person_dir = os.path.join(DATASET_DIR, person_name)
     os.makedirs(person_dir, exist_ok=True)
 
-    # Start camera
-    cap = cv2.VideoCapture(0)
+    # Faces from an earlier registration: no duplicates, no overwrite
+    old_faces, next_number = existing_faces(person_dir)
+    gate = EnrollmentGate(max_images, min_sharpness, min_hash_distance,
+                          min_poses)
+    gate.seed(old_faces)
+
+    # Start camera / video / image folder
+    cap = open_source(source)
     if not cap.isOpened():
-        print(" Camera not opening")
+        print(f" Frame source not opening: {cap}")
         return
 
+    display = FrameDisplay("Register Face - Smart Attendance", headless)
+    writer = BackgroundWriter(jpeg_quality=95)
+
     print(f"Registration started for: {person_name}")
     print(f" Saving images to: {person_dir}")
+    if old_faces:
+        print(f" {len(old_faces)} images already saved, adding new ones")
     print("Press 'q' to stop early")
 
-    count = 0
-
+    started = time.monotonic()
     while True:
         ret, frame = cap.read()
         if not ret:
-            print(" Camera frame not received")
+            print(f" No more frames from {cap}")
             break
 
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
         # Detect using 3 cascades
-        faces = detect_faces_3cascades(gray, cascade1, cascade2, cascade3)
+        faces = detector.detect(gray)
 
-        for (x, y, w, h) in faces:
-            # rectangle
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        if len(faces) > 0:
+            # only the biggest (closest) face is the person registering
+            x, y, w, h = max(faces, key=lambda b: b[2] * b[3])
 
             # crop face
-            face_roi = gray[y:y + h, x:x + w]
-            face_roi = cv2.resize(face_roi, FACE_SIZE)
-
-            count += 1
-            img_path = os.path.join(person_dir, f"{count}.jpg")
-            cv2.imwrite(img_path, face_roi)
+            face_roi = cv2.resize(gray[y:y + h, x:x + w], FACE_SIZE)
 
-            print(f"Saved {count}/{max_images}: {img_path}")
+            if gate.offer(face_roi, (x, y, w, h), gray.shape):
+                img_path = os.path.join(person_dir, f"{next_number}.jpg")
+                if writer.save_image(img_path, face_roi):
+                    next_number += 1
+                    print(f"Saved {gate.accepted}/{max_images}: {img_path}")
+                else:
+                    # writer queue full: does not count, offered again
+                    gate.withdraw()
 
-            # slow save speed
-            cv2.waitKey(200)
-
-            if count >= max_images:
-                break
+            color = (0, 255, 0) if gate.last_reason == "saved" \
+                else (0, 165, 255)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
 
         # show info
         cv2.putText(frame, f"Person: {person_name}", (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
 
-        cv2.putText(frame, f"Images: {count}/{max_images}", (10, 60),
+        cv2.putText(frame, f"Images: {gate.accepted}/{max_images}", (10, 60),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
 
-        cv2.imshow("Register Face - Smart Attendance", frame)
+        hint = gate.hint()
+        if hint:
+            cv2.putText(frame, hint, (10, 90),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 2)
 
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+        if not display.show(frame):
             print(" Registration stopped by user.")
             break
 
-        if count >= max_images:
+        if gate.done:
             print("Registration completed successfully 🎉")
             break
 
+        if timeout and time.monotonic() - started >= timeout:
+            print(f" Time limit of {timeout:g} s reached, keeping the "
+                  f"{gate.accepted} images saved so far")
+            break
+
     cap.release()
-    cv2.destroyAllWindows()
+    display.close()
+    writer.close()
+
+    print(f" Enrollment stats: {gate.stats()}")
+    if not gate.done:
+        missing = ", ".join(f"{pose} ({n}/{gate.per_pose})"
+                            for pose, n in gate.open_poses().items())
+        print(f" {gate.accepted}/{max_images} images, pose bins not full "
+              f"(size-turn): {missing}")
+    if writer.stats()["errors"]:
+        print(f" Some images could not be saved: {writer.stats()}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Face Registration")
+    parser.add_argument("--name", default="", help="employee name (asked if empty)")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file or image folder")
+    parser.add_argument("--headless", action="store_true",
+                        help="no GUI windows")
+    parser.add_argument("--max-images", type=int, default=30,
+                        help="distinct samples to collect")
+    parser.add_argument("--min-sharpness", type=float, default=50.0,
+                        help="minimum Laplacian variance of a face crop")
+    parser.add_argument("--min-hash-distance", type=int, default=6,
+                        help="perceptual hash bits a new face must differ by")
+    parser.add_argument("--min-poses", type=int, default=3,
+                        help="pose / size bins needed to reach --max-images")
+    parser.add_argument("--timeout", type=float, default=120.0,
+                        help="stop after N seconds with the images saved "
+                             "so far (0 = no limit)")
+    args = parser.parse_args()
+
     print("\n===== Smart Attendance | Face Registration =====\n")
 
-    person_name = input("Enter Employee Name: ").strip()
+    person_name = args.name.strip() or input("Enter Employee Name: ").strip()
     if not person_name:
         print(" Name cannot be empty!")
         return
 
-    register_face(person_name, max_images=30)
+    register_face(person_name, max_images=args.max_images,
+                  source=args.source, headless=args.headless,
+                  min_sharpness=args.min_sharpness,
+                  min_hash_distance=args.min_hash_distance,
+                  min_poses=args.min_poses,
+                  timeout=args.timeout)
 
 
 if __name__ == "__main__":
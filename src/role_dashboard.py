@@ -62,23 +62,19 @@ class RoleDashboard:
             tk.Button(
                 frame,
                 text="View Team Attendance Report",
-                command=lambda: run_script("attendance_report_gui.py"),
+                command=lambda: run_script("attendance_report_gui.py", ["--manager", name]),
                 **btn_style
             ).pack(pady=8)
 
-            tk.Label(frame, text="(Team filter can be added next)", font=("Arial", 10)).pack(pady=2)
-
         # EMPLOYEE DASHBOARD
         elif role == "employee":
             tk.Button(
                 frame,
                 text="View My Attendance Report",
-                command=lambda: run_script("attendance_report_gui.py"),
+                command=lambda: run_script("attendance_report_gui.py", ["--name", name]),
                 **btn_style
             ).pack(pady=8)
 
-            tk.Label(frame, text="(Self filter can be added next)", font=("Arial", 10)).pack(pady=2)
-
         else:
             tk.Label(frame, text="Unknown role found!", fg="red").pack(pady=10)
 
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from config import DATA_DIR, TRAINER_DIR, FACE_SIZE, RECOGNITION_THRESHOLD
+from face_store import FACE_MANIFEST_PATH, FACE_STORE_PATH, FaceStore
+from lbph_engine import LBPHEngine
+from model_store import load_model, save_model
+
+#  Sharded recognition models
+#
+# data/shards.json maps groups of people (site, department, camera
+# group ...) to shards, and cameras to the shards they should search:
+#
+#   {
+#     "shards":  {"hq": ["Vansh", "Rahul"], "site_b": ["Amit"]},
+#     "cameras": {"door_hq": ["hq"], "gate_b": ["site_b", "hq"]}
+#   }
+#
+# train_model.py builds trainer/shards/<shard>.lbph (one process per
+# shard) next to the global model. Label ids are the global ids from
+# labels.txt, so one id -> name map works for every shard.
+#
+# mark_attendance.py --camera door_hq loads only the shards of that
+# camera; --shard-fallback also searches the global model for faces
+# the local shards do not know.
+
+SHARDS_FILE = os.path.join(DATA_DIR, "shards.json")
+SHARDS_DIR = os.path.join(TRAINER_DIR, "shards")
+SHARD_MANIFEST_PATH = os.path.join(SHARDS_DIR, "manifest.json")
+
+
+def load_mapping(path: str = SHARDS_FILE) -> dict:
+    """
+    Returns {"shards": {shard: [names]}, "cameras": {camera: [shards]}}
+    (both empty if there is no mapping file).
+    """
+    mapping = {"shards": {}, "cameras": {}}
+    if not os.path.exists(path):
+        return mapping
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    mapping["shards"] = {str(k): list(v)
+                         for k, v in data.get("shards", {}).items()}
+    mapping["cameras"] = {str(k): list(v)
+                          for k, v in data.get("cameras", {}).items()}
+    return mapping
+
+
+def shard_path(shard: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", shard)
+    return os.path.join(SHARDS_DIR, f"{safe}.lbph")
+
+
+def shards_for_camera(camera: str, mapping: dict = None) -> list:
+    mapping = mapping or load_mapping()
+    return mapping["cameras"].get(str(camera), [])
+
+
+#  Training
+
+
+def _load_manifest() -> dict:
+    if not os.path.exists(SHARD_MANIFEST_PATH):
+        return {}
+    try:
+        with open(SHARD_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: dict):
+    tmp_path = SHARD_MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, SHARD_MANIFEST_PATH)
+
+
+def _train_shard(shard: str, members: dict, data_path: str,
+                 manifest_path: str):
+    """
+    Process pool job. members -> {name: label id}
+    Faces are read from the face store (memory map, no JPEG decoding).
+    """
+    cv2.setNumThreads(1)
+    t0 = time.perf_counter()
+
+    store = FaceStore(data_path, manifest_path)
+    faces, persons = store.load(set(members))
+
+    engine = LBPHEngine()
+    engine.train(faces, [members[p] for p in persons])
+    save_model(engine, shard_path(shard),
+               names={pid: name for name, pid in members.items()},
+               face_size=FACE_SIZE)
+    return shard, len(persons), time.perf_counter() - t0
+
+
+def train_shards(id_name_map: dict, fingerprints: dict, workers: int = None,
+                 force: bool = False, mapping: dict = None):
+    """
+    (Re)builds every shard whose member list or member images changed.
+    fingerprints -> {name: dataset folder fingerprint} (dataset_state.json)
+    Returns list of (shard, faces, seconds) for the trained shards.
+    """
+    mapping = mapping or load_mapping()
+    if not mapping["shards"]:
+        return []
+
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+    name_ids = {name: pid for pid, name in id_name_map.items()}
+    old = _load_manifest()
+    manifest = {}
+    jobs = {}
+
+    for shard, names in mapping["shards"].items():
+        missing = [n for n in names if n not in name_ids]
+        if missing:
+            print(f" Shard {shard}: not in the model, ignored: "
+                  f"{', '.join(missing)}")
+
+        members = {n: name_ids[n] for n in names if n in name_ids}
+        if not members:
+            print(f" Shard {shard}: no trained members, skipped")
+            continue
+
+        manifest[shard] = {n: fingerprints.get(n, "") for n in members}
+        if force or old.get(shard) != manifest[shard] or \
+                not os.path.exists(shard_path(shard)):
+            jobs[shard] = members
+
+    results = []
+    if jobs:
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_train_shard, shard, members,
+                                   FACE_STORE_PATH, FACE_MANIFEST_PATH)
+                       for shard, members in jobs.items()]
+            for future in futures:
+                results.append(future.result())
+
+    if manifest != old:
+        # unchanged manifest keeps its mtime (model_version.json)
+        _save_manifest(manifest)
+    return results
+
+
+#  Recognition
+
+
+def load_shards(shards) -> LBPHEngine:
+    """
+    One engine with the histograms of the given shards. A person in
+    several shards is kept once.
+    """
+    engines = []
+    for shard in shards:
+        path = shard_path(shard)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"Shard model not found: {path} (run train_model.py)")
+        # not mapped on Windows: a mapped file cannot be replaced there
+        engine, _names = load_model(path, mmap=os.name != "nt")
+        engines.append(engine)
+
+    if len(engines) == 1:
+        return engines[0]
+
+    merged = LBPHEngine()
+    hist = []
+    labels = []
+    seen = set()
+    for engine in engines:
+        keep = ~np.isin(engine.labels, list(seen))
+        seen.update(np.unique(engine.labels).tolist())
+        hist.append(engine.rows_as_float(np.flatnonzero(keep)))
+        labels.append(engine.labels[keep])
+
+    merged.histograms = np.ascontiguousarray(np.vstack(hist))
+    merged.labels = np.concatenate(labels)
+    return merged
+
+
+class ShardedRecognizer:
+    """
+    Searches the local shards first; faces they do not recognize
+    (distance >= threshold) are searched again in the global model.
+    Same predict / predict_batch interface as LBPHEngine.
+    """
+
+    def __init__(self, local, fallback=None,
+                 threshold: float = RECOGNITION_THRESHOLD):
+        self.local = local
+        self.fallback = fallback
+        self.threshold = threshold
+        self.local_hits = 0
+        self.fallback_searches = 0
+        self.fallback_hits = 0
+
+    def predict_batch(self, faces):
+        results = list(self.local.predict_batch(faces))
+
+        missed = [i for i, (label, dist) in enumerate(results)
+                  if label < 0 or dist >= self.threshold]
+        self.local_hits += len(results) - len(missed)
+
+        if missed and self.fallback is not None:
+            self.fallback_searches += len(missed)
+            rois = [faces[i] for i in missed]
+            if hasattr(self.fallback, "predict_batch"):
+                found = self.fallback.predict_batch(rois)
+            else:
+                found = [self.fallback.predict(roi) for roi in rois]
+
+            for i, (label, dist) in zip(missed, found):
+                if label >= 0 and dist < results[i][1]:
+                    results[i] = (label, dist)
+                    if dist < self.threshold:
+                        self.fallback_hits += 1
+        return results
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+    def stats(self) -> dict:
+        return {
+            "local_faces": int(len(self.local.labels))
+            if hasattr(self.local, "labels") else None,
+            "local_hits": self.local_hits,
+            "fallback_searches": self.fallback_searches,
+            "fallback_hits": self.fallback_hits,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build / list sharded recognition models")
+    parser.add_argument("--train", action="store_true",
+                        help="build stale shards (all with --force)")
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    mapping = load_mapping()
+    if not mapping["shards"]:
+        print(f" No shards defined in {SHARDS_FILE}")
+        return
+
+    if args.train:
+        from train_model import load_state, read_labels_file
+
+        state = load_state()
+        fingerprints = {n: p["fingerprint"]
+                        for n, p in state.get("persons", {}).items()}
+        for shard, faces, seconds in train_shards(
+                read_labels_file(), fingerprints, args.workers, args.force,
+                mapping):
+            print(f" Shard {shard}: {faces} faces in {seconds:.2f} s")
+
+    for shard, names in mapping["shards"].items():
+        path = shard_path(shard)
+        size = f"{os.path.getsize(path) / 1e6:.1f} MB" \
+            if os.path.exists(path) else "not built"
+        print(f" {shard}: {len(names)} people | {size}")
+    for camera, shards in mapping["cameras"].items():
+        print(f" camera {camera} -> {', '.join(shards)}")
+
+
+if __name__ == "__main__":
+    main()
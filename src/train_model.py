@@ -1,17 +1,105 @@
+import argparse
+import hashlib
+import json
 import os
+import time
 import cv2
 import numpy as np
 from datetime import datetime
 
 from config import DATASET_DIR, TRAINER_DIR, FACE_SIZE
+from face_store import IMAGE_EXTS, FaceStore, format_refresh
+from lbph_engine import LBPHEngine
+from model_reload import publish_model_version
+from model_store import (MODEL_BIN_PATH, binary_model_is_current,
+                         load_model, read_labels, save_model)
+from shards import SHARDS_FILE, load_mapping, train_shards
+
+MODEL_PATH = os.path.join(TRAINER_DIR, "trainer.yml")
+LABELS_PATH = os.path.join(TRAINER_DIR, "labels.txt")
+
+# what the current model was trained from:
+# {"next_id": 3, "persons": {"Vansh": {"id": 0, "fingerprint": "...",
+#                                      "images": 30}, ...}}
+STATE_PATH = os.path.join(TRAINER_DIR, "dataset_state.json")
 
 #  Read all dataset images and create:
 # faces   -> list of face images (gray resized)
-# labels  -> list of label ids (0,1,2...)
+# labels  -> list of label ids (stable, taken from labels.txt)
 # id_name_map -> id to person name mapping
 
 
-def get_images_and_labels():
+def list_person_folders(dataset_dir: str = DATASET_DIR):
+    if not os.path.exists(dataset_dir):
+        raise FileNotFoundError(f"Dataset folder not found: {dataset_dir}")
+
+    #  get only folders (person names)
+    persons = [
+        d for d in os.listdir(dataset_dir)
+        if os.path.isdir(os.path.join(dataset_dir, d))
+    ]
+    persons.sort()
+    return persons
+
+
+def read_labels_file(path: str = LABELS_PATH) -> dict:
+    """
+    labels.txt -> {id: name} ({} if there is no file yet)
+    """
+    return read_labels(path)
+
+
+def assign_label_ids(persons, known: dict, next_id: int = 0) -> dict:
+    """
+    Keeps the id of every person already in `known` ({id: name}),
+    new persons get ids after the highest id ever used.
+    Returns {name: id}.
+    """
+    ids = {name: pid for pid, name in known.items()}
+    next_id = max([next_id] + [pid + 1 for pid in known])
+
+    for name in persons:
+        if name not in ids:
+            ids[name] = next_id
+            next_id += 1
+    return ids
+
+
+def folder_fingerprint(person_dir: str) -> str:
+    """
+    Hash of (file name, size, modification time) of every image.
+    Changes when images are added, removed or replaced.
+    """
+    entries = []
+    for img_name in sorted(os.listdir(person_dir)):
+        if not img_name.lower().endswith(IMAGE_EXTS):
+            continue
+        st = os.stat(os.path.join(person_dir, img_name))
+        entries.append(f"{img_name}|{st.st_size}|{st.st_mtime_ns}")
+    return hashlib.sha1("\n".join(entries).encode("utf-8")).hexdigest()
+
+
+def load_labeled_faces(person_ids: dict, workers: int = None,
+                       dataset_dir: str = DATASET_DIR, store=None):
+    """
+    person_ids -> {person name: label id}
+    Faces come from the packed face store (face_store.py): only new or
+    changed images are decoded, everything else is read from faces.u8.
+    Returns (faces uint8 (N, h, w), labels int32 (N,), skipped count).
+    """
+    store = store or FaceStore()
+    stats = store.refresh(dataset_dir, workers)
+    print(format_refresh(stats, workers))
+
+    faces, persons = store.load(set(person_ids))
+    labels = np.asarray([person_ids[p] for p in persons], dtype=np.int32)
+    return faces, labels, stats["skipped"] + stats["unreadable"]
+
+
+def get_images_and_labels(workers: int = None,
+                          dataset_dir: str = DATASET_DIR, store=None,
+                          labels_path: str = LABELS_PATH,
+                          state_path: str = STATE_PATH):
     """
     Expected dataset structure:
 
@@ -22,61 +110,40 @@ def get_images_and_labels():
         Rahul/
             1.jpg
             2.jpg
-    """
-    if not os.path.exists(DATASET_DIR):
-        raise FileNotFoundError(f"Dataset folder not found: {DATASET_DIR}")
 
-    #  get only folders (person names)
-    persons = [
-        d for d in os.listdir(DATASET_DIR)
-        if os.path.isdir(os.path.join(DATASET_DIR, d))
-    ]
-    persons.sort()
+    faces are returned as one uint8 array (N, h, w), labels as int32 (N,)
+    store -> FaceStore to use (default trainer/faces.u8)
+    labels_path / state_path -> label ids to keep (default trainer/);
+    another dataset_dir (benchmarks) passes its own, missing files just
+    number the persons from 0
+    """
+    persons = list_person_folders(dataset_dir)
 
     if not persons:
         raise Exception(
             "No person folders found in dataset. Register faces first!")
 
-    faces = []
-    labels = []
-    id_name_map = {}
+    state = load_state(state_path)
+    ids = assign_label_ids(persons, read_labels_file(labels_path),
+                           state.get("next_id", 0))
 
-    total_skipped = 0
+    id_name_map = {}
+    person_ids = {}
 
-    for pid, person_name in enumerate(persons):
-        person_dir = os.path.join(DATASET_DIR, person_name)
-        images = os.listdir(person_dir)
+    for person_name in persons:
+        person_dir = os.path.join(dataset_dir, person_name)
 
         #  ignore empty folders
-        if len(images) == 0:
+        if len(os.listdir(person_dir)) == 0:
             print(f"Skipping empty folder: {person_name}")
             continue
 
         #  save mapping
-        id_name_map[pid] = person_name
-
-        for img_name in images:
-            img_path = os.path.join(person_dir, img_name)
-
-            #  only allow valid image formats
-            if not img_name.lower().endswith((".png", ".jpg", ".jpeg")):
-                total_skipped += 1
-                continue
-
-            img = cv2.imread(img_path)
-            if img is None:
-                print(f"Unreadable image skipped: {img_path}")
-                total_skipped += 1
-                continue
-
-            #  convert to gray
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-            #  resize image for same training quality
-            gray = cv2.resize(gray, FACE_SIZE)
+        id_name_map[ids[person_name]] = person_name
+        person_ids[person_name] = ids[person_name]
 
-            faces.append(gray)
-            labels.append(pid)
+    faces, labels, total_skipped = load_labeled_faces(
+        person_ids, workers, dataset_dir, store)
 
     if len(faces) == 0:
         raise Exception(
@@ -95,33 +162,217 @@ def get_images_and_labels():
 def save_labels_file(id_name_map: dict):
     os.makedirs(TRAINER_DIR, exist_ok=True)
 
-    labels_path = os.path.join(TRAINER_DIR, "labels.txt")
-    with open(labels_path, "w", encoding="utf-8") as f:
-        for pid, name in id_name_map.items():
+    with open(LABELS_PATH, "w", encoding="utf-8") as f:
+        for pid, name in sorted(id_name_map.items()):
             f.write(f"{pid},{name}\n")
 
-    print(f" labels.txt saved at: {labels_path}")
+    print(f" labels.txt saved at: {LABELS_PATH}")
 
 
-#  Main training function
+#  Dataset state (change detection for incremental training)
 
 
-def main():
-    print("\n" + "=" * 60)
-    print("SMART ATTENDANCE SYSTEM - MODEL TRAINING STARTED")
-    print("=" * 60)
+def load_state(path: str = STATE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(id_name_map: dict, labels, next_id: int):
+    counts = {}
+    for pid in labels:
+        counts[int(pid)] = counts.get(int(pid), 0) + 1
+
+    persons = {}
+    for pid, name in id_name_map.items():
+        persons[name] = {
+            "id": int(pid),
+            "fingerprint": folder_fingerprint(os.path.join(DATASET_DIR, name)),
+            "images": counts.get(int(pid), 0),
+        }
+
+    state = {
+        "next_id": int(next_id),
+        "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "persons": persons,
+    }
+
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def dataset_changes(state: dict, remove=()):
+    """
+    Compares dataset/ with the state of the last training.
+    Returns (added, changed, removed) lists of person names.
+    """
+    trained = state.get("persons", {})
+    current = {}
+    for name in list_person_folders():
+        person_dir = os.path.join(DATASET_DIR, name)
+        if name in remove or not os.listdir(person_dir):
+            continue
+        current[name] = folder_fingerprint(person_dir)
+
+    added = [n for n in current if n not in trained]
+    changed = [n for n in current
+               if n in trained and trained[n]["fingerprint"] != current[n]]
+    removed = [n for n in trained if n not in current]
+    return added, changed, removed
 
+
+def save_models(engine, id_name_map: dict):
+    """
+    trainer.yml (OpenCV engine) + trainer.lbph (numpy engine, written
+    last so it is never older than the yml) + labels.txt.
+    """
+    os.makedirs(TRAINER_DIR, exist_ok=True)
+    engine.save_opencv_yml(MODEL_PATH)
+    save_model(engine, names=id_name_map, face_size=FACE_SIZE)
+    save_labels_file(id_name_map)
+
+
+def clear_models(next_id: int):
+    """
+    Nobody left to recognize: trainer.yml / trainer.lbph are deleted,
+    labels.txt and the state emptied (next_id kept, ids are not reused).
+    """
+    for path in (MODEL_PATH, MODEL_BIN_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+    save_labels_file({})
+    save_state({}, [], next_id)
+
+
+#  Incremental training
+
+
+def load_trained_engine():
+    if binary_model_is_current():
+        # no mmap: trainer.lbph is replaced at the end
+        engine, _names = load_model(mmap=False)
+        return engine
+    if os.path.exists(MODEL_PATH):
+        return LBPHEngine.from_opencv_yml(MODEL_PATH)
+    return None
+
+
+def train_incremental(remove=(), workers: int = None):
+    """
+    Only persons whose folder was added / changed are read and fed to
+    engine.update(); removed persons (folder deleted or --remove) are
+    dropped from the model. Label ids of everybody else do not change.
+
+    Returns False if there is no usable previous model (full training
+    needed).
+    """
+    state = load_state()
+    if not state.get("persons"):
+        print(" No previous training state, running full training.")
+        return False
+
+    engine = load_trained_engine()
+    trained_ids = {p["id"] for p in state["persons"].values()}
+    if engine is None or set(np.unique(engine.labels).tolist()) != trained_ids:
+        print(" Model does not match training state, running full training.")
+        return False
+
+    added, changed, removed = dataset_changes(state, remove)
+    if not (added or changed or removed):
+        print(" Model is up to date, nothing to train.")
+        return True
+
+    t0 = time.perf_counter()
+
+    id_name_map = {p["id"]: n for n, p in state["persons"].items()}
+    ids = assign_label_ids(added, id_name_map, state.get("next_id", 0))
+
+    #  drop old rows of changed + removed persons
+    dropped = engine.remove(ids[n] for n in changed + removed)
+    for name in removed:
+        del id_name_map[ids[name]]
+
+    #  extract only the new / changed persons
+    faces, labels, _skipped = load_labeled_faces(
+        {name: ids[name] for name in added + changed}, workers)
+
+    for name in added + changed:
+        if not (labels == ids[name]).any():
+            print(f" No valid images for {name}, skipped")
+            id_name_map.pop(ids[name], None)
+            continue
+        id_name_map[ids[name]] = name
+
+    if len(faces):
+        engine.update(faces, labels)
+
+    if len(engine.labels) == 0:
+        clear_models(state.get("next_id", 0))
+        print(" Every person was removed, model and labels cleared.")
+        return True
+
+    save_models(engine, id_name_map)
+    save_state(id_name_map, engine.labels,
+               max([state.get("next_id", 0)] + [i + 1 for i in ids.values()]))
+
+    print("\n INCREMENTAL TRAINING SUMMARY")
+    print(f" Added: {', '.join(added) or '-'}")
+    print(f" Updated: {', '.join(changed) or '-'}")
+    print(f" Removed: {', '.join(removed) or '-'}")
+    print(f" Images added: {len(faces)} | rows dropped: {dropped}")
+    print(f" Total Persons: {len(id_name_map)} | "
+          f"Total Face Images: {len(engine.labels)}")
+    print(f" Time: {time.perf_counter() - t0:.2f} s")
+    return True
+
+
+#  Shard models (shards.py)
+
+
+def train_shard_models(workers: int = None, force: bool = False):
+    mapping = load_mapping()
+    if not mapping["shards"]:
+        return
+
+    state = load_state()
+    fingerprints = {n: p["fingerprint"]
+                    for n, p in state.get("persons", {}).items()}
+
+    t0 = time.perf_counter()
+    trained = train_shards(read_labels_file(), fingerprints, workers, force,
+                           mapping)
+    if not trained:
+        print(f" Shards up to date ({len(mapping['shards'])} in "
+              f"{SHARDS_FILE})")
+        return
+
+    for shard, faces, seconds in trained:
+        print(f" Shard {shard}: {faces} faces in {seconds:.2f} s")
+    print(f" {len(trained)} shard(s) built in "
+          f"{time.perf_counter() - t0:.2f} s")
+
+
+#  Main training function
+
+
+def train_full(workers: int = None):
     try:
-        faces, labels, id_name_map = get_images_and_labels()
+        faces, labels, id_name_map = get_images_and_labels(workers)
     except Exception as e:
         print(f"\nERROR: {e}")
-        return
+        return False
 
     #  minimum images check (for accuracy)
     if len(faces) < 10:
         print("\nNot enough images to train model properly.")
         print(" Please register at least 10-20 images per person.")
-        return
+        return False
 
     #  display summary
     print("\n TRAINING SUMMARY")
@@ -131,18 +382,72 @@ def main():
 
     #  Train LBPH Model
     recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.train(faces, np.array(labels))
+    recognizer.train(list(faces), labels)
 
     #  Save trainer.yml
     os.makedirs(TRAINER_DIR, exist_ok=True)
-    model_path = os.path.join(TRAINER_DIR, "trainer.yml")
-    recognizer.save(model_path)
+    recognizer.save(MODEL_PATH)
+
+    print(f"\nModel saved successfully: {MODEL_PATH}")
 
-    print(f"\nModel saved successfully: {model_path}")
+    #  Save binary copy (memory mapped by the numpy engine)
+    try:
+        engine = LBPHEngine.from_opencv_yml(MODEL_PATH)
+        bin_path = save_model(engine, names=id_name_map, face_size=FACE_SIZE)
+        print(f" Binary model saved: {bin_path}")
+    except Exception as e:
+        print(f" Binary model not saved ({e}), trainer.yml is still used")
 
     #  Save labels mapping
     save_labels_file(id_name_map)
 
+    #  Remember what was trained (for --incremental)
+    state = load_state()
+    save_state(id_name_map, labels,
+               max([state.get("next_id", 0)] + [i + 1 for i in id_name_map]))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the LBPH face model")
+    parser.add_argument("--full", action="store_true",
+                        help="retrain every person from dataset/")
+    parser.add_argument("--remove", action="append", default=[],
+                        metavar="NAME",
+                        help="remove a person from the model (repeatable); "
+                             "delete the dataset folder too, or the person "
+                             "is added again by the next training")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="image loading threads (default: CPU count)")
+    parser.add_argument("--shard-workers", type=int, default=None,
+                        help="processes for shard training "
+                             "(data/shards.json, default: CPU count)")
+    args = parser.parse_args()
+
+    print("\n" + "=" * 60)
+    print("SMART ATTENDANCE SYSTEM - MODEL TRAINING STARTED")
+    print("=" * 60)
+
+    #  incremental by default, full training only if needed / asked
+    done = False
+    if not args.full:
+        done = train_incremental(remove=set(args.remove),
+                                 workers=args.workers)
+
+    if not done:
+        if args.remove:
+            print(" --remove needs an existing model, ignored.")
+        done = train_full(args.workers)
+
+    if not done:
+        return
+
+    #  Shards (only if data/shards.json exists)
+    train_shard_models(args.shard_workers, force=args.full)
+
+    #  Written last: running recognizers reload when the version changes
+    print(f" Model version: {publish_model_version()}")
+
     print("\nTraining completed successfully 🎉")
     print("=" * 60 + "\n")
 